@@ -0,0 +1,82 @@
+"""梗词模糊去重基准：逐条 difflib 比较 vs bigram 倒排索引。
+
+用法（在插件根目录）：python benchmarks/bench_glossary_fuzzy.py
+"""
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databases.glossary_index import FuzzyTermIndex, normalize_term
+
+_CHARS = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+
+
+def make_terms(n, rng):
+    terms = set()
+    while len(terms) < n:
+        terms.add(''.join(rng.choice(_CHARS) for _ in range(rng.randint(2, 8))))
+    return [{'id': i + 1, 'term': t} for i, t in enumerate(terms)]
+
+
+def make_queries(rows, count, rng):
+    """一半是已有词改一个字，一半是全新词。"""
+    queries = []
+    for i in range(count):
+        if i % 2:
+            t = list(rng.choice(rows)['term'] + rng.choice(_CHARS))
+            t[rng.randrange(len(t))] = rng.choice(_CHARS)
+            queries.append(''.join(t))
+        else:
+            queries.append(''.join(rng.choice(_CHARS) for _ in range(rng.randint(2, 8))))
+    return queries
+
+
+def loop_find(rows, term, threshold=0.85):
+    """原 find_similar_glossary 的逐条比较实现。"""
+    norm = normalize_term(term)
+    best = None
+    for r in rows:
+        t = normalize_term(r['term'])
+        if not t or t == norm: continue
+        if abs(len(t) - len(norm)) > max(2, len(norm) // 3): continue
+        ratio = difflib.SequenceMatcher(None, norm, t).ratio()
+        if ratio >= threshold and (best is None or ratio > best[0]):
+            best = (ratio, r['id'])
+    return best
+
+
+def bench(n, queries_count=100):
+    rng = random.Random(n)
+    rows = make_terms(n, rng)
+    queries = make_queries(rows, queries_count, rng)
+
+    t0 = time.perf_counter()
+    index = FuzzyTermIndex(rows)
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    expected = [loop_find(rows, q) for q in queries]
+    loop = (time.perf_counter() - t0) / queries_count
+
+    t0 = time.perf_counter()
+    got = [index.find_similar(q) for q in queries]
+    fast = (time.perf_counter() - t0) / queries_count
+
+    t0 = time.perf_counter()
+    index.find_similar_many(queries)
+    batch = (time.perf_counter() - t0) / queries_count
+
+    agree = sum((e is None) == (not g) and (e is None or round(e[0], 3) == g[0]['score'])
+                for e, g in zip(expected, got))
+    print(f"{n:>7} terms | build {build * 1000:8.1f} ms | loop {loop * 1000:8.2f} ms/term | "
+          f"index {fast * 1e6:8.1f} us/term | batch {batch * 1e6:8.1f} us/term | "
+          f"x{loop / fast:,.0f} | agree {agree}/{queries_count}")
+
+
+if __name__ == '__main__':
+    for n in (5_000, 50_000):
+        bench(n)
@@ -0,0 +1,88 @@
+"""梗词匹配基准：逐词 `term in text` 循环 vs Aho-Corasick 自动机，以及增删词条后紧接着
+匹配的延迟（自动机在后台重建，匹配路径不等待）。
+
+用法（在插件根目录）：python benchmarks/bench_glossary_match.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databases.glossary_index import GlossaryMatcher
+
+_CHARS = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+
+
+def make_terms(n, rng):
+    terms = set()
+    while len(terms) < n:
+        terms.add(''.join(rng.choice(_CHARS) for _ in range(rng.randint(2, 6))))
+    return [{'id': i + 1, 'term': t, 'meaning': '', 'category': '其他梗', 'source': '', 'hit_count': 0}
+            for i, t in enumerate(terms)]
+
+
+def make_messages(rows, count, rng):
+    messages = []
+    for _ in range(count):
+        parts = [''.join(rng.choice(_CHARS) for _ in range(rng.randint(10, 40)))]
+        for row in rng.sample(rows, 2):
+            parts.append(row['term'])
+            parts.append(''.join(rng.choice(_CHARS) for _ in range(rng.randint(5, 20))))
+        messages.append(''.join(parts))
+    return messages
+
+
+def loop_match(rows, text):
+    hits = []
+    seen = set()
+    for g in rows:
+        term = g['term']
+        if term in seen: continue
+        if term in text:
+            seen.add(term)
+            hits.append(g)
+    return hits[:10]
+
+
+def bench(n, messages_count=200):
+    rng = random.Random(n)
+    rows = make_terms(n, rng)
+    messages = make_messages(rows, messages_count, rng)
+
+    t0 = time.perf_counter()
+    matcher = GlossaryMatcher(rows)
+    matcher.match('warmup')
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for m in messages: loop_match(rows, m)
+    loop = (time.perf_counter() - t0) / messages_count
+
+    t0 = time.perf_counter()
+    for m in messages: matcher.match(m)
+    ac = (time.perf_counter() - t0) / messages_count
+
+    extra = make_terms(50, random.Random(n + 1))
+    mutate = 0.0
+    for i, row in enumerate(extra):
+        row = dict(row, id=n + i + 1)
+        t0 = time.perf_counter()
+        matcher.add(row)
+        if i % 2: matcher.remove(row['id'] - 1)
+        matcher.match(messages[i % messages_count])
+        mutate += time.perf_counter() - t0
+    mutate /= len(extra)
+    t0 = time.perf_counter()
+    matcher.wait_rebuilt()
+    settle = time.perf_counter() - t0
+
+    print(f"{n:>7} terms | build {build * 1000:8.1f} ms | loop {loop * 1e6:10.1f} us/msg | "
+          f"automaton {ac * 1e6:8.1f} us/msg | x{loop / ac:,.0f} | "
+          f"mutate+match {mutate * 1e6:8.1f} us | rebuild settle {settle * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    for n in (1_000, 10_000, 100_000):
+        bench(n)
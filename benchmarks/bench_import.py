@@ -0,0 +1,83 @@
+"""记忆导入基准：按原接口上限每次 500 条调用 bulk_import_memories vs 流式导入任务（进程池准备 + 分块写入）。
+
+合成的记忆由几十个常见句式拼上编号构成（jieba 在随机汉字上的词性标注极慢，不代表真实数据）。
+默认 2 万条，可用第一个参数指定条数，第二个参数指定进程数（0 = 不开进程池，在任务线程里准备）。
+
+用法（在插件根目录）：python benchmarks/bench_import.py [条数] [进程数]
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databases.db_manager import DatabaseManager
+
+_SUBJECTS = ['今天', '昨天下午', '周末', '刚才', '上周五', '早上']
+_EVENTS = ['和朋友去了一家新开的火锅店，味道很不错', '在公司把数据库迁移到了新服务器', '复习了分布式系统的一致性原理',
+           '跑了五公里，感觉状态越来越好', '读完了一本关于历史的书，收获很大', '修好了插件里一个并发写入的 bug',
+           '看了一部科幻电影，特效非常震撼', '学会了用 Python 的 asyncio 写爬虫']
+_TAILS = ['下次还想再去。', '记得明天继续。', '值得记录一下。', '希望以后多做这样的事。', '有点累但是很开心。']
+
+
+def make_memories(n, rng):
+    return [f"{rng.choice(_SUBJECTS)}{rng.choice(_EVENTS)}，{rng.choice(_TAILS)}（{i}）" for i in range(n)]
+
+
+def fresh_db(data_dir):
+    db = DatabaseManager({'backup_interval': 0})
+    db.initialize(data_dir)
+    db._stop_index_backfill()
+    return db
+
+
+def bench_legacy(memories, batch=500):
+    data_dir = tempfile.mkdtemp()
+    try:
+        db = fresh_db(data_dir)
+        t0 = time.perf_counter()
+        for start in range(0, len(memories), batch):
+            db.bulk_import_memories([{'content': m} for m in memories[start:start + batch]])
+        elapsed = time.perf_counter() - t0
+        db.close()
+        return elapsed
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def bench_stream(memories, workers):
+    data_dir = tempfile.mkdtemp()
+    try:
+        db = fresh_db(data_dir)
+        db._get_importer().workers = workers
+        path, f = db.create_import_spool()
+        with f:
+            for m in memories:
+                f.write(json.dumps({'content': m}, ensure_ascii=False).encode('utf-8') + b'\n')
+        t0 = time.perf_counter()
+        job_id = db.start_memory_import(path)
+        while db.get_import_job(job_id)['status'] in ('queued', 'running'):
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - t0
+        job = db.get_import_job(job_id)
+        stats = db.get_memory_stats()['write_queue']
+        db.close()
+        return elapsed, job, stats
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    rows = make_memories(n, random.Random(0))
+    legacy = bench_legacy(rows)
+    print(f"bulk_import_memories x{(n + 499) // 500}: {n:,} memories in {legacy:.1f} s ({n / legacy:,.0f}/s)")
+    elapsed, job, stats = bench_stream(rows, workers)
+    print(f"stream import ({workers} workers): {job['imported']:,} imported in {elapsed:.1f} s "
+          f"({job['imported'] / elapsed:,.0f}/s) | lock hold max {stats['lock_hold_ms_max']:.0f} ms, "
+          f"avg {stats['lock_hold_ms_avg']:.0f} ms per chunk")
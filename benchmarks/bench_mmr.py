@@ -0,0 +1,79 @@
+"""MMR 重排基准：原逐对正则分词实现 vs 预分词 + 增量最大相似度（纯 Python / NumPy）。
+
+用法（在插件根目录）：python benchmarks/bench_mmr.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databases import mmr
+
+_WORDS = [f'w{i}' for i in range(2000)]
+
+
+def make_candidates(n, rng):
+    return [' '.join(rng.choice(_WORDS) for _ in range(rng.randint(8, 40))) for _ in range(n)]
+
+
+def legacy_mmr(texts, query, limit, lambda_param=0.7):
+    """原 DatabaseManager._mmr_rerank 的实现（返回下标）。"""
+    if len(texts) <= limit: return list(range(len(texts)))
+    query_words = set(re.findall(r'\w+', query.lower()))
+    selected = [0]
+    remaining = list(range(1, len(texts)))
+    while len(selected) < limit and remaining:
+        best_score = -float('inf')
+        best_idx = 0
+        for i, c in enumerate(remaining):
+            cand_words = set(re.findall(r'\w+', texts[c].lower()))
+            relevance = len(query_words & cand_words) / max(len(query_words), 1)
+            max_sim = 0
+            for s in selected:
+                sel_words = set(re.findall(r'\w+', texts[s].lower()))
+                sim = len(cand_words & sel_words) / max(len(cand_words | sel_words), 1)
+                max_sim = max(max_sim, sim)
+            score = lambda_param * relevance - (1 - lambda_param) * max_sim
+            if score > best_score:
+                best_score = score
+                best_idx = i
+        selected.append(remaining.pop(best_idx))
+    return selected
+
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def bench(n, limit=10):
+    rng = random.Random(n)
+    texts = make_candidates(n, rng)
+    query = ' '.join(rng.sample(_WORDS, 5))
+
+    legacy_t, expected = timed(legacy_mmr, texts, query, limit, repeat=1 if n > 500 else 3)
+    saved = mmr.NUMPY_MIN_CANDIDATES
+    mmr.NUMPY_MIN_CANDIDATES = float('inf')
+    py_t, py_sel = timed(mmr.mmr_select, texts, query, limit)
+    mmr.NUMPY_MIN_CANDIDATES = saved
+    line = (f"n={n:>5} k={limit} | legacy {legacy_t * 1000:9.2f} ms | python {py_t * 1000:7.2f} ms")
+    same = py_sel == expected
+    if mmr.np is not None:
+        mmr.NUMPY_MIN_CANDIDATES = 0
+        np_t, np_sel = timed(mmr.mmr_select, texts, query, limit)
+        mmr.NUMPY_MIN_CANDIDATES = saved
+        line += f" | numpy {np_t * 1000:7.2f} ms"
+        same = same and np_sel == expected
+    print(line + f" | same selection: {same}")
+
+
+if __name__ == '__main__':
+    for n in (50, 500, 5000):
+        bench(n)
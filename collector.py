@@ -233,7 +233,18 @@ class HotTrendCollector:
 
         imported = 0
         skipped = 0
-        for it in items:
+        # 一次性模糊去重：与已有梗或同批更早条目相似度高的都视为重复
+        try:
+            dups = await asyncio.to_thread(
+                self.db_manager.dedup_glossary_terms, [it["term"] for it in items]
+            )
+        except Exception as e:
+            logger.warning(f"批量去重失败，逐条入库: {e}")
+            dups = [None] * len(items)
+        for it, dup in zip(items, dups):
+            if dup:
+                skipped += 1
+                continue
             try:
                 result = await asyncio.to_thread(
                     self.db_manager.add_glossary,
@@ -241,8 +252,7 @@ class HotTrendCollector:
                     it["category"],
                     it["meaning"],
                     it.get("source", "自动采集"),
-                    "",
-                    True   # fuzzy_dedup：与已有梗相似度高的也视为重复
+                    ""
                 )
                 if result == "already_exists":
                     skipped += 1
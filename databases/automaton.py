@@ -0,0 +1,122 @@
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机。
+
+    trie 用扁平数组 + 单个 dict（键为 node * 0x110000 + 码位）存储，几十万节点也不会
+    为每个节点各建一个 dict。add/remove 只改 trie 与终止标记，fail/输出链接在下次匹配前
+    按深度顺序整体重算（O(节点数)）。热路径上需要增删时先 clone() 出副本，在副本上增删并
+    build() 后再整体替换（见 GlossaryMatcher），已发布的实例不再修改。
+    """
+
+    _STRIDE = 0x110000
+
+    def __init__(self, patterns=()):
+        self._children = {}
+        self._parent = [0]
+        self._char = [0]
+        self._depth = [0]
+        self._fail = [0]
+        self._dict_link = [0]
+        self._terminal = {}
+        self._dirty = False
+        for p in patterns:
+            self.add(p)
+
+    def __len__(self):
+        return len(self._terminal)
+
+    def __contains__(self, pattern):
+        node = self._find(pattern)
+        return node is not None and node in self._terminal
+
+    def _find(self, pattern):
+        node = 0
+        for ch in pattern:
+            node = self._children.get(node * self._STRIDE + ord(ch))
+            if node is None: return None
+        return node
+
+    def clone(self):
+        """复制出一份可独立修改的自动机。"""
+        other = AhoCorasick.__new__(AhoCorasick)
+        other._children = dict(self._children)
+        other._parent = list(self._parent)
+        other._char = list(self._char)
+        other._depth = list(self._depth)
+        other._fail = list(self._fail)
+        other._dict_link = list(self._dict_link)
+        other._terminal = dict(self._terminal)
+        other._dirty = self._dirty
+        return other
+
+    def add(self, pattern):
+        if not pattern: return
+        node = 0
+        for ch in pattern:
+            key = node * self._STRIDE + ord(ch)
+            child = self._children.get(key)
+            if child is None:
+                child = len(self._parent)
+                self._children[key] = child
+                self._parent.append(node)
+                self._char.append(ord(ch))
+                self._depth.append(self._depth[node] + 1)
+            node = child
+        if node not in self._terminal:
+            self._terminal[node] = pattern
+            self._dirty = True
+
+    def remove(self, pattern):
+        node = self._find(pattern)
+        if node is not None and self._terminal.pop(node, None) is not None:
+            self._dirty = True
+
+    def build(self):
+        """按深度顺序重算 fail 与输出链接（父节点总在子节点之前处理）。"""
+        n = len(self._parent)
+        children = self._children
+        stride = self._STRIDE
+        fail = [0] * n
+        dict_link = [0] * n
+        terminal = self._terminal
+        for node in sorted(range(1, n), key=self._depth.__getitem__):
+            parent = self._parent[node]
+            if parent:
+                code = self._char[node]
+                f = fail[parent]
+                while True:
+                    nxt = children.get(f * stride + code)
+                    if nxt is not None:
+                        fail[node] = nxt
+                        break
+                    if f == 0: break
+                    f = fail[f]
+            f = fail[node]
+            dict_link[node] = f if f in terminal else dict_link[f]
+        self._fail = fail
+        self._dict_link = dict_link
+        self._dirty = False
+
+    def iter_matches(self, text):
+        """逐个产出 (start, end, pattern)，end 为开区间。"""
+        if self._dirty or len(self._fail) != len(self._parent):
+            self.build()
+        children = self._children
+        stride = self._STRIDE
+        fail = self._fail
+        dict_link = self._dict_link
+        terminal = self._terminal
+        state = 0
+        for i, ch in enumerate(text):
+            code = ord(ch)
+            while True:
+                nxt = children.get(state * stride + code)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if state == 0: break
+                state = fail[state]
+            node = state if state in terminal else dict_link[state]
+            while node:
+                pattern = terminal[node]
+                yield i + 1 - len(pattern), i + 1, pattern
+                node = dict_link[node]
@@ -0,0 +1,138 @@
+import threading
+from datetime import datetime
+
+try:
+    from astrbot.api import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """按 key 合并计数的内存缓冲：key -> [累计次数, 最近时间]。
+
+    热路径只在内存里累加，由后台刷写线程 drain 后一次 executemany 写回。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, keys, when=None):
+        when = when or datetime.now().isoformat()
+        with self._lock:
+            for key in keys:
+                entry = self._pending.get(key)
+                if entry:
+                    entry[0] += 1
+                    entry[1] = max(entry[1], when)
+                else:
+                    self._pending[key] = [1, when]
+
+    def pending(self, key):
+        with self._lock:
+            entry = self._pending.get(key)
+            return tuple(entry) if entry else None
+
+    def drain(self):
+        """取出并清空全部待刷写条目，返回 [(count, latest, key), ...]。"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return [(count, latest, key) for key, (count, latest) in pending.items()]
+
+    def restore(self, rows):
+        """刷写失败时把取出的条目合并回去，避免丢计数。"""
+        with self._lock:
+            for count, latest, key in rows:
+                entry = self._pending.get(key)
+                if entry:
+                    entry[0] += count
+                    entry[1] = max(entry[1], latest)
+                else:
+                    self._pending[key] = [count, latest]
+
+
+class AccessStatsBuffer(CounterBuffer):
+    """记忆访问统计：memory_id -> [命中次数, last_accessed]，写回 memories 表。"""
+
+
+class InteractionTracker(CounterBuffer):
+    """互动追踪：user_id -> [interaction_count 增量, last_interaction]，写回 relationships 表。"""
+
+    def touch(self, user_id, when=None):
+        self.record((user_id,), when)
+
+
+class GlossaryHitBuffer:
+    """梗词命中计数缓冲：累计每个梗的总命中，以及按 (梗, 小时桶, 群) 的分桶命中。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def record(self, glossary_id, group_id='', when=None):
+        bucket = (when or datetime.now()).strftime('%Y-%m-%d %H')
+        key = (glossary_id, bucket, group_id or '')
+        with self._lock:
+            self._totals[glossary_id] = self._totals.get(glossary_id, 0) + 1
+            self._buckets[key] = self._buckets.get(key, 0) + 1
+
+    def drain(self):
+        """返回 ([(hits, glossary_id)], [(glossary_id, bucket, group_id, hits)]) 并清空。"""
+        with self._lock:
+            totals, self._totals = self._totals, {}
+            buckets, self._buckets = self._buckets, {}
+        return ([(hits, gid) for gid, hits in totals.items()],
+                [(gid, bucket, group, hits) for (gid, bucket, group), hits in buckets.items()])
+
+    def restore(self, totals, buckets):
+        with self._lock:
+            for hits, gid in totals:
+                self._totals[gid] = self._totals.get(gid, 0) + hits
+            for gid, bucket, group, hits in buckets:
+                key = (gid, bucket, group)
+                self._buckets[key] = self._buckets.get(key, 0) + hits
+
+
+class BufferFlusher:
+    """后台刷写线程：按固定间隔调用 flush，也可被 trigger() 提前唤醒（缓冲超阈值时）。"""
+
+    def __init__(self, flush, interval=30):
+        self._flush = flush
+        self.interval = max(1, interval)
+        self._thread = None
+        self._running = False
+        self._wake = threading.Event()
+
+    def start(self):
+        if self._running: return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name='MemoryCapsuleFlusher')
+        self._thread.start()
+
+    def trigger(self):
+        self._wake.set()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self._thread = None
+
+    def _loop(self):
+        while self._running:
+            self._wake.wait(timeout=self.interval)
+            self._wake.clear()
+            if not self._running: break
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error(f"Buffer flush failed: {e}")
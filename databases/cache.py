@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
+
+class _SimpleTTLCache:
+    """cachetools 不可用时的退化实现：OrderedDict LRU + 逐条过期时间。"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None: return default
+        if item[1] < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return item[0]
+
+    def __setitem__(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._data.clear()
+
+
+class SearchResultCache:
+    """search_memory 结果缓存（容量 + TTL 双重淘汰）。
+
+    每次记忆写入后调用 bump() 递增写代数并清空缓存；查询开始时记下代数，
+    只有结果算完时代数没变才会写回缓存，避免把写入前读到的旧结果缓存下来。
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self._lock = threading.Lock()
+        maxsize, ttl = max(1, int(maxsize)), max(1, float(ttl))
+        self._cache = TTLCache(maxsize, ttl) if TTLCache else _SimpleTTLCache(maxsize, ttl)
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def bump(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def get(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return [dict(r) for r in value]
+
+    def put(self, key, generation, value):
+        with self._lock:
+            if generation != self._generation: return
+            self._cache[key] = [dict(r) for r in value]
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {'size': len(self._cache), 'generation': self._generation,
+                    'hits': self._hits, 'misses': self._misses,
+                    'hit_rate': round(self._hits / total, 3) if total else 0,
+                    'backend': 'cachetools' if TTLCache else 'builtin'}
+
+
+class RelationshipCache:
+    """按 user_id 缓存关系档案行（容量 LRU + TTL），查无此人的结果也缓存，群里陌生人发言不会每次查库。
+
+    写关系后调用 invalidate(user_id)（批量改动调用 clear()）。写代数机制同 SearchResultCache：
+    查库前记下代数，期间有失效发生则不写回，避免把失效前读到的旧行缓存下来。ttl <= 0 时不缓存。
+    """
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self._lock = threading.Lock()
+        self.enabled = float(ttl) > 0
+        maxsize, ttl = max(1, int(maxsize)), max(1, float(ttl))
+        self._cache = TTLCache(maxsize, ttl) if TTLCache else _SimpleTTLCache(maxsize, ttl)
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def lookup(self, user_id):
+        """返回 (是否命中, 关系 dict 的副本或 None)。"""
+        with self._lock:
+            entry = self._cache.get(user_id) if self.enabled else None
+            if entry is None:
+                self._misses += 1
+                return False, None
+            self._hits += 1
+        return True, dict(entry[0]) if entry[0] else None
+
+    def put(self, user_id, generation, rel):
+        if not self.enabled: return
+        with self._lock:
+            if generation != self._generation: return
+            self._cache[user_id] = (dict(rel) if rel else None,)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            for user_id in user_ids:
+                self._cache.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {'size': len(self._cache), 'hits': self._hits, 'misses': self._misses,
+                    'hit_rate': round(self._hits / total, 3) if total else 0,
+                    'invalidations': self._invalidations, 'enabled': self.enabled,
+                    'backend': 'cachetools' if TTLCache else 'builtin'}
@@ -0,0 +1,54 @@
+import re
+
+
+class CategoryClassifier:
+    """记忆自动分类器。
+
+    把各分类的关键词（统一小写、长词在前）编成一个正则多选，正文小写后从左到右逐个命中位置
+    查找：每次取该位置最长的关键词，再从下一个字符继续，同一位置上更短的命中必是它的前缀，
+    建表时预先展开，因此重叠、嵌套的关键词都能计入。每个分类的得分为命中的不同关键词个数，取最高分；
+    同分时按分类定义顺序取靠前的。配置了 memory_categories 时只在其中的内置分类里选，
+    配置的分类名本身也作为该分类的关键词；一个都没命中时退回 configured[0]，未配置则为 default。
+    """
+
+    def __init__(self, keywords, configured=(), default='general'):
+        self.default = default
+        self.configured = list(configured or [])
+        self._order = {}
+        self._word_cats = {}
+        allowed = set(self.configured)
+        for cat, words in keywords.items():
+            if allowed and cat not in allowed: continue
+            for w in words:
+                self._add(cat, w)
+        for cat in self.configured:
+            self._add(cat, cat)
+        words = sorted(self._word_cats, key=lambda w: (-len(w), w))
+        self._prefixes = {w: [p for p in words if w.startswith(p)] for w in words}
+        self._pattern = re.compile('|'.join(map(re.escape, words))) if words else None
+
+    def _add(self, cat, word):
+        word = str(word or '').lower()
+        if not word: return
+        self._order.setdefault(cat, len(self._order))
+        self._word_cats.setdefault(word, set()).add(cat)
+
+    def classify(self, text):
+        scores = {}
+        if self._pattern is not None and text:
+            text = text.lower()
+            search = self._pattern.search
+            longest = set()
+            m = search(text)
+            while m is not None:
+                longest.add(m.group())
+                m = search(text, m.start() + 1)
+            hits = set()
+            for word in longest:
+                hits.update(self._prefixes[word])
+            for word in hits:
+                for cat in self._word_cats[word]:
+                    scores[cat] = scores.get(cat, 0) + 1
+        if scores:
+            return min(scores, key=lambda c: (-scores[c], self._order[c]))
+        return self.configured[0] if self.configured else self.default
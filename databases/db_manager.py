@@ -1,12 +1,31 @@
 import sqlite3
 import os
 import re
+import base64
+import json
 import math
 import hashlib
-import difflib
+import heapq
+import tempfile
+import threading
+import time
 import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
 from datetime import datetime, timedelta
 
+from .glossary_index import FuzzyTermIndex, GlossaryMatcher, normalize_term
+from .classifier import CategoryClassifier
+from .export import EXPORT_FORMATS, encode_rows
+from .importer import MemoryImporter
+from .mmr import mmr_select
+from .pool import ConnectionPool, configure_connection
+from .related_pool import RelatedMemoryPool
+from .near_dup import lsh_keys, minhash, similarity as minhash_similarity
+from .tokenizer import TokenizerService, get_jieba as _get_jieba
+from .vector_index import VectorIndex, embed_text
+from .vector_index import np as _np
+
 try:
     from astrbot.api import logger
 except ImportError:
@@ -14,76 +33,111 @@ except ImportError:
     logger = logging.getLogger(__name__)
 
 
-def normalize_term(term):
-    """归一化梗词用于去重比较：全角转半角、小写、去空格。"""
-    if not term:
-        return ""
-    s = unicodedata.normalize("NFKC", str(term))
-    return s.lower().replace(" ", "").strip()
-
-_jieba_instance = None
-_pseg_instance = None
-_jieba_initialized = False
-
-def _get_jieba():
-    global _jieba_instance, _pseg_instance, _jieba_initialized
-    if not _jieba_initialized:
-        try:
-            import jieba
-            import jieba.posseg as pseg
-            _jieba_instance = jieba
-            _pseg_instance = pseg
-            _jieba_initialized = True
-            logger.info("jieba分词器已加载")
-        except ImportError:
-            logger.warning("jieba未安装，将使用正则分词")
-    return _jieba_instance, _pseg_instance
-
 class DatabaseManager:
     def __init__(self, config=None, context=None):
         self.config = config or {}
         self.context = context
         self.db_path = None
         self.backup_manager = None
+        self._pool = None
+        self._writer = None
+        from .buffers import AccessStatsBuffer, GlossaryHitBuffer, InteractionTracker
+        self._access_stats = AccessStatsBuffer()
+        self._interactions = InteractionTracker()
+        self._glossary_hits = GlossaryHitBuffer()
+        from .cache import RelationshipCache, SearchResultCache
+        self._search_cache = SearchResultCache(
+            self.config.get('search_cache_size', 256), self.config.get('search_cache_ttl', 300))
+        self._relation_cache = RelationshipCache(
+            self.config.get('relation_cache_size', 4096), self.config.get('relation_cache_ttl', 300))
+        self._tokenizer = TokenizerService(self.config.get('tokenizer_cache_size', 4096))
+        self._flusher = None
+        self._glossary_matcher = None
+        self._glossary_fuzzy = None
+        self._glossary_index_lock = threading.Lock()
+        self._search_executor = None
+        self._search_stats_lock = threading.Lock()
+        self._search_stats = {'parallel_queries': 0, 'deadline_misses': 0, 'cancelled_retrievers': 0,
+                              'interrupted_retrievers': 0}
+        self._index_backfill = None
+        self._index_backfill_stop = threading.Event()
+        self._fts_seg_mode = None
+        self._fts_seg_ready = False
+        self._vector_index = None
+        self._vector_index_lock = threading.Lock()
+        self._related_pool = None
+        self._related_pool_lock = threading.Lock()
+        self._related_pool_thread = None
+        self._category_classifier = None
+        self._importer = None
+        self._importer_lock = threading.Lock()
 
     def _get_connection(self):
-        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
-        conn.row_factory = sqlite3.Row
-        conn.execute('PRAGMA journal_mode = WAL')
-        conn.execute('PRAGMA synchronous = NORMAL')
-        conn.execute('PRAGMA busy_timeout = 15000')
-        conn.execute('PRAGMA cache_size = -2000')
-        conn.execute('PRAGMA foreign_keys = ON')
-        return conn
+        return configure_connection(sqlite3.connect(self.db_path, check_same_thread=False, timeout=30))
+
+    def _acquire_connection(self):
+        if self._pool is None:
+            return self._get_connection(), False
+        return self._pool.acquire()
+
+    def _release_connection(self, conn, pooled, broken=False):
+        if conn is None: return
+        if self._pool is None:
+            try: conn.close()
+            except Exception: pass
+        elif broken and pooled:
+            self._pool.discard()
+        else:
+            self._pool.release(conn, pooled)
+
+    def _integrity_error_result(self, e):
+        err_msg = str(e).lower()
+        if 'unique' in err_msg or 'hash' in err_msg or 'memories' in err_msg:
+            return "already_exists"
+        logger.error(f"Integrity error: {e}")
+        return f"Error: integrity violation - {e}"
 
     def _execute_write(self, func):
+        if self._writer is None or not self._writer.running or self._writer.in_writer_thread():
+            return self._execute_write_direct(func)
+        try:
+            return self._writer.submit(func).result()
+        except sqlite3.IntegrityError as e:
+            return self._integrity_error_result(e)
+        except Exception as e:
+            logger.error(f"Write error: {e}")
+            return None
+
+    def _on_writer_malformed(self):
+        if self._pool: self._pool.close_all()
+        self._rebuild_database()
+
+    def _execute_write_direct(self, func):
         conn = None
+        pooled = False
+        broken = False
         try:
-            conn = self._get_connection()
+            conn, pooled = self._acquire_connection()
             result = func(conn)
             conn.commit()
             return result
         except sqlite3.IntegrityError as e:
-            err_msg = str(e).lower()
-            if 'unique' in err_msg or 'hash' in err_msg or 'memories' in err_msg:
-                return "already_exists"
-            logger.error(f"Integrity error: {e}")
-            return f"Error: integrity violation - {e}"
+            return self._integrity_error_result(e)
         except Exception as e:
             err_msg = str(e).lower()
             if 'malformed' in err_msg:
                 logger.error(f"Database malformed, rebuilding...")
-                if conn:
-                    try: conn.close()
-                    except Exception: pass
+                self._release_connection(conn, pooled, broken=True)
                 conn = None
+                if self._pool: self._pool.close_all()
                 self._rebuild_database()
                 try:
-                    conn = self._get_connection()
+                    conn, pooled = self._acquire_connection()
                     result = func(conn)
                     conn.commit()
                     return result
                 except Exception as e2:
+                    broken = True
                     logger.error(f"Still failed after rebuild: {e2}")
                     return None
             if 'locked' in err_msg:
@@ -91,37 +145,39 @@ class DatabaseManager:
                 time.sleep(0.3)
                 try:
                     if conn:
-                        try: conn.close()
+                        try: conn.rollback()
                         except Exception: pass
-                    conn = self._get_connection()
+                    else:
+                        conn, pooled = self._acquire_connection()
                     result = func(conn)
                     conn.commit()
                     return result
                 except Exception as e2:
                     logger.error(f"Write failed after lock retry: {e2}")
                     return None
+            broken = True
             logger.error(f"Write error: {e}")
             return None
         finally:
-            if conn:
-                try: conn.close()
-                except Exception: pass
+            self._release_connection(conn, pooled, broken)
 
     def _execute_read(self, func):
         conn = None
+        pooled = False
+        broken = False
         try:
-            conn = self._get_connection()
+            conn, pooled = self._acquire_connection()
             return func(conn)
         except Exception as e:
+            broken = isinstance(e, sqlite3.DatabaseError) and not isinstance(e, sqlite3.OperationalError)
             logger.debug(f"Read error: {e}")
             return None
         finally:
-            if conn:
-                try: conn.close()
-                except Exception: pass
+            self._release_connection(conn, pooled, broken)
 
     def _rebuild_database(self):
         logger.warning(f"Rebuilding database from scratch: {self.db_path}")
+        self._relation_cache.clear()
         try:
             if os.path.exists(self.db_path):
                 os.remove(self.db_path)
@@ -134,8 +190,19 @@ class DatabaseManager:
         self._initialize_database_structure()
         self._migrate_relationship_fields()
         self._migrate_activities_fk()
+        self._migrate_glossary_term_norm()
+        self._migrate_memory_tags()
+        self._migrate_term_index()
+        self._migrate_term_categories()
+        self._migrate_row_counts()
+        self._migrate_fts_seg()
         self._clean_dirty_categories()
         self._cleanup_blank_relationships()
+        self._invalidate_glossary_index()
+        self._invalidate_vector_index()
+        self.invalidate_search_cache()
+        self._start_index_backfill()
+        self._refresh_related_pool()
         logger.info("Database rebuilt successfully")
         backup_dir = os.path.join(os.path.dirname(self.db_path), "backups")
         if os.path.exists(backup_dir):
@@ -161,13 +228,39 @@ class DatabaseManager:
         if os.path.exists(old_db) and not os.path.exists(self.db_path):
             import shutil
             shutil.copy2(old_db, self.db_path)
+        self._pool = ConnectionPool(
+            self.db_path,
+            max_connections=self.config.get('db_pool_max_connections', 16),
+            health_check_interval=self.config.get('db_pool_health_check_interval', 60))
+        from .writer import GroupCommitWriter
+        self._writer = GroupCommitWriter(
+            self._get_connection,
+            max_batch_size=self.config.get('write_batch_max_size', 64),
+            max_delay=self.config.get('write_batch_max_delay_ms', 2) / 1000.0,
+            on_malformed=self._on_writer_malformed,
+            slow_op_ms=self.config.get('write_slow_op_ms', 50))
+        self._writer.start()
+        from .buffers import BufferFlusher
+        self._flusher = BufferFlusher(self.flush_pending_writes, self.config.get('stats_flush_interval', 30))
+        self._flusher.start()
+        if self.config.get('search_parallel_enabled', True):
+            self._search_executor = ThreadPoolExecutor(
+                max_workers=self.config.get('search_parallel_workers', 4), thread_name_prefix='MemoryCapsuleSearch')
         self._initialize_database_structure()
         self._check_integrity()
         self._migrate_old_data()
         self._migrate_relationship_fields()
         self._migrate_activities_fk()
+        self._migrate_glossary_term_norm()
+        self._migrate_memory_tags()
+        self._migrate_term_index()
+        self._migrate_term_categories()
+        self._migrate_row_counts()
+        self._migrate_fts_seg()
         self._clean_dirty_categories()
         self._cleanup_blank_relationships()
+        self._start_index_backfill()
+        self._refresh_related_pool()
         if not self.config.get('lightweight_mode', False):
             _get_jieba()
         from .backup import BackupManager
@@ -184,11 +277,13 @@ class DatabaseManager:
             conn.close()
             if result and result[0] != 'ok':
                 logger.warning(f"Database integrity check failed: {result[0]}")
+                if self._pool: self._pool.close_all()
                 self._rebuild_database()
             else:
                 logger.info("Database integrity check passed")
         except Exception as e:
             logger.warning(f"Database integrity check error: {e}")
+            if self._pool: self._pool.close_all()
             self._rebuild_database()
 
     def _migrate_old_data(self):
@@ -247,6 +342,412 @@ class DatabaseManager:
                 logger.info("Activities FK migration completed")
         self._execute_write(_do_migrate)
 
+    def _migrate_glossary_term_norm(self):
+        """为 glossary 增加持久化的归一化词列 term_norm 并建唯一索引。
+
+        回填沿用 normalize_term；归一化为空的词条，以及历史数据中归一化后重复的词条保留原行但
+        term_norm 为 NULL，由最早的那条承担去重（UNIQUE 索引里 NULL 互不相等，多个 NULL 不冲突）。
+        """
+        def _do_migrate(conn):
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info(glossary)")
+            columns = {row[1] for row in cursor.fetchall()}
+            if 'term_norm' not in columns:
+                cursor.execute('ALTER TABLE glossary ADD COLUMN term_norm TEXT')
+                logger.info("Migrated: added glossary.term_norm")
+            # 归一化为空的词条统一存 NULL（旧版本 add_glossary 写过空串），不参与去重
+            cursor.execute("UPDATE glossary SET term_norm = NULL WHERE term_norm = ''")
+            cursor.execute('SELECT term_norm FROM glossary WHERE term_norm IS NOT NULL')
+            seen = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SELECT id, term FROM glossary WHERE term_norm IS NULL ORDER BY id')
+            updates = []
+            duplicates = 0
+            for row in cursor.fetchall():
+                norm = normalize_term(row[1])
+                if not norm: continue
+                if norm in seen:
+                    duplicates += 1
+                    continue
+                seen.add(norm)
+                updates.append((norm, row[0]))
+            if updates:
+                cursor.executemany('UPDATE glossary SET term_norm = ? WHERE id = ?', updates)
+                logger.info(f"Backfilled glossary.term_norm for {len(updates)} rows")
+            if duplicates:
+                logger.warning(f"{duplicates} glossary rows duplicate an existing term after normalization")
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_glossary_term_norm ON glossary(term_norm)')
+        self._execute_write(_do_migrate)
+
+    def _migrate_term_index(self):
+        """检查 TF-IDF 倒排索引的分词方式，变化时清空重建；然后在后台补建缺失的记忆。"""
+        mode = self._tokenizer_mode()
+        def _do_migrate(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM index_meta WHERE key = 'term_index_tokenizer'")
+            row = cursor.fetchone()
+            if row and row[0] != mode:
+                logger.info(f"Tokenizer changed ({row[0]} -> {mode}), rebuilding term index")
+                cursor.execute('DELETE FROM memory_terms')
+                cursor.execute('DELETE FROM term_df')
+                cursor.execute('DELETE FROM memory_term_docs')
+                cursor.execute('DELETE FROM term_categories')
+            cursor.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('term_index_tokenizer', ?)", (mode,))
+        self._execute_write(_do_migrate)
+
+    def _migrate_memory_tags(self):
+        """把 memories.tags 里逗号分隔的标签一次性拆进 memory_tags 表。"""
+        def _do_migrate(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM index_meta WHERE key = 'memory_tags_migrated'")
+            if cursor.fetchone(): return
+            cursor.execute("SELECT id, tags FROM memories WHERE tags IS NOT NULL AND tags != ''")
+            rows = [(memory_id, tag) for memory_id, tags in cursor.fetchall() for tag in self._split_tags(tags)]
+            cursor.executemany('INSERT OR IGNORE INTO memory_tags (memory_id, tag) VALUES (?, ?)', rows)
+            cursor.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('memory_tags_migrated', '1')")
+            if rows: logger.info(f"Migrated {len(rows)} memory tags into memory_tags")
+        self._execute_write(_do_migrate)
+
+    def _migrate_term_categories(self):
+        """term_categories 表新建时按已有倒排索引一次性汇总，之后由触发器增量维护。"""
+        def _do_migrate(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM index_meta WHERE key = 'term_categories_ready'")
+            if cursor.fetchone(): return
+            cursor.execute('DELETE FROM term_categories')
+            cursor.execute(
+                'INSERT INTO term_categories (term, category, count) '
+                'SELECT t.term, m.category, COUNT(*) FROM memory_terms t JOIN memories m ON m.id = t.memory_id '
+                'WHERE m.category IS NOT NULL GROUP BY t.term, m.category')
+            cursor.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('term_categories_ready', '1')")
+        self._execute_write(_do_migrate)
+
+    def _migrate_row_counts(self):
+        """row_counts 表首次建立时按现有数据汇总一次，之后由触发器增量维护。"""
+        def _do_migrate(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM index_meta WHERE key = 'row_counts_ready'")
+            if cursor.fetchone(): return
+            cursor.execute('DELETE FROM row_counts')
+            for table in ('memories', 'glossary', 'relationships'):
+                cursor.execute(f"INSERT INTO row_counts (tbl, category, count) SELECT '{table}', '', COUNT(*) FROM {table}")
+            for table in ('memories', 'glossary'):
+                cursor.execute(
+                    f"INSERT INTO row_counts (tbl, category, count) SELECT '{table}', category, COUNT(*) FROM {table} "
+                    f"WHERE category != '' GROUP BY category")
+            cursor.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('row_counts_ready', '1')")
+        self._execute_write(_do_migrate)
+
+    def _start_index_backfill(self):
+        """后台补建 TF-IDF 倒排索引与分词 FTS 索引（已有数据库升级或重建后）。"""
+        if self._index_backfill and self._index_backfill.is_alive(): return
+        self._index_backfill_stop.clear()
+        self._index_backfill = threading.Thread(
+            target=self._run_index_backfill, daemon=True, name='MemoryCapsuleIndexer')
+        self._index_backfill.start()
+
+    def _stop_index_backfill(self):
+        self._index_backfill_stop.set()
+        if self._index_backfill and self._index_backfill is not threading.current_thread():
+            self._index_backfill.join(timeout=10)
+        self._index_backfill = None
+
+    def _run_index_backfill(self):
+        try:
+            self._backfill_term_index()
+            self._backfill_fts_seg()
+            self._backfill_vectors()
+            self._backfill_minhash()
+        except Exception as e:
+            logger.error(f"Index backfill failed: {e}")
+
+    def _backfill_term_index(self, chunk_size=200):
+        """分批为尚未建索引的记忆分词入库；分词在写事务之外完成，写入时再确认记忆仍未被索引。"""
+        last_id = 0
+        indexed = 0
+        while not self._index_backfill_stop.is_set():
+            def _read(conn):
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT id, content, tags FROM memories m WHERE id > ? AND NOT EXISTS '
+                    '(SELECT 1 FROM memory_term_docs d WHERE d.memory_id = m.id) ORDER BY id LIMIT ?',
+                    (last_id, chunk_size))
+                return cursor.fetchall()
+            rows = self._execute_read(_read)
+            if not rows: break
+            last_id = rows[-1][0]
+            prepared = [(row[0], self._term_rows(row[1], row[2])) for row in rows]
+            def _do_op(conn):
+                cursor = conn.cursor()
+                done = 0
+                for memory_id, terms in prepared:
+                    cursor.execute(
+                        'SELECT 1 FROM memories m WHERE id = ? AND NOT EXISTS '
+                        '(SELECT 1 FROM memory_term_docs d WHERE d.memory_id = m.id)', (memory_id,))
+                    if not cursor.fetchone(): continue
+                    self._index_memory(cursor, memory_id, terms)
+                    done += 1
+                return done
+            result = self._execute_write(_do_op)
+            if result is None: break
+            if result: self.invalidate_search_cache()
+            indexed += result
+        if indexed:
+            logger.info(f"Term index backfilled for {indexed} memories")
+
+    def _vector_enabled(self):
+        return _np is not None and self.config.get('vector_search_enabled', False)
+
+    def _vector_dim(self):
+        return int(self.config.get('vector_dim', 256))
+
+    def _embed_memory(self, content, tags):
+        """计算记忆向量（int8 字节串），未启用或无特征时为 None。"""
+        if not self._vector_enabled(): return None
+        return embed_text(f"{content or ''} {tags or ''}", self._vector_dim())
+
+    def _index_vector(self, cursor, memory_id, blob):
+        """在写事务内替换记忆向量，返回 blob（由 _embed_memory 预先算好）。
+
+        blob 为 None（未启用或无特征）时也会删掉旧向量，之后再启用由后台补建，不会用到过期向量。
+        """
+        cursor.execute('DELETE FROM memory_vectors WHERE memory_id = ?', (memory_id,))
+        if blob is not None:
+            cursor.execute('INSERT INTO memory_vectors (memory_id, dim, vec) VALUES (?, ?, ?)',
+                           (memory_id, self._vector_dim(), blob))
+        return blob
+
+    def _vector_index_sync(self, updates):
+        """写库成功后把 [(memory_id, blob 或 None)] 同步进已加载的向量索引。"""
+        with self._vector_index_lock:
+            index = self._vector_index
+        if index is None: return
+        for memory_id, blob in updates:
+            if blob is None: index.remove(memory_id)
+            else: index.upsert(memory_id, blob)
+
+    def _invalidate_vector_index(self):
+        with self._vector_index_lock:
+            self._vector_index = None
+
+    def _ensure_vector_index(self, conn):
+        with self._vector_index_lock:
+            if self._vector_index is None:
+                index = VectorIndex(self._vector_dim(),
+                                    ivf_min_size=self.config.get('vector_ivf_min_size', 20000),
+                                    nprobe=self.config.get('vector_ivf_nprobe', 8))
+                cursor = conn.cursor()
+                cursor.execute('SELECT memory_id, vec FROM memory_vectors WHERE dim = ?', (self._vector_dim(),))
+                index.load(cursor.fetchall())
+                self._vector_index = index
+                logger.info(f"Vector index loaded: {len(index)} vectors")
+            return self._vector_index
+
+    def _backfill_vectors(self, chunk_size=500):
+        """为缺少向量（或维度与配置不符）的记忆分批补算向量。"""
+        if not self._vector_enabled(): return
+        dim = self._vector_dim()
+        last_id = 0
+        indexed = 0
+        while not self._index_backfill_stop.is_set():
+            def _read(conn):
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT id, content, tags, hash FROM memories m WHERE id > ? AND NOT EXISTS '
+                    '(SELECT 1 FROM memory_vectors v WHERE v.memory_id = m.id AND v.dim = ?) ORDER BY id LIMIT ?',
+                    (last_id, dim, chunk_size))
+                return cursor.fetchall()
+            rows = self._execute_read(_read)
+            if not rows: break
+            last_id = rows[-1][0]
+            prepared = [(row[0], row[2], row[3], embed_text(f"{row[1] or ''} {row[2] or ''}", dim)) for row in rows]
+            done = []
+            def _do_op(conn):
+                del done[:]
+                cursor = conn.cursor()
+                for memory_id, tags, content_hash, blob in prepared:
+                    cursor.execute('SELECT 1 FROM memories WHERE id = ? AND hash IS ? AND tags IS ?',
+                                   (memory_id, content_hash, tags))
+                    if not cursor.fetchone(): continue
+                    cursor.execute('DELETE FROM memory_vectors WHERE memory_id = ?', (memory_id,))
+                    if blob is not None:
+                        cursor.execute('INSERT INTO memory_vectors (memory_id, dim, vec) VALUES (?, ?, ?)',
+                                       (memory_id, dim, blob))
+                    done.append((memory_id, blob))
+                return len(done)
+            if self._execute_write(_do_op) is None: break
+            self._vector_index_sync(done)
+            indexed += len(done)
+        if indexed:
+            self.invalidate_search_cache()
+            logger.info(f"Vectors backfilled for {indexed} memories")
+
+    def _index_minhash(self, cursor, memory_id, signature):
+        """在写事务内替换一条记忆的 MinHash 签名和 LSH 分桶键（签名为 None 时只记一行空签名，表示已处理）。"""
+        cursor.execute('DELETE FROM memory_lsh WHERE memory_id = ?', (memory_id,))
+        cursor.execute('INSERT OR REPLACE INTO memory_minhash (memory_id, sig) VALUES (?, ?)', (memory_id, signature))
+        if signature is not None:
+            cursor.executemany('INSERT OR IGNORE INTO memory_lsh (band, key, memory_id) VALUES (?, ?, ?)',
+                               [(band, key, memory_id) for band, key in enumerate(lsh_keys(signature))])
+
+    def _near_dup_policy(self):
+        policy = self.config.get('near_dup_policy', 'keep')
+        return policy if policy in ('keep', 'reject', 'merge') else 'keep'
+
+    def _near_dup_threshold(self, threshold=None):
+        if threshold is None: threshold = self.config.get('near_dup_threshold', 0.75)
+        return min(max(float(threshold), 0.0), 1.0)
+
+    def _find_near_duplicate(self, cursor, signature, exclude_id=None, max_candidates=200):
+        """按 LSH 分桶键找候选，返回估计相似度最高且达到阈值的 (memory_id, similarity)，没有则为 None。"""
+        if signature is None: return None
+        threshold = self._near_dup_threshold()
+        keys = list(enumerate(lsh_keys(signature)))
+        cursor.execute(
+            f'SELECT s.memory_id, s.sig FROM memory_minhash s WHERE s.memory_id IN '
+            f'(SELECT memory_id FROM memory_lsh WHERE {" OR ".join(["(band = ? AND key = ?)"] * len(keys))} '
+            f'LIMIT ?)', [v for pair in keys for v in pair] + [max_candidates])
+        best = None
+        for memory_id, other in cursor.fetchall():
+            if memory_id == exclude_id or other is None: continue
+            score = minhash_similarity(signature, other)
+            if score >= threshold and (best is None or (score, -memory_id) > (best[1], -best[0])):
+                best = (memory_id, score)
+        return best
+
+    def _merge_near_duplicate(self, cursor, target_id, importance=None, access_count=1):
+        """把一条近似重复的记忆并入已有记忆：重要度取较大值，访问次数累加。"""
+        now = datetime.now().isoformat()
+        cursor.execute(
+            'UPDATE memories SET importance = MAX(importance, COALESCE(?, importance)), '
+            'access_count = access_count + ?, last_accessed = ?, updated_at = ? WHERE id = ?',
+            (importance, access_count, now, now, target_id))
+
+    def _backfill_minhash(self, chunk_size=500):
+        """为还没有签名记录的记忆分批补算 MinHash。"""
+        last_id = 0
+        indexed = 0
+        while not self._index_backfill_stop.is_set():
+            def _read(conn):
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT id, content, hash FROM memories m WHERE id > ? AND NOT EXISTS '
+                    '(SELECT 1 FROM memory_minhash s WHERE s.memory_id = m.id) ORDER BY id LIMIT ?',
+                    (last_id, chunk_size))
+                return cursor.fetchall()
+            rows = self._execute_read(_read)
+            if not rows: break
+            last_id = rows[-1][0]
+            prepared = [(row[0], row[2], minhash(row[1])) for row in rows]
+            def _do_op(conn):
+                cursor = conn.cursor()
+                done = 0
+                for memory_id, content_hash, signature in prepared:
+                    cursor.execute('SELECT 1 FROM memories WHERE id = ? AND hash IS ?', (memory_id, content_hash))
+                    if not cursor.fetchone(): continue
+                    self._index_minhash(cursor, memory_id, signature)
+                    done += 1
+                return done
+            result = self._execute_write(_do_op)
+            if result is None: break
+            indexed += result
+        if indexed:
+            logger.info(f"MinHash signatures backfilled for {indexed} memories")
+
+    def _fts_seg_wanted_mode(self):
+        mode = self.config.get('fts_cjk_mode', 'auto')
+        if mode == 'off': return None
+        if mode in ('auto', 'jieba') and self._tokenizer_mode() == 'jieba': return 'jieba'
+        return 'trigram'
+
+    def _migrate_fts_seg(self):
+        """按 fts_cjk_mode 准备中文分词全文索引 memories_fts_seg。
+
+        jieba 模式存分好词、以空格连接的文本（unicode61 即可按词切分），trigram 模式存原文
+        交给 FTS5 trigram 分词器。模式变化时删表重建，重建进度记在 index_meta 里由后台分批续做。
+        """
+        mode = self._fts_seg_wanted_mode()
+        def _do_migrate(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT key, value FROM index_meta WHERE key IN ('fts_seg_mode', 'fts_seg_ready')")
+            meta = {row[0]: row[1] for row in cursor.fetchall()}
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='memories_fts_seg'")
+            exists = cursor.fetchone() is not None
+            if meta.get('fts_seg_mode', '') == (mode or '') and exists == bool(mode):
+                return meta.get('fts_seg_ready') == '1'
+            cursor.execute('DROP TRIGGER IF EXISTS memories_fts_seg_ad')
+            cursor.execute('DROP TABLE IF EXISTS memories_fts_seg')
+            if mode:
+                tokenizer = 'trigram' if mode == 'trigram' else 'unicode61'
+                cursor.execute(f"CREATE VIRTUAL TABLE memories_fts_seg USING fts5(content, tags, tokenize='{tokenizer}')")
+                cursor.execute('''CREATE TRIGGER memories_fts_seg_ad AFTER DELETE ON memories BEGIN
+                    DELETE FROM memories_fts_seg WHERE rowid = old.id; END''')
+                logger.info(f"Created CJK FTS index ({mode}), re-indexing in background")
+            cursor.executemany('INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)',
+                               [('fts_seg_mode', mode or ''), ('fts_seg_cursor', '0'), ('fts_seg_ready', '0')])
+            return False
+        ready = self._execute_write(_do_migrate)
+        if ready is None and mode:
+            logger.warning(f"CJK FTS index ({mode}) unavailable, using default FTS")
+            self._fts_seg_mode, self._fts_seg_ready = None, False
+            return
+        self._fts_seg_mode = mode
+        self._fts_seg_ready = bool(mode and ready)
+
+    def _fts_seg_text(self, text):
+        text = text or ''
+        if self._fts_seg_mode == 'jieba':
+            words = self._tokenizer.cut_for_search(text, cache=False)
+            if words is not None:
+                return ' '.join(w for w in words if w.strip())
+        return text
+
+    def _index_fts_seg(self, cursor, memory_id, seg_content, seg_tags):
+        """写入已分好词（_fts_seg_text）的正文和标签。"""
+        if not self._fts_seg_mode: return
+        cursor.execute('DELETE FROM memories_fts_seg WHERE rowid = ?', (memory_id,))
+        cursor.execute('INSERT INTO memories_fts_seg (rowid, content, tags) VALUES (?, ?, ?)',
+                       (memory_id, seg_content, seg_tags))
+
+    def _backfill_fts_seg(self, chunk_size=200):
+        """从 index_meta 记录的游标处继续为已有记忆建分词全文索引，每批提交一次游标，中断后可续做。"""
+        if not self._fts_seg_mode or self._fts_seg_ready: return
+        def _read_cursor(conn):
+            row = conn.execute("SELECT value FROM index_meta WHERE key = 'fts_seg_cursor'").fetchone()
+            return int(row[0]) if row and row[0] else 0
+        last_id = self._execute_read(_read_cursor) or 0
+        while not self._index_backfill_stop.is_set():
+            def _read(conn):
+                cursor = conn.cursor()
+                cursor.execute('SELECT id, content, tags, hash FROM memories WHERE id > ? ORDER BY id LIMIT ?',
+                               (last_id, chunk_size))
+                return cursor.fetchall()
+            rows = self._execute_read(_read)
+            if rows is None: return
+            if not rows:
+                def _finish(conn):
+                    conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('fts_seg_ready', '1')")
+                    return True
+                if self._execute_write(_finish):
+                    self._fts_seg_ready = True
+                    self.invalidate_search_cache()
+                    logger.info("CJK FTS index ready")
+                return
+            chunk_end = rows[-1][0]
+            prepared = [(row[0], row[2], row[3], self._fts_seg_text(row[1]), self._fts_seg_text(row[2]))
+                        for row in rows]
+            def _do_op(conn):
+                cursor = conn.cursor()
+                for memory_id, tags, content_hash, seg_content, seg_tags in prepared:
+                    # 读出后被修改过的记忆已由 update_memory 重新索引，跳过
+                    cursor.execute('SELECT 1 FROM memories WHERE id = ? AND hash IS ? AND tags IS ?',
+                                   (memory_id, content_hash, tags))
+                    if not cursor.fetchone(): continue
+                    self._index_fts_seg(cursor, memory_id, seg_content, seg_tags)
+                cursor.execute("UPDATE index_meta SET value = ? WHERE key = 'fts_seg_cursor'", (str(chunk_end),))
+                return True
+            if self._execute_write(_do_op) is None: return
+            last_id = chunk_end
+
     def _initialize_database_structure(self):
         conn = None
         try:
@@ -280,13 +781,104 @@ class DatabaseManager:
                 tags TEXT DEFAULT '',
                 hit_count INTEGER DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                term_norm TEXT)''')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_memories_category ON memories(category)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_memories_importance ON memories(importance)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_memories_created ON memories(created_at)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_relationships_nickname ON relationships(nickname)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_glossary_term ON glossary(term)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_glossary_category ON glossary(category)')
+            # 键集分页用的复合索引（idx_memories_created 已隐含 rowid，即 (created_at, id)）
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_memories_category_created ON memories(category, created_at, id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_relationships_updated ON relationships(updated_at, user_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_glossary_created ON glossary(created_at, id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_glossary_category_created ON glossary(category, created_at, id)')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS glossary_hits (
+                glossary_id INTEGER NOT NULL, bucket TEXT NOT NULL, group_id TEXT NOT NULL DEFAULT '',
+                hits INTEGER DEFAULT 0, PRIMARY KEY (glossary_id, bucket, group_id))''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_glossary_hits_bucket ON glossary_hits(bucket)')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS memory_terms (
+                term TEXT NOT NULL, memory_id INTEGER NOT NULL, tf INTEGER NOT NULL,
+                in_tags INTEGER DEFAULT 0, first_pos INTEGER,
+                PRIMARY KEY (term, memory_id)) WITHOUT ROWID''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_memory_terms_memory ON memory_terms(memory_id)')
+            cursor.execute('CREATE TABLE IF NOT EXISTS term_df (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID')
+            cursor.execute('CREATE TABLE IF NOT EXISTS memory_term_docs (memory_id INTEGER PRIMARY KEY, length INTEGER DEFAULT 0)')
+            cursor.execute('CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS memory_tags (
+                memory_id INTEGER NOT NULL, tag TEXT NOT NULL COLLATE NOCASE,
+                PRIMARY KEY (memory_id, tag)) WITHOUT ROWID''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_memory_tags_tag ON memory_tags(tag, memory_id)')
+            cursor.execute('CREATE TABLE IF NOT EXISTS memory_vectors (memory_id INTEGER PRIMARY KEY, dim INTEGER NOT NULL, vec BLOB NOT NULL)')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memories_vectors_ad AFTER DELETE ON memories BEGIN
+                DELETE FROM memory_vectors WHERE memory_id = old.id; END''')
+            # MinHash 签名及 LSH 分桶键：任一段 (band, key) 相同即为近似重复候选；sig 为 NULL 表示文本太短不参与
+            cursor.execute('CREATE TABLE IF NOT EXISTS memory_minhash (memory_id INTEGER PRIMARY KEY, sig BLOB)')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS memory_lsh (
+                band INTEGER NOT NULL, key INTEGER NOT NULL, memory_id INTEGER NOT NULL,
+                PRIMARY KEY (band, key, memory_id)) WITHOUT ROWID''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_memory_lsh_memory ON memory_lsh(memory_id)')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memories_minhash_ad AFTER DELETE ON memories BEGIN
+                DELETE FROM memory_lsh WHERE memory_id = old.id;
+                DELETE FROM memory_minhash WHERE memory_id = old.id; END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memories_tags_ad AFTER DELETE ON memories BEGIN
+                DELETE FROM memory_tags WHERE memory_id = old.id; END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memory_terms_ai AFTER INSERT ON memory_terms BEGIN
+                INSERT INTO term_df(term, df) VALUES (new.term, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1; END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memory_terms_ad AFTER DELETE ON memory_terms BEGIN
+                UPDATE term_df SET df = df - 1 WHERE term = old.term;
+                DELETE FROM term_df WHERE term = old.term AND df <= 0; END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memories_terms_ad AFTER DELETE ON memories BEGIN
+                DELETE FROM memory_terms WHERE memory_id = old.id;
+                DELETE FROM memory_term_docs WHERE memory_id = old.id; END''')
+            # 词 -> 分类分布：随 memory_terms 增删和记忆改分类增量维护
+            cursor.execute('''CREATE TABLE IF NOT EXISTS term_categories (
+                term TEXT NOT NULL, category TEXT NOT NULL, count INTEGER NOT NULL,
+                PRIMARY KEY (term, category)) WITHOUT ROWID''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memory_terms_cat_ai AFTER INSERT ON memory_terms BEGIN
+                INSERT INTO term_categories(term, category, count)
+                    SELECT new.term, category, 1 FROM memories WHERE id = new.memory_id AND category IS NOT NULL
+                    ON CONFLICT(term, category) DO UPDATE SET count = count + 1; END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memory_terms_cat_ad AFTER DELETE ON memory_terms BEGIN
+                UPDATE term_categories SET count = count - 1
+                    WHERE term = old.term AND category = (SELECT category FROM memories WHERE id = old.memory_id);
+                DELETE FROM term_categories WHERE term = old.term AND count <= 0; END''')
+            # 删除记忆时 memories_terms_ad 触发的级联删除已查不到分类，这里在删除前按 old.category 扣减
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memories_term_categories_bd BEFORE DELETE ON memories BEGIN
+                UPDATE term_categories SET count = count - 1
+                    WHERE category = old.category AND term IN (SELECT term FROM memory_terms WHERE memory_id = old.id);
+                DELETE FROM term_categories WHERE category = old.category AND count <= 0
+                    AND term IN (SELECT term FROM memory_terms WHERE memory_id = old.id); END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS memories_term_categories_au AFTER UPDATE OF category ON memories
+                WHEN old.category IS NOT new.category BEGIN
+                UPDATE term_categories SET count = count - 1
+                    WHERE category = old.category AND term IN (SELECT term FROM memory_terms WHERE memory_id = new.id);
+                DELETE FROM term_categories WHERE category = old.category AND count <= 0
+                    AND term IN (SELECT term FROM memory_terms WHERE memory_id = new.id);
+                INSERT INTO term_categories(term, category, count)
+                    SELECT term, new.category, 1 FROM memory_terms WHERE memory_id = new.id AND new.category IS NOT NULL
+                    ON CONFLICT(term, category) DO UPDATE SET count = count + 1; END''')
+            # 行数计数表：category 为 '' 的一行是全表总数，其余为按分类的计数
+            cursor.execute('''CREATE TABLE IF NOT EXISTS row_counts (
+                tbl TEXT NOT NULL, category TEXT NOT NULL, count INTEGER NOT NULL,
+                PRIMARY KEY (tbl, category)) WITHOUT ROWID''')
+            for table, by_category in (('memories', True), ('glossary', True), ('relationships', False)):
+                inc_cat = dec_cat = ''
+                if by_category:
+                    inc_cat = f"""INSERT INTO row_counts(tbl, category, count) SELECT '{table}', new.category, 1
+                        WHERE new.category != '' ON CONFLICT(tbl, category) DO UPDATE SET count = count + 1;"""
+                    dec_cat = f"""UPDATE row_counts SET count = count - 1 WHERE tbl = '{table}' AND category = old.category;
+                        DELETE FROM row_counts WHERE tbl = '{table}' AND category = old.category AND count <= 0;"""
+                    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_count_au AFTER UPDATE OF category ON {table}
+                        WHEN old.category IS NOT new.category BEGIN {dec_cat} {inc_cat} END''')
+                cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_count_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO row_counts(tbl, category, count) VALUES ('{table}', '', 1)
+                        ON CONFLICT(tbl, category) DO UPDATE SET count = count + 1;
+                    {inc_cat} END''')
+                cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_count_ad AFTER DELETE ON {table} BEGIN
+                    UPDATE row_counts SET count = count - 1 WHERE tbl = '{table}' AND category = '';
+                    {dec_cat} END''')
             try:
                 cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
                     content, tags, category, content='memories', content_rowid='id')''')
@@ -305,6 +897,15 @@ class DatabaseManager:
 
     def close(self):
         if self.backup_manager: self.backup_manager.stop_auto_backup()
+        if self._flusher: self._flusher.stop()
+        self._stop_index_backfill()
+        if self._importer: self._importer.shutdown()
+        if self._search_executor:
+            self._search_executor.shutdown(wait=False, cancel_futures=True)
+            self._search_executor = None
+        self.flush_pending_writes()
+        if self._writer: self._writer.stop()
+        if self._pool: self._pool.close_all()
         logger.info("Database closed")
 
     def backup(self):
@@ -316,7 +917,25 @@ class DatabaseManager:
         return []
 
     def restore_from_backup(self, backup_filename):
-        if self.backup_manager: return self.backup_manager.restore_from_backup(backup_filename)
+        if self.backup_manager:
+            self._stop_index_backfill()
+            result = self.backup_manager.restore_from_backup(backup_filename)
+            if self._pool: self._pool.close_all()
+            self._invalidate_glossary_index()
+            self._invalidate_vector_index()
+            self.invalidate_search_cache()
+            self._relation_cache.clear()
+            # 旧备份可能缺少后加的表/索引，恢复后补齐并补建倒排索引
+            self._initialize_database_structure()
+            self._migrate_glossary_term_norm()
+            self._migrate_memory_tags()
+            self._migrate_term_index()
+            self._migrate_term_categories()
+            self._migrate_row_counts()
+            self._migrate_fts_seg()
+            self._start_index_backfill()
+            self._refresh_related_pool()
+            return result
         return "No backup manager"
 
     # ==================== Utility ====================
@@ -335,24 +954,93 @@ class DatabaseManager:
         sorted_ids = sorted(rrf_scores.keys(), key=lambda x: rrf_scores[x], reverse=True)
         return [rrf_data[mid] for mid in sorted_ids]
 
-    def _tokenize(self, text):
-        if not self.config.get('lightweight_mode', False):
-            jieba_mod, _ = _get_jieba()
-            if jieba_mod:
-                return [w for w in jieba_mod.cut(text) if len(w) > 1]
-        return re.findall(r'\w{2,}', text)
+    def _tokenize(self, text, cache=True):
+        return list(self._tokenizer.terms(text, not self.config.get('lightweight_mode', False), cache))
+
+    def _tokenizer_mode(self):
+        if not self.config.get('lightweight_mode', False) and _get_jieba()[0]:
+            return 'jieba'
+        return 'regex'
+
+    def _term_rows(self, content, tags):
+        """把记忆正文和标签分词为 [(term, tf, in_tags, first_pos)]，first_pos 为词在正文中首次出现的位置。"""
+        content_tokens = self._tokenize((content or '').lower(), cache=False)
+        tag_tokens = set(self._tokenize((tags or '').lower(), cache=False))
+        stats = {}
+        for pos, t in enumerate(content_tokens):
+            entry = stats.get(t)
+            if entry: entry[0] += 1
+            else: stats[t] = [1, pos]
+        for t in tag_tokens:
+            entry = stats.get(t)
+            if entry: entry[0] += 1
+            else: stats[t] = [1, None]
+        return [(t, tf, 1 if t in tag_tokens else 0, pos) for t, (tf, pos) in stats.items()]
+
+    def _index_memory(self, cursor, memory_id, terms):
+        """在当前写事务内替换一条记忆的倒排索引，term_df 由触发器同步维护。"""
+        cursor.execute('DELETE FROM memory_terms WHERE memory_id = ?', (memory_id,))
+        cursor.executemany(
+            'INSERT INTO memory_terms (term, memory_id, tf, in_tags, first_pos) VALUES (?, ?, ?, ?, ?)',
+            [(t, memory_id, tf, in_tags, pos) for t, tf, in_tags, pos in terms])
+        cursor.execute('INSERT OR REPLACE INTO memory_term_docs (memory_id, length) VALUES (?, ?)',
+                       (memory_id, sum(r[1] for r in terms)))
+
+    def _prepare_memory_index(self, content, tags):
+        """写事务外算好一条记忆的全部派生索引数据（倒排词项、分词全文、MinHash、向量）。
+
+        分词/词性标注/向量都是纯 CPU 计算，放在这里做，写事务里只剩 _apply_memory_index 的 SQL。
+        """
+        return {'content': content, 'tags': tags,
+                'terms': self._term_rows(content, tags),
+                'fts_seg': (self._fts_seg_text(content), self._fts_seg_text(tags)) if self._fts_seg_mode else None,
+                'signature': minhash(content),
+                'vector': self._embed_memory(content, tags)}
+
+    def _apply_memory_index(self, cursor, memory_id, prepared):
+        """在写事务内用预先算好的数据替换一条记忆的各项索引，返回向量（供提交后同步向量索引）。"""
+        self._index_memory(cursor, memory_id, prepared['terms'])
+        if prepared['fts_seg']: self._index_fts_seg(cursor, memory_id, *prepared['fts_seg'])
+        self._index_tags(cursor, memory_id, prepared['tags'])
+        self._index_minhash(cursor, memory_id, prepared['signature'])
+        return self._index_vector(cursor, memory_id, prepared['vector'])
+
+    @staticmethod
+    def _split_tags(tags):
+        """把逗号分隔的标签串拆成去重（忽略大小写）后的列表。"""
+        if not tags: return []
+        if isinstance(tags, str): tags = tags.split(',')
+        result, seen = [], set()
+        for tag in tags:
+            tag = str(tag).strip()
+            if tag and tag.lower() not in seen:
+                seen.add(tag.lower())
+                result.append(tag)
+        return result
+
+    def _index_tags(self, cursor, memory_id, tags):
+        cursor.execute('DELETE FROM memory_tags WHERE memory_id = ?', (memory_id,))
+        cursor.executemany('INSERT OR IGNORE INTO memory_tags (memory_id, tag) VALUES (?, ?)',
+                           [(memory_id, t) for t in self._split_tags(tags)])
+
+    def _tag_filter_sql(self, tags, column='m.id'):
+        """标签过滤条件（命中任一标签即可），返回 (' AND ...', params)。"""
+        tag_list = self._split_tags(tags)
+        if not tag_list: return '', []
+        return (f" AND {column} IN (SELECT memory_id FROM memory_tags WHERE tag IN ({','.join('?' * len(tag_list))}))",
+                tag_list)
 
     def _extract_tags(self, content):
         tags = []
         if not self.config.get('lightweight_mode', False):
             try:
-                jieba_mod, pseg_mod = _get_jieba()
-                if jieba_mod and pseg_mod:
-                    for word, flag in pseg_mod.cut(content):
+                tagged = self._tokenizer.pos(content, cache=False)
+                if tagged is not None:
+                    for word, flag in tagged:
                         if flag in ('nr','ns','nt','nz','v','vn','a','an','n','ng','nl','eng') and len(word) > 1:
                             tags.append(word)
                     if not tags:
-                        for word in jieba_mod.cut(content):
+                        for word in self._tokenizer.cut(content, cache=False):
                             if len(word) > 1: tags.append(word)
             except Exception:
                 tags = re.findall(r'\w{2,}', content)[:5]
@@ -368,20 +1056,24 @@ class DatabaseManager:
         '待办事项': ['记得','记住','提醒','不要','必须','需要','别忘了','记得做','时间','日期','号','周','月','年'],
     }
 
+    def _get_category_classifier(self):
+        classifier = self._category_classifier
+        if classifier is None:
+            classifier = CategoryClassifier(self._CATEGORY_KEYWORDS, self.config.get('memory_categories', []))
+            self._category_classifier = classifier
+        return classifier
+
     def _guess_category(self, content):
-        content_lower = content.lower()
-        best_cat = 'general'
-        best_score = 0
-        configured = self.config.get('memory_categories', [])
-        for cat, keywords in self._CATEGORY_KEYWORDS.items():
-            if configured and cat not in configured: continue
-            score = sum(1 for kw in keywords if kw in content_lower)
-            if score > best_score:
-                best_score = score
-                best_cat = cat
-        if best_score == 0 and configured:
-            return configured[0]
-        return best_cat
+        return self._get_category_classifier().classify(content)
+
+    def apply_config_changes(self, keys=None):
+        """设置保存后调用（keys 为改动的配置项，None 表示全部）：丢弃依赖这些配置的内存结构，下次使用时按新配置重建。"""
+        if keys is None or 'memory_categories' in keys:
+            self._category_classifier = None
+        if keys is None or 'relation_cache_ttl' in keys or 'relation_cache_size' in keys:
+            from .cache import RelationshipCache
+            self._relation_cache = RelationshipCache(
+                self.config.get('relation_cache_size', 4096), self.config.get('relation_cache_ttl', 300))
 
     _VALID_CATEGORIES = set(_CATEGORY_KEYWORDS.keys()) | {'general'}
 
@@ -396,6 +1088,7 @@ class DatabaseManager:
                         cursor.execute("UPDATE memories SET category = 'general' WHERE category = ?", (cat,))
                         logger.info(f"Cleaned dirty category: {cat}")
         self._execute_write(_do_op)
+        self.invalidate_search_cache()
 
     def _cleanup_blank_relationships(self):
         def _do_op(conn):
@@ -407,65 +1100,217 @@ class DatabaseManager:
             if deleted > 0:
                 logger.info(f"Cleaned {deleted} blank relationship records")
         self._execute_write(_do_op)
+        self._relation_cache.clear()
 
     # ==================== Memory CRUD ====================
 
     def write_memory(self, content, category=None, importance=5, tags=None, source='user'):
-        _tags = tags
-        _category = category
+        # 准备阶段（不持写锁）：哈希、标签、分类、分词和各项索引数据
+        content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
+        if tags is None: tags = self._extract_tags(content)
+        if category is None: category = self._guess_category(content)
+        tags_str = ','.join(tags) if isinstance(tags, list) else tags
+        prepared = self._prepare_memory_index(content, tags_str)
         _memory_id = [None]
+        _vectors = []
+        # 提交阶段：只执行 SQL
         def _do_op(conn):
-            nonlocal _tags, _category
-            content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
             cursor = conn.cursor()
             cursor.execute('SELECT id FROM memories WHERE hash = ?', (content_hash,))
             if cursor.fetchone(): return "Memory already exists"
-            if _tags is None: _tags = self._extract_tags(content)
-            if _category is None: _category = self._guess_category(content)
+            policy = self._near_dup_policy()
+            dup = self._find_near_duplicate(cursor, prepared['signature']) if policy != 'keep' else None
+            if dup and policy == 'reject':
+                return f"Memory already exists (near-duplicate of ID:{dup[0]})"
+            if dup:
+                self._merge_near_duplicate(cursor, dup[0], importance)
+                cursor.execute('INSERT INTO activities (memory_id, activity_type, description) VALUES (?, ?, ?)',
+                               (dup[0], 'merge', content[:50]))
+                return f"Memory merged into ID:{dup[0]} (near-duplicate)"
             cursor.execute(
                 'INSERT INTO memories (content, category, importance, tags, source, hash) VALUES (?, ?, ?, ?, ?, ?)',
-                (content, _category, importance, ','.join(_tags) if isinstance(_tags, list) else _tags, source, content_hash))
+                (content, category, importance, tags_str, source, content_hash))
             memory_id = cursor.lastrowid
+            _vectors[:] = [(memory_id, self._apply_memory_index(cursor, memory_id, prepared))]
             _memory_id[0] = memory_id
             cursor.execute('INSERT INTO activities (memory_id, activity_type, description) VALUES (?, ?, ?)',
                          (memory_id, 'create', content[:50]))
             return f"Memory saved (ID:{memory_id})"
         result = self._execute_write(_do_op)
+        self.invalidate_search_cache()
+        if result is not None and _memory_id[0]:
+            self._vector_index_sync(_vectors)
+            self._related_pool_add([(_memory_id[0], category, importance)])
         if result == "already_exists": return "Memory already exists"
         return result if result is not None else "Error: database write failed"
 
-    def search_memory(self, query, category_filter=None, limit=None):
+    def _search_cache_key(self, query, category_filter, limit, tags=None):
+        c = self.config
+        norm_query = ' '.join(unicodedata.normalize('NFKC', str(query)).lower().split())
+        tag_key = tuple(sorted(t.lower() for t in self._split_tags(tags)))
+        return (norm_query, category_filter, limit, tag_key, c.get('rrf_k', 60), c.get('mmr_enabled', True),
+                c.get('mmr_lambda', 0.7), c.get('tfidf_search_enabled', True), c.get('lightweight_mode', False),
+                c.get('vector_search_enabled', False))
+
+    def invalidate_search_cache(self):
+        """记忆数据有变动时调用：递增写代数，使已缓存的搜索结果失效。"""
+        self._search_cache.bump()
+
+    def search_memory(self, query, category_filter=None, limit=None, tags=None):
+        """混合检索记忆；tags 为标签列表或逗号分隔串，只返回带有其中任一标签的记忆（在 SQL 中过滤）。"""
+        _limit = limit if limit is not None else self.config.get('search_max_results', 5)
+        use_cache = self.config.get('search_cache_enabled', True)
+        if use_cache:
+            cache_key = self._search_cache_key(query, category_filter, _limit, tags)
+            generation = self._search_cache.generation
+            cached = self._search_cache.get(cache_key)
+            if cached is not None:
+                self._record_access([r['id'] for r in cached])
+                return cached
+        parallel = self._search_executor is not None and self.config.get('search_parallel_enabled', True)
+        result_lists, complete = self._retrieve_parallel(query, _limit, tags) if parallel else (None, True)
         def _do_op(conn):
-            _limit = limit if limit is not None else self.config.get('search_max_results', 5)
-            result_lists = []
-            fts_results = self._fts_search(conn, query, _limit * 3)
-            if fts_results: result_lists.append(fts_results)
-            tag_results = self._tag_retrieve(conn, query, _limit * 2)
-            if tag_results: result_lists.append(tag_results)
-            tfidf_results = self._tfidf_search(conn, query, _limit * 2)
-            if tfidf_results: result_lists.append(tfidf_results)
-            if not result_lists:
-                fallback = self._fallback_search(conn, query, _limit * 3)
-                if fallback: result_lists.append(fallback)
-            fused = self._rrf_fuse(result_lists, k=self.config.get('rrf_k', 60)) if result_lists else []
-            if category_filter:
-                fused = [r for r in fused if r.get('category') == category_filter]
-            if self.config.get('mmr_enabled', True) and len(fused) > _limit:
-                fused = self._mmr_rerank(fused, query, _limit)
-            else:
-                fused = fused[:_limit]
-            for r in fused:
-                r['content'] = r['content'][:80] + ('...' if len(r['content']) > 80 else '')
-            if fused:
-                ids = [r['id'] for r in fused]
-                placeholders = ','.join('?' * len(ids))
-                conn.execute(
-                    f'UPDATE memories SET access_count = access_count + 1, last_accessed = ? WHERE id IN ({placeholders})',
-                    [datetime.now().isoformat()] + ids)
-            return fused
+            return self._search_on_connection(conn, query, category_filter, _limit, tags, result_lists, complete)
         result = self._execute_read(_do_op)
+        # 有检索器超时时结果不完整，不写缓存
+        if result is not None and use_cache and complete:
+            self._search_cache.put(cache_key, generation, result)
+        if result:
+            self._record_access([r['id'] for r in result])
         return result if result is not None else []
 
+    def _search_on_connection(self, conn, query, category_filter, limit, tags=None,
+                              result_lists=None, complete=True, stats=None):
+        """在给定连接上完成一次检索：（串行）召回、兜底、RRF 融合、分类过滤和 MMR 重排。"""
+        lists = result_lists if result_lists is not None else self._retrieve_serial(conn, query, limit, tags, stats)
+        if not lists and complete:
+            fallback = self._fallback_search(conn, query, limit * 3, tags)
+            if fallback: lists.append(fallback)
+        fused = self._rrf_fuse(lists, k=self.config.get('rrf_k', 60)) if lists else []
+        if category_filter:
+            fused = [r for r in fused if r.get('category') == category_filter]
+        if self.config.get('mmr_enabled', True) and len(fused) > limit:
+            fused = self._mmr_rerank(fused, query, limit)
+        else:
+            fused = fused[:limit]
+        for r in fused:
+            r['content'] = r['content'][:80] + ('...' if len(r['content']) > 80 else '')
+        return fused
+
+    def search_memory_many(self, queries, category_filter=None, limit=None, tags=None):
+        """批量检索，返回与 queries 一一对应的结果列表。
+
+        未命中缓存的查询在同一条连接、同一个读事务里依次检索（快照一致），语料统计
+        （文档数、词的 df、文档范数）在整批内只算一次；相同的查询只检索一遍。
+        """
+        queries = [str(q) for q in queries]
+        _limit = limit if limit is not None else self.config.get('search_max_results', 5)
+        use_cache = self.config.get('search_cache_enabled', True)
+        generation = self._search_cache.generation
+        results = {}
+        pending = []
+        for query in dict.fromkeys(queries):
+            cached = self._search_cache.get(self._search_cache_key(query, category_filter, _limit, tags)) if use_cache else None
+            if cached is not None: results[query] = cached
+            else: pending.append(query)
+        if pending:
+            def _do_op(conn):
+                conn.execute('BEGIN')
+                try:
+                    stats = {}
+                    return {query: self._search_on_connection(conn, query, category_filter, _limit, tags, stats=stats)
+                            for query in pending}
+                finally:
+                    conn.rollback()
+            fresh = self._execute_read(_do_op) or {}
+            for query, result in fresh.items():
+                if use_cache:
+                    self._search_cache.put(self._search_cache_key(query, category_filter, _limit, tags), generation, result)
+                results[query] = result
+        accessed = [r['id'] for result in results.values() for r in result]
+        if accessed: self._record_access(accessed)
+        return [[dict(r) for r in results.get(query, [])] for query in queries]
+
+    def _retrievers(self, limit):
+        retrievers = [(self._fts_search, limit * 3), (self._tag_retrieve, limit * 2), (self._tfidf_search, limit * 2)]
+        if self._vector_enabled():
+            retrievers.append((self._vector_search, limit * 2))
+        return retrievers
+
+    def _retrieve_serial(self, conn, query, limit, tags=None, stats=None):
+        result_lists = []
+        for retriever, n in self._retrievers(limit):
+            results = retriever(conn, query, n, tags, stats)
+            if results: result_lists.append(results)
+        return result_lists
+
+    def _run_retriever(self, cancel, retriever, query, limit, tags=None):
+        def _do_op(conn):
+            # 超过截止时间后由 progress handler 中断该连接上正在执行的 SQL
+            conn.set_progress_handler(lambda: 1 if cancel.is_set() else 0, 1000)
+            try:
+                return retriever(conn, query, limit, tags)
+            finally:
+                conn.set_progress_handler(None, 0)
+        return self._execute_read(_do_op) or []
+
+    def _retrieve_parallel(self, query, limit, tags=None):
+        """各检索器在搜索线程池里各用一条池化连接并发执行，只融合截止时间前返回的结果。
+
+        返回 (result_lists, complete)，complete 为 False 表示有检索器超时：还在排队的被取消，
+        已在执行的通过 cancel 事件中断。
+        """
+        cancel = threading.Event()
+        futures = [self._search_executor.submit(self._run_retriever, cancel, retriever, query, n, tags)
+                   for retriever, n in self._retrievers(limit)]
+        deadline = self.config.get('search_deadline_ms', 500) / 1000.0
+        done, not_done = futures_wait(futures, timeout=deadline)
+        # 事件只能打断已在执行的查询；还排在线程池队列里的检索器要显式取消，否则之后仍会占着连接跑完
+        cancel.set()
+        cancelled = sum(1 for f in not_done if f.cancel())
+        interrupted = len(not_done) - cancelled
+        with self._search_stats_lock:
+            self._search_stats['parallel_queries'] += 1
+            if not_done:
+                self._search_stats['deadline_misses'] += 1
+                self._search_stats['cancelled_retrievers'] += cancelled
+                self._search_stats['interrupted_retrievers'] += interrupted
+        if not_done:
+            logger.debug(f"Search deadline hit, {cancelled} queued retriever(s) cancelled, "
+                         f"{interrupted} running retriever(s) interrupted: {query[:30]}")
+        result_lists = []
+        for future in futures:
+            if future not in done: continue
+            try: results = future.result()
+            except Exception: results = None
+            if results: result_lists.append(results)
+        return result_lists, not not_done
+
+    def _record_access(self, memory_ids):
+        self._access_stats.record(memory_ids)
+        if self._flusher and len(self._access_stats) >= self.config.get('access_stats_flush_threshold', 500):
+            self._flusher.trigger()
+
+    def flush_access_stats(self):
+        """把内存中累计的访问统计一次性写回 memories 表。"""
+        rows = self._access_stats.drain()
+        if not rows: return 0
+        def _do_op(conn):
+            conn.executemany(
+                'UPDATE memories SET access_count = access_count + ?, last_accessed = ? WHERE id = ?', rows)
+            return len(rows)
+        result = self._execute_write(_do_op)
+        if result is None:
+            self._access_stats.restore(rows)
+            return 0
+        return result
+
+    def flush_pending_writes(self):
+        """刷写全部内存缓冲（后台线程定时调用，关闭时也会调用）。"""
+        self.flush_access_stats()
+        self.flush_interactions()
+        self.flush_glossary_hits()
+
     def delete_memory(self, memory_id):
         def _do_op(conn):
             cursor = conn.cursor()
@@ -478,32 +1323,53 @@ class DatabaseManager:
             cursor.execute('DELETE FROM activities WHERE memory_id = ?', (memory_id,))
             return f"Memory deleted (ID:{memory_id})"
         result = self._execute_write(_do_op)
+        self.invalidate_search_cache()
+        if result is not None: self._vector_index_sync([(memory_id, None)])
         return result if result is not None else "Error: operation failed"
 
     def update_memory(self, memory_id, content=None, category=None, importance=None, tags=None):
-        _tags = tags
+        # 准备阶段（不持写锁）：只改了正文或标签中的一项时，另一项取当前值来预算索引
+        if content is not None and tags is None: tags = self._extract_tags(content)
+        tags_str = (','.join(tags) if isinstance(tags, list) else tags) if tags is not None and tags != '' else None
+        reindex = content is not None or tags_str is not None
+        prepared = None
+        if reindex:
+            def _read(conn):
+                return conn.execute('SELECT content, tags FROM memories WHERE id = ?', (memory_id,)).fetchone()
+            row = self._execute_read(_read)
+            if row:
+                prepared = self._prepare_memory_index(content if content is not None else row[0],
+                                                      tags_str if tags_str is not None else row[1])
+        _vectors = []
         def _do_op(conn):
-            nonlocal _tags
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM memories WHERE id = ?', (memory_id,))
-            if not cursor.fetchone(): return "Memory not found"
+            cursor.execute('SELECT content, tags FROM memories WHERE id = ?', (memory_id,))
+            row = cursor.fetchone()
+            if not row: return "Memory not found"
             updates = []
             params = []
             if content is not None:
                 updates.append("content = ?"); params.append(content)
                 updates.append("hash = ?"); params.append(hashlib.md5(content.encode('utf-8')).hexdigest())
-                if _tags is None: _tags = self._extract_tags(content)
             if category is not None: updates.append("category = ?"); params.append(category)
             if importance is not None: updates.append("importance = ?"); params.append(importance)
-            if _tags is not None and _tags != '':
-                updates.append("tags = ?"); params.append(','.join(_tags) if isinstance(_tags, list) else _tags)
+            if tags_str is not None: updates.append("tags = ?"); params.append(tags_str)
             updates.append("updated_at = ?"); params.append(datetime.now().isoformat())
             params.append(memory_id)
             cursor.execute(f'UPDATE memories SET {", ".join(updates)} WHERE id = ?', params)
+            if reindex:
+                final = (content if content is not None else row[0], tags_str if tags_str is not None else row[1])
+                index = prepared
+                # 准备之后这条记忆又被别人改过（少见），只能在锁内重算
+                if index is None or (index['content'], index['tags']) != final:
+                    index = self._prepare_memory_index(*final)
+                _vectors[:] = [(memory_id, self._apply_memory_index(cursor, memory_id, index))]
             cursor.execute('INSERT INTO activities (memory_id, activity_type, description) VALUES (?, ?, ?)',
                          (memory_id, 'update', f'importance={importance}' if importance else 'content updated'))
             return f"Memory updated (ID:{memory_id})"
         result = self._execute_write(_do_op)
+        self.invalidate_search_cache()
+        if result is not None: self._vector_index_sync(_vectors)
         return result if result is not None else "Error: operation failed"
 
     def get_all_memories(self, limit=100, offset=0, category=None):
@@ -517,14 +1383,81 @@ class DatabaseManager:
         result = self._execute_read(_do_op)
         return result if result is not None else []
 
-    def get_memories_count(self):
+    @staticmethod
+    def _encode_page_cursor(*values):
+        return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_page_cursor(token, size=2):
+        """解析分页游标，空值表示第一页；格式不对抛 ValueError。"""
+        if not token: return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(str(token).encode('ascii')))
+        except Exception:
+            raise ValueError('invalid page cursor')
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError('invalid page cursor')
+        return values
+
+    def _keyset_page(self, sql, params, order_columns, limit, cursor_token):
+        """按 order_columns 降序做键集分页：sql 为带 WHERE 的查询（不含 ORDER BY），返回 {'items', 'next_cursor'}。
+
+        首列（时间戳）在旧库里可能为 NULL，降序时这些行排在最后，分两个阶段翻：先用纯行值比较翻首列非空的行，
+        翻完后转入 "首列 IS NULL AND 其余列 < ?" 阶段。两段条件都能直接按 (首列, 其余列) 索引定位，
+        不会退化成全表扫描；游标首列为 null 即表示处于 NULL 阶段。其余列须非空（主键）。
+        """
+        after = self._decode_page_cursor(cursor_token, len(order_columns))
+        lead, rest = order_columns[0], order_columns[1:]
+        order = f' ORDER BY {", ".join(c + " DESC" for c in order_columns)} LIMIT ?'
+        queries = []
+        if not after or after[0] is not None:
+            phase_sql, phase_params = sql + f' AND {lead} IS NOT NULL', list(params)
+            if after:
+                phase_sql += f' AND ({", ".join(order_columns)}) < ({", ".join("?" * len(order_columns))})'
+                phase_params += after
+            queries.append((phase_sql + order, phase_params))
+        phase_sql, phase_params = sql + f' AND {lead} IS NULL', list(params)
+        if after and after[0] is None:
+            phase_sql += f' AND ({", ".join(rest)}) < ({", ".join("?" * len(rest))})'
+            phase_params += after[1:]
+        queries.append((phase_sql + order, phase_params))
         def _do_op(conn):
             cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM memories')
-            return cursor.fetchone()[0]
+            rows = []
+            for phase_sql, phase_params in queries:
+                cursor.execute(phase_sql, phase_params + [limit + 1 - len(rows)])
+                rows.extend(dict(row) for row in cursor.fetchall())
+                if len(rows) > limit: break
+            return rows
+        rows = self._execute_read(_do_op) or []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_page_cursor(*(rows[-1][c] for c in order_columns))
+        return {'items': rows, 'next_cursor': next_cursor}
+
+    def get_memories_page(self, limit=100, cursor=None, category=None):
+        """按 (created_at, id) 倒序的键集分页，cursor 为上一页返回的 next_cursor。"""
+        sql = 'SELECT id, content, category, importance, tags, access_count, created_at FROM memories WHERE 1'
+        params = []
+        if category:
+            sql += ' AND category = ?'
+            params.append(category)
+        return self._keyset_page(sql, params, ('created_at', 'id'), limit, cursor)
+
+    def _row_count(self, table, category=None):
+        def _do_op(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT count FROM row_counts WHERE tbl = ? AND category = ?', (table, category or ''))
+            row = cursor.fetchone()
+            return row[0] if row else 0
         result = self._execute_read(_do_op)
         return result if result is not None else 0
 
+    def get_memories_count(self, category=None):
+        """记忆条数（可按分类），读触发器维护的计数表。"""
+        return self._row_count('memories', category)
+
     def get_recent_memories(self, limit=5):
         def _do_op(conn):
             cursor = conn.cursor()
@@ -542,15 +1475,17 @@ class DatabaseManager:
         return result if result is not None else []
 
     def get_all_tags(self):
+        """全部标签，按使用次数降序。"""
+        return [t['tag'] for t in self.get_tag_frequencies()]
+
+    def get_tag_frequencies(self, limit=None):
+        """返回 [{'tag', 'count'}]，按使用次数降序。"""
         def _do_op(conn):
             cursor = conn.cursor()
-            cursor.execute('SELECT tags FROM memories WHERE tags != ""')
-            all_tags = set()
-            for row in cursor.fetchall():
-                for tag in row[0].split(','):
-                    tag = tag.strip()
-                    if tag: all_tags.add(tag)
-            return list(all_tags)
+            cursor.execute(
+                'SELECT tag, COUNT(*) AS count FROM memory_tags GROUP BY tag ORDER BY count DESC, tag LIMIT ?',
+                (limit if limit is not None else -1,))
+            return [dict(row) for row in cursor.fetchall()]
         result = self._execute_read(_do_op)
         return result if result is not None else []
 
@@ -564,30 +1499,92 @@ class DatabaseManager:
 
     # ==================== Search Engines ====================
 
-    def _fts_search(self, conn, query, limit):
+    def _vector_search(self, conn, query, limit, tags=None, stats=None):
+        """本地哈希 n-gram 向量检索（可补足换个说法的查询），未启用或缺 NumPy 时返回空。"""
+        if not self._vector_enabled(): return []
+        try:
+            blob = embed_text(query, self._vector_dim())
+            if blob is None: return []
+            index = self._ensure_vector_index(conn)
+            hits = index.search(blob, limit * 4 if tags else limit, self.config.get('vector_min_score', 0.2))
+            if not hits: return []
+            scores = dict(hits)
+            tag_sql, tag_params = self._tag_filter_sql(tags)
+            placeholders = ','.join('?' * len(scores))
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT m.id, m.content, m.category, m.importance, m.tags, m.created_at, m.access_count '
+                f'FROM memories m WHERE m.id IN ({placeholders}){tag_sql}', list(scores) + tag_params)
+            rows = {row['id']: dict(row) for row in cursor.fetchall()}
+            results = []
+            for memory_id, score in hits:
+                m = rows.get(memory_id)
+                if m is None: continue
+                m['vector_score'] = round(score, 4)
+                results.append(m)
+            return results[:limit]
+        except Exception as e:
+            logger.debug(f"Vector search failed: {e}")
+            return []
+
+    def _fts_seg_query(self, query):
+        if self._fts_seg_mode == 'jieba':
+            words = self._tokenize(query)
+        else:
+            # trigram 分词器只认 >=3 字符的片段，把每段连续字符切成滑动三元组
+            words = []
+            for run in re.findall(r'\w+', query.lower()):
+                if len(run) < 3: continue
+                words.extend(run[i:i + 3] for i in range(len(run) - 2))
+            words = list(dict.fromkeys(words))[:32]
+        return ' OR '.join('"' + w.replace('"', '""') + '"' for w in words)
+
+    def _fts_seg_search(self, conn, query, limit, tags=None):
+        """在中文分词全文索引上做 BM25 检索；索引未就绪时返回 None 交给默认 FTS。"""
+        if not (self._fts_seg_mode and self._fts_seg_ready): return None
         try:
+            fts_query = self._fts_seg_query(query)
+            if not fts_query: return []
+            tag_sql, tag_params = self._tag_filter_sql(tags)
             cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='memories_fts'")
-            if not cursor.fetchone(): return []
+            cursor.execute(
+                'SELECT m.id, m.content, m.category, m.importance, m.tags, m.created_at, m.access_count, '
+                'bm25(memories_fts_seg) as bm25_score FROM memories_fts_seg f JOIN memories m ON m.id = f.rowid '
+                f'WHERE memories_fts_seg MATCH ?{tag_sql} ORDER BY bm25_score LIMIT ?', [fts_query] + tag_params + [limit])
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.debug(f"CJK FTS search failed: {e}")
+            return None
+
+    def _fts_search(self, conn, query, limit, tags=None, stats=None):
+        seg_results = self._fts_seg_search(conn, query, limit, tags)
+        if seg_results is not None: return seg_results
+        try:
+            cursor = conn.cursor()
+            has_fts = stats.get('has_fts') if stats is not None else None
+            if has_fts is None:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='memories_fts'")
+                has_fts = cursor.fetchone() is not None
+                if stats is not None: stats['has_fts'] = has_fts
+            if not has_fts: return []
             if not self.config.get('lightweight_mode', False):
-                jieba_mod, _ = _get_jieba()
-                if jieba_mod:
-                    words = list(jieba_mod.cut(query))
-                    fts_query = ' OR '.join(f'"{w}"' for w in words if len(w) > 1)
+                if _get_jieba()[0]:
+                    fts_query = ' OR '.join(f'"{w}"' for w in self._tokenizer.terms(query))
                 else:
                     fts_query = ' OR '.join(f'"{w}"' for w in query.split() if len(w) > 1)
             else:
                 fts_query = ' OR '.join(f'"{w}"' for w in re.findall(r'\w{2,}', query))
             if not fts_query: return []
+            tag_sql, tag_params = self._tag_filter_sql(tags)
             cursor.execute(
                 'SELECT m.id, m.content, m.category, m.importance, m.tags, m.created_at, m.access_count, '
                 'bm25(memories_fts) as bm25_score FROM memories m JOIN memories_fts f ON m.id = f.rowid '
-                'WHERE memories_fts MATCH ? ORDER BY bm25_score LIMIT ?', (fts_query, limit))
+                f'WHERE memories_fts MATCH ?{tag_sql} ORDER BY bm25_score LIMIT ?', [fts_query] + tag_params + [limit])
             return [dict(row) for row in cursor.fetchall()]
         except Exception:
-            return self._fallback_search(conn, query, limit)
+            return self._fallback_search(conn, query, limit, tags)
 
-    def _fallback_search(self, conn, query, limit):
+    def _fallback_search(self, conn, query, limit, tags=None):
         try:
             cursor = conn.cursor()
             keywords = query.split()
@@ -597,100 +1594,118 @@ class DatabaseManager:
                 conditions.append("(content LIKE ? OR tags LIKE ? OR category LIKE ?)")
                 params.extend([f'%{kw}%', f'%{kw}%', f'%{kw}%'])
             where = ' OR '.join(conditions)
+            tag_sql, tag_params = self._tag_filter_sql(tags, 'id')
             cursor.execute(
-                f'SELECT id, content, category, importance, tags, created_at, access_count FROM memories WHERE {where} ORDER BY importance DESC, created_at DESC LIMIT ?',
-                params + [limit])
+                f'SELECT id, content, category, importance, tags, created_at, access_count FROM memories WHERE ({where}){tag_sql} ORDER BY importance DESC, created_at DESC LIMIT ?',
+                params + tag_params + [limit])
             return [dict(row) for row in cursor.fetchall()]
         except Exception:
             return []
 
-    def _tag_retrieve(self, conn, query, limit):
+    def _tag_retrieve(self, conn, query, limit, tags=None, stats=None):
+        """按标签表精确匹配查询词，命中标签越多越靠前。"""
         try:
-            words = self._tokenize(query)
+            words = list(dict.fromkeys(self._tokenize(query)))[:16]
             if not words: return []
+            tag_sql, tag_params = self._tag_filter_sql(tags)
             cursor = conn.cursor()
-            conditions = []
-            params = []
-            for w in words[:5]:
-                conditions.append("tags LIKE ?")
-                params.append(f'%{w}%')
-            where = ' OR '.join(conditions)
             cursor.execute(
-                f'SELECT id, content, category, importance, tags, created_at, access_count FROM memories WHERE {where} ORDER BY importance DESC LIMIT ?',
-                params + [limit])
+                'SELECT m.id, m.content, m.category, m.importance, m.tags, m.created_at, m.access_count, '
+                'COUNT(*) AS tag_hits FROM memory_tags t JOIN memories m ON m.id = t.memory_id '
+                f"WHERE t.tag IN ({','.join('?' * len(words))}){tag_sql} "
+                'GROUP BY m.id ORDER BY tag_hits DESC, m.importance DESC LIMIT ?',
+                words + tag_params + [limit])
             return [dict(row) for row in cursor.fetchall()]
         except Exception:
             return []
 
-    def _tfidf_search(self, conn, query, limit):
+    def _tfidf_search(self, conn, query, limit, tags=None, stats=None):
+        """基于持久化倒排索引的 TF-IDF 检索。
+
+        只读取查询词（及标签扩展词）的倒排表累计点积，对点积最高的 tfidf_search_limit 条
+        候选再读出完整词项算精确余弦，覆盖全部记忆而不是前 N 条。
+        """
         if not self.config.get('tfidf_search_enabled', True): return []
         try:
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, content, category, importance, tags, created_at, access_count FROM memories LIMIT ?',
-                           (self.config.get('tfidf_search_limit', 200),))
-            all_memories = [dict(row) for row in cursor.fetchall()]
-            if not all_memories: return []
             query_tokens = self._tokenize(query.lower())
             if not query_tokens: return []
-            from collections import Counter
-            doc_freq = Counter()
-            doc_tokens = {}
-            for m in all_memories:
-                tokens = list(set(self._tokenize(m['content'].lower()) + self._tokenize(m.get('tags', '').lower())))
-                doc_tokens[m['id']] = tokens
-                for t in tokens: doc_freq[t] += 1
-            N = len(all_memories)
-            idf = {t: math.log(N / (1 + df)) for t, df in doc_freq.items()}
+            cursor = conn.cursor()
+            if stats is None: stats = {}
+            N = stats.get('docs')
+            if N is None:
+                cursor.execute('SELECT COUNT(*) FROM memory_term_docs')
+                N = stats['docs'] = cursor.fetchone()[0]
+            if not N: return []
+            df_cache = stats.setdefault('df', {})
             query_tf = Counter(query_tokens)
-            expanded_tokens = set(query_tokens)
-            for m in all_memories:
-                m_tags = set(self._tokenize(m.get('tags', '').lower()))
-                if m_tags & expanded_tokens:
-                    for ct in self._tokenize(m['content'].lower())[:8]: expanded_tokens.add(ct)
-            for t in expanded_tokens - set(query_tokens): query_tf[t] = 0.5
-            query_vec = {t: tf * idf[t] for t, tf in query_tf.items() if t in idf}
-            if not query_vec: return []
+            # 查询扩展：标签命中查询词的记忆，其正文前 8 个词以 0.5 权重加入查询
+            base = list(query_tf)
+            placeholders = ','.join('?' * len(base))
+            cursor.execute(
+                f'SELECT DISTINCT e.term FROM memory_terms t JOIN memory_terms e ON e.memory_id = t.memory_id '
+                f'WHERE t.term IN ({placeholders}) AND t.in_tags = 1 AND e.first_pos < 8 LIMIT ?',
+                base + [self.config.get('tfidf_expansion_limit', 64)])
+            for (t,) in cursor.fetchall():
+                if t not in query_tf: query_tf[t] = 0.5
+            missing = [t for t in query_tf if t not in df_cache]
+            if missing:
+                cursor.execute(f'SELECT term, df FROM term_df WHERE term IN ({",".join("?" * len(missing))})', missing)
+                df_cache.update((t, None) for t in missing)
+                df_cache.update(cursor.fetchall())
+            idf = {t: math.log(N / (1 + df_cache[t])) for t in query_tf if df_cache[t] is not None}
+            query_vec = {t: query_tf[t] * w for t, w in idf.items()}
             query_norm = math.sqrt(sum(v ** 2 for v in query_vec.values()))
             if query_norm == 0: return []
-            scored = []
-            for m in all_memories:
-                doc_tf = Counter(doc_tokens.get(m['id'], []))
-                doc_vec = {t: tf * idf[t] for t, tf in doc_tf.items() if t in idf}
-                dot = sum(query_vec.get(t, 0) * doc_vec.get(t, 0) for t in query_vec)
-                doc_norm = math.sqrt(sum(v ** 2 for v in doc_vec.values()))
+            placeholders = ','.join('?' * len(query_vec))
+            tag_sql, tag_params = self._tag_filter_sql(tags, 'memory_id')
+            cursor.execute(f'SELECT term, memory_id, tf FROM memory_terms WHERE term IN ({placeholders}){tag_sql}',
+                           list(query_vec) + tag_params)
+            dots = {}
+            for t, mid, tf in cursor.fetchall():
+                dots[mid] = dots.get(mid, 0.0) + query_vec[t] * tf * idf[t]
+            if not dots: return []
+            pool = heapq.nlargest(max(limit, self.config.get('tfidf_search_limit', 200)),
+                                  dots, key=dots.__getitem__)
+            # 文档范数只依赖语料，批量检索时在整批内复用
+            norms = stats.setdefault('doc_norms', {})
+            missing = [mid for mid in pool if mid not in norms]
+            if missing:
+                placeholders = ','.join('?' * len(missing))
+                cursor.execute(
+                    f'SELECT mt.memory_id, mt.tf, d.df FROM memory_terms mt JOIN term_df d ON d.term = mt.term '
+                    f'WHERE mt.memory_id IN ({placeholders})', missing)
+                norms.update((mid, 0.0) for mid in missing)
+                for mid, tf, df in cursor.fetchall():
+                    norms[mid] += (tf * math.log(N / (1 + df))) ** 2
+            scores = {}
+            for mid in pool:
+                doc_norm = math.sqrt(norms.get(mid, 0.0))
                 if doc_norm == 0: continue
-                cosine = dot / (query_norm * doc_norm)
-                if cosine > 0.03:
-                    m['tfidf_score'] = cosine
-                    scored.append(m)
-            scored.sort(key=lambda x: x['tfidf_score'], reverse=True)
-            return scored[:limit]
-        except Exception:
+                cosine = dots[mid] / (query_norm * doc_norm)
+                if cosine > 0.03: scores[mid] = cosine
+            top = heapq.nlargest(limit, scores, key=scores.__getitem__)
+            if not top: return []
+            placeholders = ','.join('?' * len(top))
+            cursor.execute(
+                f'SELECT id, content, category, importance, tags, created_at, access_count FROM memories '
+                f'WHERE id IN ({placeholders})', top)
+            rows = {row['id']: dict(row) for row in cursor.fetchall()}
+            results = []
+            for mid in top:
+                m = rows.get(mid)
+                if m is None: continue
+                m['tfidf_score'] = scores[mid]
+                results.append(m)
+            return results
+        except Exception as e:
+            logger.debug(f"TF-IDF search failed: {e}")
             return []
 
     def _mmr_rerank(self, results, query, limit):
         if not results or len(results) <= limit: return results
-        query_words = set(re.findall(r'\w+', query.lower()))
-        selected = [results[0]]
-        remaining = results[1:]
-        lambda_param = self.config.get('mmr_lambda', 0.7)
-        while len(selected) < limit and remaining:
-            best_score = -float('inf')
-            best_idx = 0
-            for i, candidate in enumerate(remaining):
-                cand_words = set(re.findall(r'\w+', candidate.get('content', '').lower()))
-                relevance = len(query_words & cand_words) / max(len(query_words), 1)
-                max_sim = 0
-                for sel in selected:
-                    sel_words = set(re.findall(r'\w+', sel.get('content', '').lower()))
-                    sim = len(cand_words & sel_words) / max(len(cand_words | sel_words), 1)
-                    max_sim = max(max_sim, sim)
-                mmr_score = lambda_param * relevance - (1 - lambda_param) * max_sim
-                if mmr_score > best_score:
-                    best_score = mmr_score
-                    best_idx = i
-            selected.append(remaining.pop(best_idx))
-        return selected
+        picked = mmr_select([r.get('content', '') for r in results], query, limit,
+                            self.config.get('mmr_lambda', 0.7))
+        return [results[i] for i in picked]
 
     # ==================== Relationships ====================
 
@@ -722,15 +1737,28 @@ class DatabaseManager:
                              (0, 'create_relation', f'{nickname or user_id}'))
                 return f"Relationship created: {nickname or user_id}"
         result = self._execute_write(_do_op)
+        self._relation_cache.invalidate(user_id)
         return result if result is not None else "Error: update relationship failed"
 
     def get_relationship_by_user_id(self, user_id):
-        def _do_op(conn):
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM relationships WHERE user_id = ?', (user_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        return self._execute_read(_do_op)
+        """读取关系档案（经按 user_id 的关系缓存），并叠加尚未写回的互动增量。"""
+        hit, rel = self._relation_cache.lookup(user_id)
+        if not hit:
+            generation = self._relation_cache.generation
+            def _do_op(conn):
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM relationships WHERE user_id = ?', (user_id,))
+                row = cursor.fetchone()
+                return (dict(row) if row else None,)
+            result = self._execute_read(_do_op)
+            # 读库出错（None）不缓存
+            rel = result[0] if result else None
+            if result: self._relation_cache.put(user_id, generation, rel)
+        pending = self.get_pending_interaction(user_id) if rel else None
+        if pending:
+            rel['interaction_count'] = (rel.get('interaction_count') or 0) + pending['interaction_count']
+            rel['last_interaction'] = max(str(rel.get('last_interaction') or ''), pending['last_interaction'])
+        return rel
 
     def get_relationship_with_identity(self, user_id):
         rel = self.get_relationship_by_user_id(user_id)
@@ -749,13 +1777,12 @@ class DatabaseManager:
         result = self._execute_read(_do_op)
         return result if result is not None else []
 
+    def get_relationships_page(self, limit=100, cursor=None):
+        """按 (updated_at, user_id) 倒序的键集分页。"""
+        return self._keyset_page('SELECT * FROM relationships WHERE 1', [], ('updated_at', 'user_id'), limit, cursor)
+
     def get_relationships_count(self):
-        def _do_op(conn):
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM relationships')
-            return cursor.fetchone()[0]
-        result = self._execute_read(_do_op)
-        return result if result is not None else 0
+        return self._row_count('relationships')
 
     def search_relationship(self, query, limit=3):
         def _do_op(conn):
@@ -782,18 +1809,37 @@ class DatabaseManager:
             cursor.execute('DELETE FROM relationships WHERE user_id = ?', (user_id,))
             return f"Relationship deleted: {user_id}"
         result = self._execute_write(_do_op)
+        self._relation_cache.invalidate(user_id)
         return result if result is not None else "Error: delete relationship failed"
 
     def auto_update_last_interaction(self, user_id):
+        """记录一次互动（仅内存累加，由后台线程合并写回）。"""
+        if not user_id: return
+        self._interactions.touch(user_id)
+        if self._flusher and len(self._interactions) >= self.config.get('interaction_flush_threshold', 500):
+            self._flusher.trigger()
+
+    def get_pending_interaction(self, user_id):
+        """返回尚未写回数据库的互动增量 {'interaction_count', 'last_interaction'}，没有则为 None。"""
+        entry = self._interactions.pending(user_id)
+        if not entry: return None
+        return {'interaction_count': entry[0], 'last_interaction': entry[1]}
+
+    def flush_interactions(self):
+        rows = self._interactions.drain()
+        if not rows: return 0
         def _do_op(conn):
-            cursor = conn.cursor()
-            cursor.execute('SELECT user_id FROM relationships WHERE user_id = ?', (user_id,))
-            if not cursor.fetchone():
-                return
-            cursor.execute(
-                'UPDATE relationships SET last_interaction = ?, interaction_count = interaction_count + 1 WHERE user_id = ?',
-                (datetime.now().isoformat(), user_id))
-        self._execute_write(_do_op)
+            conn.executemany(
+                'UPDATE relationships SET interaction_count = interaction_count + ?, last_interaction = ? WHERE user_id = ?',
+                rows)
+            return len(rows)
+        result = self._execute_write(_do_op)
+        if result is None:
+            self._interactions.restore(rows)
+            return 0
+        # 增量已写回并从内存里清掉，缓存里这些人的旧计数不能再用
+        self._relation_cache.invalidate(*(row[2] for row in rows))
+        return result
 
     def add_identity_alias(self, user_id, alias):
         def _do_op(conn):
@@ -808,6 +1854,7 @@ class DatabaseManager:
                          (','.join(aliases), datetime.now().isoformat(), user_id))
             return f"Alias added: {alias}"
         result = self._execute_write(_do_op)
+        self._relation_cache.invalidate(user_id)
         return result if result is not None else "Error: add alias failed"
 
     def get_user_aliases(self, user_id):
@@ -854,44 +1901,289 @@ class DatabaseManager:
     def cleanup_memories(self, days=None, max_memories=None):
         days = days or self.config.get('memory_cleanup_days', 365)
         max_memories = max_memories or self.config.get('memory_cleanup_max', 10000)
+        self.flush_access_stats()
+        _removed = []
         def _do_op(conn):
             cursor = conn.cursor()
+            _removed.clear()
             cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-            cursor.execute('DELETE FROM memories WHERE importance < 3 AND access_count = 0 AND created_at < ?', (cutoff,))
-            deleted = cursor.rowcount
+            cursor.execute('SELECT id FROM memories WHERE importance < 3 AND access_count = 0 AND created_at < ?', (cutoff,))
+            _removed.extend(row[0] for row in cursor.fetchall())
+            self._delete_memory_ids(cursor, _removed)
             cursor.execute('SELECT COUNT(*) FROM memories')
             count = cursor.fetchone()[0]
             if count > max_memories:
-                cursor.execute('DELETE FROM memories WHERE id IN (SELECT id FROM memories ORDER BY importance ASC, access_count ASC, created_at ASC LIMIT ?)', (count - max_memories,))
-                deleted += cursor.rowcount
-            return f"Cleaned {deleted} memories"
+                cursor.execute('SELECT id FROM memories ORDER BY importance ASC, access_count ASC, created_at ASC LIMIT ?',
+                               (count - max_memories,))
+                excess = [row[0] for row in cursor.fetchall()]
+                self._delete_memory_ids(cursor, excess)
+                _removed.extend(excess)
+            return f"Cleaned {len(_removed)} memories"
         result = self._execute_write(_do_op)
+        self.invalidate_search_cache()
+        if result is not None: self._vector_index_sync([(memory_id, None) for memory_id in _removed])
         return result if result is not None else "Error: cleanup failed"
 
+    @staticmethod
+    def _delete_memory_ids(cursor, ids, chunk_size=500):
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            cursor.execute(f'DELETE FROM memories WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+
+    def cluster_near_duplicates(self, threshold=None, apply=False, limit=100):
+        """离线聚类整张表的近似重复记忆。
+
+        把 memory_lsh 按 (band, key) 顺序扫一遍，同桶记忆两两用签名估计相似度，达到阈值的
+        用并查集合并成簇。每簇保留重要度最高（同分取最早）的一条；apply=True 时把其余记忆
+        并入保留项（重要度取最大、访问次数累加）后删除。返回前 limit 个簇的预览及总数。
+        """
+        threshold = self._near_dup_threshold(threshold)
+        def _read(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT s.memory_id, s.sig, m.importance FROM memory_minhash s '
+                           'JOIN memories m ON m.id = s.memory_id WHERE s.sig IS NOT NULL ORDER BY s.memory_id')
+            rows = cursor.fetchall()
+            cursor.execute('SELECT band, key, memory_id FROM memory_lsh ORDER BY band, key')
+            buckets = []
+            current, members = None, []
+            for band, key, memory_id in cursor:
+                if (band, key) != current:
+                    if len(members) > 1: buckets.append(members)
+                    current, members = (band, key), []
+                members.append(memory_id)
+            if len(members) > 1: buckets.append(members)
+            return rows, buckets
+        data = self._execute_read(_read)
+        if data is None: return {'error': 'read failed'}
+        rows, buckets = data
+        position = {row[0]: i for i, row in enumerate(rows)}
+        parent = list(range(len(rows)))
+        def _find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for members in buckets:
+            members = [position[m] for m in members if m in position]
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    a, b = _find(members[x]), _find(members[y])
+                    if a != b and minhash_similarity(rows[members[x]][1], rows[members[y]][1]) >= threshold:
+                        parent[max(a, b)] = min(a, b)
+        groups = {}
+        for i in range(len(rows)):
+            groups.setdefault(_find(i), []).append(i)
+        clusters = []
+        for members in groups.values():
+            if len(members) < 2: continue
+            # rows 按 id 升序，同重要度时保留最早的一条
+            keep = max(members, key=lambda i: (rows[i][2] or 0, -rows[i][0]))
+            clusters.append({'keep': rows[keep][0],
+                             'duplicates': [rows[i][0] for i in members if i != keep]})
+        clusters.sort(key=lambda c: -len(c['duplicates']))
+        duplicates = sum(len(c['duplicates']) for c in clusters)
+        merged = 0
+        if apply and clusters:
+            def _do_op(conn):
+                cursor = conn.cursor()
+                done = 0
+                for c in clusters:
+                    dup_ids = c['duplicates']
+                    ph = ','.join('?' * len(dup_ids))
+                    cursor.execute(f'SELECT MAX(importance), COALESCE(SUM(access_count), 0), COUNT(*) FROM memories '
+                                   f'WHERE id IN ({ph})', dup_ids)
+                    importance, access_count, found = cursor.fetchone()
+                    if not found: continue
+                    self._merge_near_duplicate(cursor, c['keep'], importance, access_count)
+                    cursor.execute(f'DELETE FROM memories WHERE id IN ({ph})', dup_ids)
+                    cursor.execute(f'DELETE FROM activities WHERE memory_id IN ({ph})', dup_ids)
+                    cursor.execute('INSERT INTO activities (memory_id, activity_type, description) VALUES (?, ?, ?)',
+                                   (c['keep'], 'merge', f'merged {found} near-duplicates'))
+                    done += found
+                return done
+            merged = self._execute_write(_do_op)
+            if merged is None: return {'error': 'merge failed'}
+            self.invalidate_search_cache()
+            self._vector_index_sync([(memory_id, None) for c in clusters for memory_id in c['duplicates']])
+        preview = clusters[:limit]
+        if preview:
+            ids = [i for c in preview for i in [c['keep']] + c['duplicates']]
+            def _contents(conn):
+                cursor = conn.cursor()
+                found = {}
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    cursor.execute(f'SELECT id, content FROM memories WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+                    found.update((r[0], r[1][:80]) for r in cursor.fetchall())
+                return found
+            contents = self._execute_read(_contents) or {}
+            for c in preview:
+                c['keep_content'] = contents.get(c['keep'])
+                c['duplicate_contents'] = [contents.get(i) for i in c['duplicates']]
+        return {'clusters': preview, 'cluster_count': len(clusters), 'duplicates': duplicates,
+                'merged': merged, 'threshold': threshold}
+
+    def _prepare_import_item(self, item):
+        """导入条目的准备阶段（不持写锁），正文为空时返回 None。"""
+        content = item.get('content', '').strip()
+        if not content: return None
+        tags = item.get('tags')
+        if tags is None: tags = self._extract_tags(content)
+        elif isinstance(tags, str): tags = tags.split(',')
+        tags_str = ','.join(tags) if isinstance(tags, list) else tags
+        return {'content': content, 'hash': hashlib.md5(content.encode('utf-8')).hexdigest(),
+                'category': item.get('category') or self._guess_category(content),
+                'importance': item.get('importance', 5), 'source': item.get('source', 'import'),
+                'tags': tags_str, 'index': self._prepare_memory_index(content, tags_str)}
+
     def bulk_import_memories(self, items):
+        prepared = [p for p in map(self._prepare_import_item, items) if p is not None]
+        result = self._insert_prepared_memories(prepared)
+        if result is None: return "Error: bulk import failed"
+        imported, skipped, merged = result
+        if merged:
+            return f"Imported: {imported}, Skipped (duplicate): {skipped}, Merged (near-duplicate): {merged}"
+        return f"Imported: {imported}, Skipped (duplicate): {skipped}"
+
+    def _insert_prepared_memories(self, prepared):
+        """把 _prepare_import_item 准备好的一批条目在一个写操作里入库，返回 (imported, skipped, merged)，失败为 None。
+
+        哈希去重按批查询；near_dup_policy 为 keep 时整批 executemany 插入后批量建索引，
+        否则逐条检查近似重复并立即入库（同批内后面的条目也要能查到前面的）。
+        """
+        _vectors = []
+        _added = []
         def _do_op(conn):
+            del _vectors[:]
+            del _added[:]
             cursor = conn.cursor()
             imported = 0
             skipped = 0
-            for item in items:
-                content = item.get('content', '').strip()
-                if not content: continue
-                content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
-                cursor.execute('SELECT id FROM memories WHERE hash = ?', (content_hash,))
-                if cursor.fetchone(): skipped += 1; continue
-                category = item.get('category') or self._guess_category(content)
-                importance = item.get('importance', 5)
-                tags = item.get('tags')
-                if tags is None: tags = self._extract_tags(content)
-                elif isinstance(tags, str): tags = tags.split(',')
-                source = item.get('source', 'import')
+            merged = 0
+            policy = self._near_dup_policy()
+            existing = self._existing_hashes(cursor, [item['hash'] for item in prepared])
+            accepted = []
+            for item in prepared:
+                if item['hash'] in existing: skipped += 1; continue
+                existing.add(item['hash'])
+                if policy == 'keep':
+                    accepted.append(item)
+                    continue
+                index = item['index']
+                dup = self._find_near_duplicate(cursor, index['signature'])
+                if dup and policy == 'reject': skipped += 1; continue
+                if dup:
+                    self._merge_near_duplicate(cursor, dup[0], item['importance'])
+                    merged += 1
+                    continue
                 cursor.execute(
                     'INSERT INTO memories (content, category, importance, tags, source, hash) VALUES (?, ?, ?, ?, ?, ?)',
-                    (content, category, importance, ','.join(tags) if isinstance(tags, list) else tags, source, content_hash))
+                    (item['content'], item['category'], item['importance'], item['tags'], item['source'], item['hash']))
+                memory_id = cursor.lastrowid
+                _vectors.append((memory_id, self._apply_memory_index(cursor, memory_id, index)))
+                _added.append((memory_id, item['category'], item['importance']))
                 imported += 1
-            return f"Imported: {imported}, Skipped (duplicate): {skipped}"
+            if accepted:
+                cursor.executemany(
+                    'INSERT INTO memories (content, category, importance, tags, source, hash) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(item['content'], item['category'], item['importance'], item['tags'], item['source'], item['hash'])
+                     for item in accepted])
+                ids = self._ids_by_hash(cursor, [item['hash'] for item in accepted])
+                _vectors.extend(self._index_new_memories(cursor, [(ids[item['hash']], item['index']) for item in accepted]))
+                _added.extend((ids[item['hash']], item['category'], item['importance']) for item in accepted)
+                imported += len(accepted)
+            return imported, skipped, merged
         result = self._execute_write(_do_op)
-        return result if result is not None else "Error: bulk import failed"
+        if not isinstance(result, tuple): return None
+        self.invalidate_search_cache()
+        self._vector_index_sync(_vectors)
+        self._related_pool_add(_added)
+        return result
+
+    @staticmethod
+    def _existing_hashes(cursor, hashes, chunk_size=500):
+        existing = set()
+        for start in range(0, len(hashes), chunk_size):
+            part = hashes[start:start + chunk_size]
+            cursor.execute(f"SELECT hash FROM memories WHERE hash IN ({','.join('?' * len(part))})", part)
+            existing.update(row[0] for row in cursor.fetchall())
+        return existing
+
+    @staticmethod
+    def _ids_by_hash(cursor, hashes, chunk_size=500):
+        ids = {}
+        for start in range(0, len(hashes), chunk_size):
+            part = hashes[start:start + chunk_size]
+            cursor.execute(f"SELECT hash, id FROM memories WHERE hash IN ({','.join('?' * len(part))})", part)
+            ids.update((row[0], row[1]) for row in cursor.fetchall())
+        return ids
+
+    def _index_new_memories(self, cursor, entries):
+        """为刚插入的一批记忆 [(memory_id, prepared)] 批量写入各项索引（新 id 没有旧索引，不用先删），返回向量列表。"""
+        cursor.executemany(
+            'INSERT INTO memory_terms (term, memory_id, tf, in_tags, first_pos) VALUES (?, ?, ?, ?, ?)',
+            [(t, memory_id, tf, in_tags, pos) for memory_id, p in entries for t, tf, in_tags, pos in p['terms']])
+        cursor.executemany('INSERT OR REPLACE INTO memory_term_docs (memory_id, length) VALUES (?, ?)',
+                           [(memory_id, sum(r[1] for r in p['terms'])) for memory_id, p in entries])
+        if self._fts_seg_mode:
+            cursor.executemany('INSERT INTO memories_fts_seg (rowid, content, tags) VALUES (?, ?, ?)',
+                               [(memory_id, *p['fts_seg']) for memory_id, p in entries if p['fts_seg']])
+        cursor.executemany('INSERT OR IGNORE INTO memory_tags (memory_id, tag) VALUES (?, ?)',
+                           [(memory_id, t) for memory_id, p in entries for t in self._split_tags(p['tags'])])
+        cursor.executemany('INSERT OR REPLACE INTO memory_minhash (memory_id, sig) VALUES (?, ?)',
+                           [(memory_id, p['signature']) for memory_id, p in entries])
+        cursor.executemany('INSERT OR IGNORE INTO memory_lsh (band, key, memory_id) VALUES (?, ?, ?)',
+                           [(band, key, memory_id) for memory_id, p in entries if p['signature'] is not None
+                            for band, key in enumerate(lsh_keys(p['signature']))])
+        vectors = [(memory_id, p['vector']) for memory_id, p in entries]
+        cursor.executemany('INSERT OR REPLACE INTO memory_vectors (memory_id, dim, vec) VALUES (?, ?, ?)',
+                           [(memory_id, self._vector_dim(), blob) for memory_id, blob in vectors if blob is not None])
+        return vectors
+
+    def _memory_hash_set(self):
+        """读出全部记忆内容哈希（16 字节摘要）的集合，供流式导入在内存里去重。"""
+        def _do_op(conn):
+            hashes = set()
+            for (h,) in conn.execute('SELECT hash FROM memories WHERE hash IS NOT NULL'):
+                try: hashes.add(bytes.fromhex(h))
+                except (TypeError, ValueError): pass
+            return hashes
+        result = self._execute_read(_do_op)
+        return result if result is not None else set()
+
+    # ==================== 流式导入任务 ====================
+
+    def _get_importer(self):
+        with self._importer_lock:
+            if self._importer is None:
+                self._importer = MemoryImporter(self, workers=self.config.get('import_workers', 0) or None,
+                                                chunk_size=self.config.get('import_chunk_size', 500))
+                # 上次进程退出时没导完的上传文件
+                spool_dir = os.path.dirname(self.db_path)
+                for name in os.listdir(spool_dir):
+                    if name.startswith('memory_import_') and name.endswith('.jsonl'):
+                        try: os.remove(os.path.join(spool_dir, name))
+                        except OSError: pass
+            return self._importer
+
+    def create_import_spool(self):
+        """为一次流式上传在数据目录下创建临时文件，返回 (路径, 以二进制写打开的文件对象)。"""
+        self._get_importer()
+        fd, path = tempfile.mkstemp(prefix='memory_import_', suffix='.jsonl', dir=os.path.dirname(self.db_path))
+        return path, os.fdopen(fd, 'wb')
+
+    def start_memory_import(self, path):
+        """为已写好的 NDJSON 文件启动后台导入任务，返回任务 id（任务结束后删除该文件）。"""
+        return self._get_importer().submit(path)
+
+    def get_import_job(self, job_id):
+        return self._get_importer().get(job_id)
+
+    def list_import_jobs(self):
+        return self._get_importer().list()
+
+    def cancel_import_job(self, job_id):
+        return self._get_importer().cancel(job_id)
 
     def get_memory_stats(self):
         def _do_op(conn):
@@ -903,13 +2195,66 @@ class DatabaseManager:
             cursor.execute('SELECT COUNT(*) FROM activities')
             act_count = cursor.fetchone()[0]
             import sys
-            return {
+            stats = {
                 'memories': mem_count, 'relationships': rel_count,
                 'activities': act_count, 'python_version': sys.version.split()[0]
             }
+            stats['search_cache'] = self._search_cache.stats()
+            stats['relationship_cache'] = self._relation_cache.stats()
+            with self._search_stats_lock:
+                stats['search_parallel'] = dict(self._search_stats)
+            if self._vector_index is not None: stats['vector_index'] = self._vector_index.stats()
+            if self._related_pool is not None: stats['related_pool'] = self._related_pool.stats()
+            stats['tokenizer'] = self._tokenizer.stats()
+            if self._writer: stats['write_queue'] = self._writer.stats()
+            if self._pool: stats['connection_pool'] = self._pool.stats()
+            return stats
         result = self._execute_read(_do_op)
         return result if result is not None else {'error': 'stats read failed'}
 
+    # ==================== 导出 ====================
+
+    _EXPORT_QUERIES = {
+        'memories': 'SELECT id, content, category, importance, tags, source, access_count, created_at, updated_at, '
+                    'last_accessed FROM memories ORDER BY id',
+        'glossary': 'SELECT id, term, category, meaning, source, tags, hit_count, created_at, updated_at '
+                    'FROM glossary ORDER BY id',
+        'relationships': 'SELECT user_id, nickname, relation_type, summary, notes, first_met_location, identity_aliases, '
+                         'created_at, updated_at, interaction_count, last_interaction FROM relationships',
+    }
+
+    def iter_export(self, table, chunk_size=500):
+        """逐行（dict）导出整表；表名不支持时立即抛 ValueError。
+
+        用一条不进连接池的独立连接执行单条 SELECT，按 fetchmany 分批取行：WAL 下这条语句读的是
+        开始时的快照，不阻塞写入，内存占用与表大小无关。生成器读完或被关闭时释放连接。
+        """
+        sql = self._EXPORT_QUERIES.get(table)
+        if sql is None:
+            raise ValueError(f"unsupported export table: {table}")
+        return self._iter_export_rows(sql, chunk_size)
+
+    def _iter_export_rows(self, sql, chunk_size):
+        conn = self._get_connection()
+        try:
+            conn.execute('PRAGMA query_only = ON')
+            cursor = conn.execute(sql)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows: break
+                for row in rows: yield dict(row)
+        finally:
+            conn.close()
+
+    def export_table(self, table, fmt='jsonl', compress=False):
+        """流式导出，返回 (字节块生成器, MIME 类型, 建议文件名)；表名或格式不支持时抛 ValueError。"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"unsupported export format: {fmt}")
+        mimetype, ext = EXPORT_FORMATS[fmt]
+        chunks = encode_rows(self.iter_export(table), fmt, compress)
+        if compress: return chunks, 'application/gzip', f"{table}.{ext}.gz"
+        return chunks, mimetype, f"{table}.{ext}"
+
     # ==================== Glossary (梗/黑话库) ====================
 
     def add_glossary(self, term, category='其他梗', meaning='', source='', tags='', fuzzy_dedup=False):
@@ -926,50 +2271,38 @@ class DatabaseManager:
         def _do_op(conn):
             cursor = conn.cursor()
             # 归一化判重：忽略大小写/全角半角/空格差异（如 yyds / YYDS / ｙｙｄｓ）
-            norm = normalize_term(term)
-            cursor.execute(
-                'SELECT id FROM glossary WHERE LOWER(REPLACE(term, " ", "")) = ?',
-                (norm,))
-            if cursor.fetchone():
-                return "already_exists"
+            norm = normalize_term(term) or None
+            if norm:
+                cursor.execute('SELECT id FROM glossary WHERE term_norm = ?', (norm,))
+                if cursor.fetchone():
+                    return "already_exists"
             cursor.execute(
-                'INSERT INTO glossary (term, category, meaning, source, tags) VALUES (?, ?, ?, ?, ?)',
-                (term, category, meaning, source, tags))
+                'INSERT INTO glossary (term, category, meaning, source, tags, term_norm) VALUES (?, ?, ?, ?, ?, ?)',
+                (term, category, meaning, source, tags, norm))
+            _new_id[0] = cursor.lastrowid
             return f"Glossary saved (ID:{cursor.lastrowid})"
+        _new_id = [None]
         result = self._execute_write(_do_op)
         if result == "already_exists":
             return "already_exists"
+        if result is not None and _new_id[0]:
+            self._glossary_index_add([{'id': _new_id[0], 'term': term, 'meaning': meaning,
+                                       'category': category, 'source': source, 'hit_count': 0}])
         return result if result is not None else "Error: database write failed"
 
     def find_similar_glossary(self, term, threshold=0.85, limit=1):
         """查找与 term 高度相似的已有梗（用于模糊去重）。
 
-        先用长度粗筛缩小范围，再用 difflib 序列相似度比较。
-        千级梗库单次调用在毫秒级，仅用于新增/采集入库时。
+        通过内存中的 bigram 倒排索引只取可能达到阈值的候选，再用 difflib 精确打分，
+        不再逐条扫描整个梗库。
         """
-        norm = normalize_term(term)
-        if not norm:
+        if not normalize_term(term):
             return []
-        def _do_op(conn):
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, term FROM glossary')
-            rows = cursor.fetchall()
-            # 长度粗筛：长度差超过 max(2, 词长/3) 的词不可能相似，跳过
-            max_diff = max(2, len(norm) // 3)
-            candidates = []
-            for row in rows:
-                t = normalize_term(row['term'])
-                if not t or t == norm:
-                    continue
-                if abs(len(t) - len(norm)) > max_diff:
-                    continue
-                ratio = difflib.SequenceMatcher(None, norm, t).ratio()
-                if ratio >= threshold:
-                    candidates.append((ratio, row['id'], row['term']))
-            candidates.sort(key=lambda x: -x[0])
-            return [{'id': i, 'term': t, 'score': round(s, 3)} for s, i, t in candidates[:limit]]
-        result = self._execute_read(_do_op)
-        return result if result is not None else []
+        return self._ensure_glossary_indexes()[1].find_similar(term, threshold, limit)
+
+    def dedup_glossary_terms(self, terms, threshold=0.85):
+        """批量模糊去重：返回与 terms 对齐的列表，重复项给出匹配到的已有词或同批更早的词，新词为 None。"""
+        return self._ensure_glossary_indexes()[1].find_similar_many([str(t) for t in terms], threshold)
 
     def update_glossary(self, glossary_id, term=None, category=None, meaning=None, source=None, tags=None):
         _tags = tags
@@ -982,7 +2315,13 @@ class DatabaseManager:
             updates = []
             params = []
             if term is not None:
+                norm = normalize_term(term) or None
+                if norm:
+                    cursor.execute('SELECT id FROM glossary WHERE term_norm = ? AND id != ?', (norm, glossary_id))
+                    if cursor.fetchone():
+                        return "Glossary term already exists"
                 updates.append("term = ?"); params.append(str(term).strip())
+                updates.append("term_norm = ?"); params.append(norm)
             if category is not None:
                 updates.append("category = ?"); params.append(category)
             if meaning is not None:
@@ -995,8 +2334,15 @@ class DatabaseManager:
             updates.append("updated_at = ?"); params.append(datetime.now().isoformat())
             params.append(glossary_id)
             cursor.execute(f'UPDATE glossary SET {", ".join(updates)} WHERE id = ?', params)
+            cursor.execute('SELECT id, term, meaning, category, source, hit_count FROM glossary WHERE id = ?', (glossary_id,))
+            _updated[0] = dict(cursor.fetchone())
             return f"Glossary updated (ID:{glossary_id})"
+        _updated = [None]
         result = self._execute_write(_do_op)
+        if result == "Glossary term already exists":
+            return result
+        if result is not None and _updated[0]:
+            self._glossary_index_add([_updated[0]])
         return result if result is not None else "Error: operation failed"
 
     def delete_glossary(self, glossary_id):
@@ -1005,8 +2351,11 @@ class DatabaseManager:
             cursor.execute('DELETE FROM glossary WHERE id = ?', (glossary_id,))
             if cursor.rowcount == 0:
                 return "Glossary not found"
+            cursor.execute('DELETE FROM glossary_hits WHERE glossary_id = ?', (glossary_id,))
             return f"Glossary deleted (ID:{glossary_id})"
         result = self._execute_write(_do_op)
+        if result is not None:
+            self._glossary_index_remove(glossary_id)
         return result if result is not None else "Error: operation failed"
 
     def get_glossary(self, glossary_id):
@@ -1017,18 +2366,23 @@ class DatabaseManager:
             return dict(row) if row else None
         return self._execute_read(_do_op)
 
+    @staticmethod
+    def _glossary_filter(category=None, query=None):
+        conditions = []
+        params = []
+        if category:
+            conditions.append("category = ?"); params.append(category)
+        if query:
+            q = str(query).strip()
+            if q:
+                conditions.append("(term LIKE ? OR meaning LIKE ? OR tags LIKE ? OR source LIKE ?)")
+                params.extend([f'%{q}%', f'%{q}%', f'%{q}%', f'%{q}%'])
+        return conditions, params
+
     def get_glossaries(self, limit=28, offset=0, category=None, query=None):
         def _do_op(conn):
             cursor = conn.cursor()
-            conditions = []
-            params = []
-            if category:
-                conditions.append("category = ?"); params.append(category)
-            if query:
-                q = str(query).strip()
-                if q:
-                    conditions.append("(term LIKE ? OR meaning LIKE ? OR tags LIKE ? OR source LIKE ?)")
-                    params.extend([f'%{q}%', f'%{q}%', f'%{q}%', f'%{q}%'])
+            conditions, params = self._glossary_filter(category, query)
             where = (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
             cursor.execute(
                 f'SELECT * FROM glossary{where} ORDER BY created_at DESC LIMIT ? OFFSET ?',
@@ -1037,20 +2391,20 @@ class DatabaseManager:
         result = self._execute_read(_do_op)
         return result if result is not None else []
 
+    def get_glossaries_page(self, limit=28, cursor=None, category=None, query=None):
+        """按 (created_at, id) 倒序的键集分页。"""
+        conditions, params = self._glossary_filter(category, query)
+        sql = 'SELECT * FROM glossary WHERE 1' + ''.join(' AND ' + c for c in conditions)
+        return self._keyset_page(sql, params, ('created_at', 'id'), limit, cursor)
+
     def get_glossaries_count(self, category=None, query=None):
+        """梗词条数；无关键词时读计数表，带关键词搜索时才实际 COUNT。"""
+        if not (query and str(query).strip()):
+            return self._row_count('glossary', category)
         def _do_op(conn):
             cursor = conn.cursor()
-            conditions = []
-            params = []
-            if category:
-                conditions.append("category = ?"); params.append(category)
-            if query:
-                q = str(query).strip()
-                if q:
-                    conditions.append("(term LIKE ? OR meaning LIKE ? OR tags LIKE ? OR source LIKE ?)")
-                    params.extend([f'%{q}%', f'%{q}%', f'%{q}%', f'%{q}%'])
-            where = (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
-            cursor.execute(f'SELECT COUNT(*) FROM glossary{where}', params)
+            conditions, params = self._glossary_filter(category, query)
+            cursor.execute(f'SELECT COUNT(*) FROM glossary WHERE {" AND ".join(conditions)}', params)
             return cursor.fetchone()[0]
         result = self._execute_read(_do_op)
         return result if result is not None else 0
@@ -1066,6 +2420,7 @@ class DatabaseManager:
         return result if result is not None else []
 
     def get_glossary_stats(self):
+        self.flush_glossary_hits()
         def _do_op(conn):
             cursor = conn.cursor()
             cursor.execute('SELECT COUNT(*) FROM glossary')
@@ -1078,28 +2433,122 @@ class DatabaseManager:
             today_new = cursor.fetchone()[0]
             cursor.execute('SELECT COUNT(*) FROM glossary WHERE hit_count > 0')
             used = cursor.fetchone()[0]
-            return {'total': total, 'categories': categories, 'today_new': today_new, 'used': used}
+            cursor.execute('SELECT COALESCE(SUM(hits), 0) FROM glossary_hits WHERE bucket >= ?', (today,))
+            hits_today = cursor.fetchone()[0]
+            return {'total': total, 'categories': categories, 'today_new': today_new, 'used': used,
+                    'hits_today': hits_today, 'trending': self._glossary_trending(cursor, 24, None, 10)}
+        result = self._execute_read(_do_op)
+        return result if result is not None else {'total': 0, 'categories': 0, 'today_new': 0, 'used': 0,
+                                                  'hits_today': 0, 'trending': []}
+
+    def _glossary_trending(self, cursor, hours, group_id, limit):
+        since = (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%d %H')
+        sql = ('SELECT g.id, g.term, g.category, SUM(h.hits) AS hits FROM glossary_hits h '
+               'JOIN glossary g ON g.id = h.glossary_id WHERE h.bucket >= ?')
+        params = [since]
+        if group_id is not None:
+            sql += ' AND h.group_id = ?'; params.append(group_id)
+        cursor.execute(sql + ' GROUP BY h.glossary_id ORDER BY hits DESC LIMIT ?', params + [limit])
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_glossary_trending(self, hours=24, group_id=None, limit=10):
+        """最近 hours 小时内命中最多的梗（可按群过滤），只扫描分桶表的近期部分。"""
+        self.flush_glossary_hits()
+        result = self._execute_read(lambda conn: self._glossary_trending(conn.cursor(), hours, group_id, limit))
+        return result if result is not None else []
+
+    def get_glossary_hit_series(self, glossary_id, days=7, group_id=None):
+        """某个梗按天汇总的命中曲线 [{'day', 'hits'}]。"""
+        def _do_op(conn):
+            since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+            sql = ('SELECT substr(bucket, 1, 10) AS day, SUM(hits) AS hits FROM glossary_hits '
+                   'WHERE glossary_id = ? AND bucket >= ?')
+            params = [glossary_id, since]
+            if group_id is not None:
+                sql += ' AND group_id = ?'; params.append(group_id)
+            cursor = conn.execute(sql + ' GROUP BY day ORDER BY day', params)
+            return [dict(row) for row in cursor.fetchall()]
         result = self._execute_read(_do_op)
-        return result if result is not None else {'total': 0, 'categories': 0, 'today_new': 0, 'used': 0}
+        return result if result is not None else []
 
     def get_all_glossary_terms(self):
         """返回所有梗词条目，用于对话匹配注入。"""
         def _do_op(conn):
             cursor = conn.cursor()
-            cursor.execute('SELECT id, term, meaning, category, source FROM glossary')
+            cursor.execute('SELECT id, term, meaning, category, source, hit_count FROM glossary')
             return [dict(row) for row in cursor.fetchall()]
         result = self._execute_read(_do_op)
         return result if result is not None else []
 
-    def increment_glossary_hit(self, glossary_id):
+    # ---------- 梗词匹配索引 ----------
+
+    def _ensure_glossary_indexes(self):
+        with self._glossary_index_lock:
+            if self._glossary_matcher is None:
+                rows = self.get_all_glossary_terms()
+                self._glossary_matcher = GlossaryMatcher(rows)
+                self._glossary_fuzzy = FuzzyTermIndex(rows)
+                logger.info(f"Glossary indexes built: {len(self._glossary_matcher)} terms")
+            return self._glossary_matcher, self._glossary_fuzzy
+
+    def _glossary_index_add(self, rows):
+        with self._glossary_index_lock:
+            if self._glossary_matcher is None: return
+            for row in rows:
+                self._glossary_matcher.add(row)
+                self._glossary_fuzzy.add(row['id'], row['term'])
+
+    def _glossary_index_remove(self, glossary_id):
+        with self._glossary_index_lock:
+            if self._glossary_matcher is not None:
+                self._glossary_matcher.remove(glossary_id)
+                self._glossary_fuzzy.remove(glossary_id)
+
+    def _invalidate_glossary_index(self):
+        with self._glossary_index_lock:
+            self._glossary_matcher = None
+            self._glossary_fuzzy = None
+
+    def match_glossary(self, text, limit=None):
+        """返回消息中出现的梗词（最长匹配优先，按词长/命中次数排序）。"""
+        if not text: return []
+        limit = limit if limit is not None else self.config.get('glossary_match_limit', 10)
+        return self._ensure_glossary_indexes()[0].match(text, limit)
+
+    def increment_glossary_hit(self, glossary_id, group_id=''):
+        """记录一次梗命中（内存缓冲，后台按间隔或数量阈值批量写回）。"""
+        self._glossary_hits.record(glossary_id, group_id)
+        with self._glossary_index_lock:
+            if self._glossary_matcher is not None:
+                self._glossary_matcher.bump_hits(glossary_id)
+        if self._flusher and len(self._glossary_hits) >= self.config.get('glossary_hit_flush_threshold', 200):
+            self._flusher.trigger()
+
+    def flush_glossary_hits(self):
+        totals, buckets = self._glossary_hits.drain()
+        if not totals: return 0
+        retention_days = self.config.get('glossary_hit_retention_days', 30)
         def _do_op(conn):
-            conn.execute('UPDATE glossary SET hit_count = hit_count + 1 WHERE id = ?', (glossary_id,))
-            return "ok"
-        self._execute_write(_do_op)
+            conn.executemany('UPDATE glossary SET hit_count = hit_count + ? WHERE id = ?', totals)
+            conn.executemany(
+                'INSERT INTO glossary_hits (glossary_id, bucket, group_id, hits) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(glossary_id, bucket, group_id) DO UPDATE SET hits = hits + excluded.hits',
+                buckets)
+            if retention_days > 0:
+                cutoff = (datetime.now() - timedelta(days=retention_days)).strftime('%Y-%m-%d')
+                conn.execute('DELETE FROM glossary_hits WHERE bucket < ?', (cutoff,))
+            return len(totals)
+        result = self._execute_write(_do_op)
+        if result is None:
+            self._glossary_hits.restore(totals, buckets)
+            return 0
+        return result
 
     def bulk_import_glossary(self, items):
+        inserted = []
         def _do_op(conn):
             cursor = conn.cursor()
+            del inserted[:]
             imported = 0
             skipped = 0
             for item in items:
@@ -1108,13 +2557,7 @@ class DatabaseManager:
                 term = str(item.get('term', '')).strip()
                 if not term:
                     continue
-                norm = normalize_term(term)
-                cursor.execute(
-                    'SELECT id FROM glossary WHERE LOWER(REPLACE(term, " ", "")) = ?',
-                    (norm,))
-                if cursor.fetchone():
-                    skipped += 1
-                    continue
+                norm = normalize_term(term) or None
                 category = item.get('category') or '其他梗'
                 meaning = str(item.get('meaning', '') or '')
                 source = str(item.get('source', '') or '')
@@ -1126,54 +2569,114 @@ class DatabaseManager:
                 else:
                     tags = str(tags)
                 cursor.execute(
-                    'INSERT INTO glossary (term, category, meaning, source, tags) VALUES (?, ?, ?, ?, ?)',
-                    (term, category, meaning, source, tags))
+                    'INSERT OR IGNORE INTO glossary (term, category, meaning, source, tags, term_norm) VALUES (?, ?, ?, ?, ?, ?)',
+                    (term, category, meaning, source, tags, norm))
+                if cursor.rowcount == 0:
+                    skipped += 1
+                    continue
+                inserted.append({'id': cursor.lastrowid, 'term': term, 'meaning': meaning,
+                                 'category': category, 'source': source, 'hit_count': 0})
                 imported += 1
             return f"Imported: {imported}, Skipped (duplicate): {skipped}"
         result = self._execute_write(_do_op)
+        if result is not None and inserted:
+            self._glossary_index_add(inserted)
         return result if result is not None else "Error: bulk import failed"
 
     # ==================== Associative Memory (搜索联想) ====================
 
+    def _refresh_related_pool(self):
+        """在后台线程里重新抽样联想候选池（已有刷新在跑时直接返回）。"""
+        with self._related_pool_lock:
+            if self._related_pool_thread and self._related_pool_thread.is_alive(): return
+            self._related_pool_thread = threading.Thread(
+                target=self._build_related_pool, daemon=True, name='MemoryCapsuleRelatedPool')
+            self._related_pool_thread.start()
+
+    def _build_related_pool(self, chunk_size=2000):
+        """按主键分批扫一遍高重要度记忆，用蓄水池抽样为每个分类留一份样本，完成后整体替换旧池。"""
+        size = self.config.get('related_pool_size', 32)
+        pool = RelatedMemoryPool(self._search_cache.generation, per_category=size, global_size=size * 2)
+        last_id = 0
+        def _read(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, category, importance FROM memories WHERE id > ? AND importance >= ? '
+                           'ORDER BY id LIMIT ?', (last_id, pool.min_importance, chunk_size))
+            return cursor.fetchall()
+        while True:
+            rows = self._execute_read(_read)
+            if rows is None: return
+            if not rows: break
+            for memory_id, category, importance in rows:
+                pool.offer(memory_id, category, importance)
+            last_id = rows[-1][0]
+        self._related_pool = pool
+        # 扫描结束到换池之间写入的记忆只加进了旧池，换池后再补读一次
+        for memory_id, category, importance in self._execute_read(_read) or []:
+            pool.add(memory_id, category, importance)
+        logger.debug(f"Related memory pool rebuilt: {pool.stats()}")
+
+    def _related_pool_add(self, rows):
+        """新写入的记忆 [(id, category, importance)] 立即加进候选池（池还没建好时由首次构建读到）。"""
+        pool = self._related_pool
+        if pool is None: return
+        for memory_id, category, importance in rows:
+            pool.add(memory_id, category, importance)
+
+    def _get_related_pool(self):
+        """返回当前候选池：首次使用时同步构建（后台构建已在跑则等它完成）；
+        之后新记忆写入时即时加入，记忆有变动且距上次抽样超过 related_pool_refresh_interval 秒时触发后台重新抽样。"""
+        pool = self._related_pool
+        if pool is None:
+            with self._related_pool_lock:
+                thread = self._related_pool_thread
+            if thread and thread.is_alive() and thread is not threading.current_thread(): thread.join()
+            else: self._build_related_pool()
+            return self._related_pool
+        if (pool.generation != self._search_cache.generation
+                and time.monotonic() - pool.built_at >= self.config.get('related_pool_refresh_interval', 300)):
+            self._refresh_related_pool()
+        return pool
+
     def search_memory_related(self, query, exclude_ids=None, limit=3):
-        """在精确搜索结果之外，返回一些不完全相关但可能有用的记忆（联想）。"""
+        """在精确搜索结果之外，返回一些不完全相关但可能有用的记忆（联想）。
+
+        查询词经 term_categories 找到各自最常出现的分类，从预抽样的分类候选池里取高分记忆，
+        不足时从全局候选池随机补充；全程只按主键/索引点查，耗时与记忆总量无关。
+        """
         exclude_ids = exclude_ids or []
+        pool = self._get_related_pool()
+        if pool is None or limit <= 0: return []
+        query_terms = list(set(self._tokenize(str(query).lower())))[:32]
         def _do_op(conn):
             cursor = conn.cursor()
-            excl_ph = ','.join('?' * len(exclude_ids)) if exclude_ids else ''
-            excl_sql = f' AND id NOT IN ({excl_ph})' if excl_ph else ''
-            excl_params = list(exclude_ids)
+            def _fetch(ids, min_importance):
+                if not ids: return []
+                cursor.execute(
+                    f'SELECT id, content, category, importance, tags, created_at FROM memories '
+                    f'WHERE id IN ({",".join("?" * len(ids))}) AND importance >= ?', list(ids) + [min_importance])
+                return [dict(r) for r in cursor.fetchall()]
 
             related = []
             # 1) 同分类的高分记忆
-            query_words = set(re.findall(r'\w{2,}', str(query).lower()))
             cats = set()
-            if query_words:
-                for w in query_words:
-                    cursor.execute(
-                        f'SELECT category, COUNT(*) as c FROM memories WHERE content LIKE ? GROUP BY category ORDER BY c DESC LIMIT 1',
-                        (f'%{w}%',))
-                    row = cursor.fetchone()
-                    if row and row['category']:
-                        cats.add(row['category'])
+            if query_terms:
+                cursor.execute(f'SELECT term, category, count FROM term_categories '
+                               f'WHERE term IN ({",".join("?" * len(query_terms))})', query_terms)
+                best = {}
+                for term, category, count in cursor.fetchall():
+                    if term not in best or count > best[term][1]: best[term] = (category, count)
+                cats = {category for category, _ in best.values()}
             if cats:
-                cat_ph = ','.join('?' * len(cats))
-                cursor.execute(
-                    f'SELECT id, content, category, importance, tags, created_at FROM memories '
-                    f'WHERE category IN ({cat_ph}) AND importance >= 6{excl_sql} '
-                    f'ORDER BY importance DESC, created_at DESC LIMIT ?',
-                    list(cats) + excl_params + [limit])
-                related.extend(dict(r) for r in cursor.fetchall())
+                rows = [r for r in _fetch(pool.category_ids(cats, set(exclude_ids))[:limit * 4], pool.min_importance)
+                        if r['category'] in cats]
+                rows.sort(key=lambda r: (r['importance'], r['created_at'] or ''), reverse=True)
+                related.extend(rows[:limit])
             # 2) 补充：随机"也许有用"的高分记忆（不同分类，避免完全无关）
             if len(related) < limit:
+                need = limit - len(related)
                 seen = set(exclude_ids) | {r['id'] for r in related}
-                seen_ph = ','.join('?' * len(seen)) if seen else ''
-                seen_sql = f' AND id NOT IN ({seen_ph})' if seen_ph else ''
-                cursor.execute(
-                    f'SELECT id, content, category, importance, tags, created_at FROM memories '
-                    f'WHERE importance >= 7{seen_sql} ORDER BY RANDOM() LIMIT ?',
-                    list(seen) + [limit - len(related)])
-                related.extend(dict(r) for r in cursor.fetchall())
+                related.extend(_fetch(pool.random_ids(need * 2, seen), pool.global_min_importance)[:need])
             for r in related:
                 r['content'] = r['content'][:80] + ('...' if len(r['content']) > 80 else '')
                 r['associative'] = True
@@ -0,0 +1,126 @@
+import json
+import struct
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# format -> (MIME 类型, 文件扩展名)
+EXPORT_FORMATS = {
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'msgpack': ('application/x-msgpack', 'msgpack'),
+}
+
+
+def packb(obj):
+    """MessagePack 编码（导出行里只有 None/bool/int/float/str/bytes/list/dict）。
+
+    装了 msgpack 时用它，否则用下面的纯 Python 实现，两者输出同为标准 MessagePack。
+    """
+    if msgpack is not None:
+        return msgpack.packb(obj, use_bin_type=True)
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def _pack_len(out, n, small_tag, small_max, tags):
+    """写长度前缀：n <= small_max 时用 fix 格式（small_tag | n），否则依次尝试 8/16/32 位长度。"""
+    if n <= small_max and small_tag is not None:
+        out.append(small_tag | n)
+        return
+    for tag, fmt, limit in tags:
+        if n < limit:
+            out.append(tag)
+            out += struct.pack(fmt, n)
+            return
+    raise ValueError(f"msgpack: length {n} too large")
+
+
+_STR_TAGS = ((0xd9, '>B', 1 << 8), (0xda, '>H', 1 << 16), (0xdb, '>I', 1 << 32))
+_BIN_TAGS = ((0xc4, '>B', 1 << 8), (0xc5, '>H', 1 << 16), (0xc6, '>I', 1 << 32))
+_ARRAY_TAGS = ((0xdc, '>H', 1 << 16), (0xdd, '>I', 1 << 32))
+_MAP_TAGS = ((0xde, '>H', 1 << 16), (0xdf, '>I', 1 << 32))
+_INT_TAGS = ((0xcc, '>B', 0, 1 << 8), (0xcd, '>H', 0, 1 << 16), (0xce, '>I', 0, 1 << 32), (0xcf, '>Q', 0, 1 << 64),
+             (0xd0, '>b', -(1 << 7), 0), (0xd1, '>h', -(1 << 15), 0), (0xd2, '>i', -(1 << 31), 0),
+             (0xd3, '>q', -(1 << 63), 0))
+
+
+def _pack(obj, out):
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 128:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        else:
+            for tag, fmt, lo, hi in _INT_TAGS:
+                if lo <= obj < hi:
+                    out.append(tag)
+                    out += struct.pack(fmt, obj)
+                    break
+            else:
+                _pack(str(obj), out)
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += struct.pack('>d', obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        _pack_len(out, len(data), 0xa0, 31, _STR_TAGS)
+        out += data
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        _pack_len(out, len(data), None, -1, _BIN_TAGS)
+        out += data
+    elif isinstance(obj, (list, tuple)):
+        _pack_len(out, len(obj), 0x90, 15, _ARRAY_TAGS)
+        for item in obj: _pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_len(out, len(obj), 0x80, 15, _MAP_TAGS)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        _pack(str(obj), out)
+
+
+def _encode_jsonl(row):
+    return json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def encode_rows(rows, fmt='jsonl', compress=False, buffer_size=64 * 1024):
+    """把 dict 行的迭代器编码成字节块的生成器（jsonl：每行一个 JSON；msgpack：首尾相接的 map 流）。
+
+    攒够 buffer_size 字节才产出一块，compress 时输出 gzip 流。格式不支持时立即抛 ValueError。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unsupported export format: {fmt}")
+    encode = packb if fmt == 'msgpack' else _encode_jsonl
+    return _encode_stream(rows, encode, compress, buffer_size)
+
+
+def _encode_stream(rows, encode, compress, buffer_size):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    buf = bytearray()
+    try:
+        for row in rows:
+            buf += encode(row)
+            if len(buf) >= buffer_size:
+                chunk = compressor.compress(bytes(buf)) if compressor else bytes(buf)
+                buf.clear()
+                if chunk: yield chunk
+        tail = bytes(buf)
+        if compressor: tail = compressor.compress(tail) + compressor.flush()
+        if tail: yield tail
+    finally:
+        # 客户端中途断开时生成器被关闭，顺带关闭底层的行迭代器（释放数据库连接）
+        close = getattr(rows, 'close', None)
+        if close: close()
@@ -0,0 +1,267 @@
+import difflib
+import math
+import threading
+import unicodedata
+
+from .automaton import AhoCorasick
+
+
+def normalize_term(term):
+    """归一化梗词用于去重比较：全角转半角、小写、去空格。"""
+    if not term:
+        return ""
+    s = unicodedata.normalize("NFKC", str(term))
+    return s.lower().replace(" ", "").strip()
+
+
+class GlossaryMatcher:
+    """梗库的内存匹配索引。
+
+    所有梗词按 normalize_term 归一化后放进一个 Aho-Corasick 自动机，消息同样归一化后
+    单次扫描即可找出全部出现的梗词；重叠时优先保留更长的词，结果按具体程度（词长）
+    和 hit_count 排序。增删改由 DatabaseManager 在写库成功后同步调用。
+
+    增删不在匹配路径上重建自动机：变更先记进 _pending，后台线程在当前自动机的副本上
+    应用并 build() 后整体替换。替换前匹配照常用旧自动机，已删除的词按 _ids_by_norm 过滤，
+    新增的词对消息做一次 str.find 补上，结果与重建后一致。
+    """
+
+    def __init__(self, rows=()):
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._ids_by_norm = {}
+        self._pending = {}
+        self._rebuild_thread = None
+        for row in rows:
+            self._add_locked(row)
+        self._automaton = AhoCorasick(self._ids_by_norm)
+        self._automaton.build()
+        self._pending.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, row):
+        with self._lock:
+            self._add_locked(row)
+            self._schedule_rebuild_locked()
+
+    def remove(self, glossary_id):
+        with self._lock:
+            self._remove_locked(glossary_id)
+            self._schedule_rebuild_locked()
+
+    def _add_locked(self, row):
+        norm = normalize_term(row.get('term'))
+        if not norm: return
+        entry = dict(row)
+        entry['hit_count'] = entry.get('hit_count') or 0
+        self._remove_locked(entry['id'])
+        self._entries[entry['id']] = (norm, entry)
+        ids = self._ids_by_norm.setdefault(norm, set())
+        if not ids: self._pending[norm] = True
+        ids.add(entry['id'])
+
+    def _remove_locked(self, glossary_id):
+        old = self._entries.pop(glossary_id, None)
+        if not old: return
+        norm = old[0]
+        ids = self._ids_by_norm.get(norm)
+        if ids:
+            ids.discard(glossary_id)
+            if not ids:
+                del self._ids_by_norm[norm]
+                self._pending[norm] = False
+
+    def _schedule_rebuild_locked(self):
+        if self._pending and self._rebuild_thread is None:
+            self._rebuild_thread = threading.Thread(target=self._rebuild_loop,
+                                                    name='glossary-automaton-rebuild', daemon=True)
+            self._rebuild_thread.start()
+
+    def _rebuild_loop(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        self._rebuild_thread = None
+                        return
+                    ops = dict(self._pending)
+                    base = self._automaton
+                fresh = base.clone()
+                for norm, present in ops.items():
+                    if present: fresh.add(norm)
+                    else: fresh.remove(norm)
+                fresh.build()
+                with self._lock:
+                    self._automaton = fresh
+                    for norm, present in ops.items():
+                        if self._pending.get(norm) is present: del self._pending[norm]
+        except Exception:
+            with self._lock:
+                self._rebuild_thread = None
+            raise
+
+    def wait_rebuilt(self, timeout=None):
+        """等待后台重建把积压的增删应用进自动机，返回是否已无积压。"""
+        thread = self._rebuild_thread
+        if thread is not None: thread.join(timeout)
+        with self._lock:
+            return not self._pending
+
+    def bump_hits(self, glossary_id, count=1):
+        with self._lock:
+            item = self._entries.get(glossary_id)
+            if item: item[1]['hit_count'] += count
+
+    def match(self, text, limit=10):
+        """返回消息中出现的梗词条目（副本），最长匹配优先、互不重叠。"""
+        norm_text = normalize_term(text)
+        if not norm_text: return []
+        with self._lock:
+            if not self._entries: return []
+            automaton = self._automaton
+            ids_by_norm = self._ids_by_norm
+            matches = [m for m in automaton.iter_matches(norm_text) if m[2] in ids_by_norm]
+            for norm, present in self._pending.items():
+                if not present or norm in automaton: continue
+                start = norm_text.find(norm)
+                while start != -1:
+                    matches.append((start, start + len(norm), norm))
+                    start = norm_text.find(norm, start + 1)
+            if not matches: return []
+            matches.sort(key=lambda m: (m[0] - m[1], m[0]))
+            covered = bytearray(len(norm_text))
+            chosen = {}
+            for start, end, pattern in matches:
+                if pattern in chosen:
+                    chosen[pattern] += 1
+                    continue
+                if any(covered[start:end]): continue
+                covered[start:end] = b'\x01' * (end - start)
+                chosen[pattern] = 1
+            hits = []
+            for pattern, occurrences in chosen.items():
+                best = max((self._entries[i][1] for i in self._ids_by_norm.get(pattern, ())),
+                           key=lambda e: (e['hit_count'], -e['id']), default=None)
+                if best: hits.append((len(pattern), best['hit_count'], occurrences, dict(best)))
+        hits.sort(key=lambda h: (-h[0], -h[1], -h[2]))
+        return [h[3] for h in hits[:limit]]
+
+
+def _bigrams(norm):
+    if len(norm) < 2: return [norm] if norm else []
+    return [norm[i:i + 2] for i in range(len(norm) - 1)]
+
+
+class FuzzyTermIndex:
+    """梗词模糊去重用的字符二元组倒排索引。
+
+    查询时先按共享 bigram 数筛出可能相似的候选，再只对候选跑 difflib 精确打分。
+    共享数下界由 SequenceMatcher 相似度阈值推出：相似度 >= t 时匹配字符数
+    M >= t*(la+lb)/2，匹配块内部的 bigram 两边都有，块数不超过两边未匹配字符数之和+1，
+    因此不会漏掉真正达到阈值的词；下界推不出来的长度档退回按长度全量比较。
+    """
+
+    def __init__(self, rows=()):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._by_length = {}
+        self._entries = {}
+        for row in rows:
+            self.add(row['id'], row['term'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, glossary_id, term):
+        norm = normalize_term(term)
+        if not norm: return
+        with self._lock:
+            self._remove_locked(glossary_id)
+            self._entries[glossary_id] = (norm, term)
+            self._by_length.setdefault(len(norm), set()).add(glossary_id)
+            for g in set(_bigrams(norm)):
+                self._postings.setdefault(g, set()).add(glossary_id)
+
+    def remove(self, glossary_id):
+        with self._lock:
+            self._remove_locked(glossary_id)
+
+    def _remove_locked(self, glossary_id):
+        old = self._entries.pop(glossary_id, None)
+        if not old: return
+        norm = old[0]
+        self._by_length.get(len(norm), set()).discard(glossary_id)
+        for g in set(_bigrams(norm)):
+            ids = self._postings.get(g)
+            if ids:
+                ids.discard(glossary_id)
+                if not ids: del self._postings[g]
+
+    @staticmethod
+    def _min_shared(la, lb, dup_a, threshold):
+        m = math.ceil(threshold * (la + lb) / 2 - 1e-9)
+        if m > min(la, lb): return None
+        return m - (la - m) - (lb - m) - 1 - dup_a
+
+    def _candidates(self, norm, threshold, max_diff):
+        la = len(norm)
+        grams = _bigrams(norm)
+        dup_a = len(grams) - len(set(grams))
+        shared = {}
+        for g in set(grams):
+            for gid in self._postings.get(g, ()):
+                shared[gid] = shared.get(gid, 0) + 1
+        result = set()
+        for lb in range(max(1, la - max_diff), la + max_diff + 1):
+            need = self._min_shared(la, lb, dup_a, threshold)
+            if need is None: continue
+            if need <= 0:
+                result.update(self._by_length.get(lb, ()))
+        for gid, count in shared.items():
+            lb = len(self._entries[gid][0])
+            if abs(lb - la) > max_diff: continue
+            need = self._min_shared(la, lb, dup_a, threshold)
+            if need is not None and count >= need:
+                result.add(gid)
+        return result
+
+    def find_similar(self, term, threshold=0.85, limit=1, include_exact=False):
+        """返回 [{'id', 'term', 'score'}]，按相似度降序。"""
+        norm = normalize_term(term)
+        if not norm: return []
+        max_diff = max(2, len(norm) // 3)
+        with self._lock:
+            scored = []
+            for gid in self._candidates(norm, threshold, max_diff):
+                t, raw = self._entries[gid]
+                if t == norm:
+                    if include_exact: scored.append((1.0, gid, raw))
+                    continue
+                ratio = difflib.SequenceMatcher(None, norm, t).ratio()
+                if ratio >= threshold:
+                    scored.append((ratio, gid, raw))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [{'id': i, 'term': t, 'score': round(s, 3)} for s, i, t in scored[:limit]]
+
+    def find_similar_many(self, terms, threshold=0.85):
+        """批量去重：对每个新词返回最相似的已有词或同批更早的词，没有则为 None。
+
+        同批比较结果形如 {'id': None, 'term': 词, 'score': 相似度, 'batch_index': 下标}。
+        """
+        batch = FuzzyTermIndex()
+        results = []
+        for i, term in enumerate(terms):
+            hit = self.find_similar(term, threshold, 1, include_exact=True)
+            if hit:
+                results.append(hit[0])
+                continue
+            local = batch.find_similar(term, threshold, 1, include_exact=True)
+            if local:
+                j = local[0]['id']
+                results.append({'id': None, 'term': terms[j], 'score': local[0]['score'], 'batch_index': j})
+                continue
+            results.append(None)
+            batch.add(i, term)
+        return results
@@ -0,0 +1,233 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from astrbot.api import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+# ==================== 进程池 worker ====================
+
+_worker_db = None
+
+
+def _init_worker(config, fts_seg_mode):
+    """进程池初始化：每个 worker 建一个不连库的 DatabaseManager，只用它的分词/打标签/分类/索引准备逻辑。"""
+    global _worker_db
+    from .db_manager import DatabaseManager
+    _worker_db = DatabaseManager(config)
+    _worker_db._fts_seg_mode = fts_seg_mode
+
+
+def _prepare_chunk(items):
+    return [_worker_db._prepare_import_item(item) for item in items]
+
+
+# ==================== 任务 ====================
+
+class ImportJob:
+    """一次流式导入任务的进度。counts 里 skipped 为与库中或文件内已有内容完全相同的条目。"""
+
+    MAX_ERRORS = 20
+
+    def __init__(self, job_id, total_bytes=0):
+        self.id = job_id
+        self.status = 'queued'
+        self.total_bytes = total_bytes
+        self.read_bytes = 0
+        self.counts = {'lines': 0, 'imported': 0, 'skipped': 0, 'merged': 0, 'invalid': 0, 'failed': 0}
+        self.errors = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+
+    def error(self, message):
+        with self._lock:
+            if len(self.errors) < self.MAX_ERRORS: self.errors.append(message)
+
+    def to_dict(self):
+        with self._lock:
+            counts = dict(self.counts)
+            errors = list(self.errors)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0
+        done = counts['imported'] + counts['skipped'] + counts['merged']
+        return {'id': self.id, 'status': self.status, **counts, 'errors': errors,
+                'progress': round(self.read_bytes / self.total_bytes, 4) if self.total_bytes else 0,
+                'read_bytes': self.read_bytes, 'total_bytes': self.total_bytes,
+                'elapsed_seconds': round(elapsed, 1),
+                'rate_per_second': round(done / elapsed, 1) if elapsed else 0,
+                'created_at': self.created_at, 'finished_at': self.finished_at}
+
+
+class MemoryImporter:
+    """NDJSON 记忆流式导入。
+
+    每行一个 JSON 对象（字段同 bulk_import_memories：content / category / importance / tags / source），
+    也可以直接是一行 JSON 字符串。上传的请求体先落盘，任务在后台线程里按块处理：
+    1. 逐行解析，按内容哈希对照内存里的哈希集合（启动时从库中一次读出）去重；
+    2. 剩下的条目交给进程池并行打标签、分类、分词并算好各项索引（workers=0 时在本线程做）；
+    3. 每块作为一个写操作交给写线程，executemany 批量插入。
+    块与块之间写锁会释放，期间机器人的其它写入照常排队执行。同一时间只跑一个任务，其余排队。
+    """
+
+    def __init__(self, db_manager, workers=None, chunk_size=500, max_jobs=20):
+        self._db = db_manager
+        self.workers = (os.cpu_count() or 1) if workers is None else max(0, int(workers))
+        self.chunk_size = max(1, int(chunk_size))
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='MemoryCapsuleImport')
+
+    def submit(self, path, delete_after=True):
+        """为已落盘的 NDJSON 文件创建导入任务，返回任务 id；delete_after 为 True 时任务结束后删除该文件。"""
+        job = ImportJob(f"{int(time.time())}-{next(self._ids)}", os.path.getsize(path))
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if j.finished_at]
+            for old in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+                del self._jobs[old.id]
+        self._runner.submit(self._run, job, path, delete_after)
+        return job.id
+
+    def get(self, job_id):
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def list(self):
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def cancel(self, job_id):
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            if job is None: return False
+            job.cancel_event.set()
+        return True
+
+    def shutdown(self):
+        with self._jobs_lock:
+            for job in self._jobs.values(): job.cancel_event.set()
+        self._runner.shutdown(wait=True, cancel_futures=True)
+
+    # ==================== 任务线程 ====================
+
+    def _start_pool(self):
+        # 宿主进程里已有写线程、缓冲刷新线程、WebUI 线程和事件循环，fork 出的子进程可能继承
+        # 一把正被持有的锁（logging / sqlite）而永久卡住，因此用 spawn 起干净的解释器
+        if not self.workers: return None
+        try:
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker,
+                                       initargs=(dict(self._db.config), self._db._fts_seg_mode))
+        except Exception as e:
+            logger.warning(f"Import process pool unavailable, preparing in-thread: {e}")
+            return None
+
+    def _run(self, job, path, delete_after):
+        if job.cancel_event.is_set():
+            job.status, job.finished_at = 'cancelled', time.time()
+            if delete_after: self._remove(path)
+            return
+        job.status, job.started_at = 'running', time.time()
+        pool = None
+        try:
+            seen = self._db._memory_hash_set()
+            pool = self._start_pool()
+            inflight = deque()
+            for chunk in self._read_chunks(job, path, seen):
+                if job.cancel_event.is_set(): break
+                inflight.append((chunk, pool.submit(_prepare_chunk, chunk) if pool else None))
+                # 进程池最多领先写入 2 倍 worker 数的块，避免整文件堆在内存里
+                while len(inflight) > (self.workers * 2 if pool else 0):
+                    pool = self._write_chunk(job, pool, *inflight.popleft())
+            while inflight and not job.cancel_event.is_set():
+                pool = self._write_chunk(job, pool, *inflight.popleft())
+            job.status = 'cancelled' if job.cancel_event.is_set() else 'done'
+            logger.info(f"Memory import {job.id} {job.status}: {job.counts}")
+        except Exception as e:
+            job.status = 'failed'
+            job.error(str(e))
+            logger.error(f"Memory import {job.id} failed: {e}")
+        finally:
+            if pool: pool.shutdown(wait=False, cancel_futures=True)
+            job.finished_at = time.time()
+            if delete_after: self._remove(path)
+
+    def _read_chunks(self, job, path, seen):
+        chunk = []
+        with open(path, 'rb') as f:
+            for line_no, line in enumerate(f, 1):
+                job.read_bytes += len(line)
+                if not line.strip(): continue
+                job.add(lines=1)
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    job.add(invalid=1)
+                    job.error(f"line {line_no}: invalid JSON ({e})")
+                    continue
+                if isinstance(item, str): item = {'content': item}
+                content = item.get('content') if isinstance(item, dict) else None
+                if not isinstance(content, str) or not content.strip():
+                    job.add(invalid=1)
+                    job.error(f"line {line_no}: missing content")
+                    continue
+                digest = hashlib.md5(content.strip().encode('utf-8')).digest()
+                if digest in seen:
+                    job.add(skipped=1)
+                    continue
+                seen.add(digest)
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    yield chunk
+                    chunk = []
+                if job.cancel_event.is_set(): return
+        if chunk: yield chunk
+
+    def _write_chunk(self, job, pool, chunk, future):
+        """等待一块准备完成并写库，返回之后继续使用的进程池（进程池崩溃时改为 None，退回本线程准备）。"""
+        prepared = None
+        if future is not None:
+            try:
+                prepared = future.result()
+            except Exception as e:
+                if pool:
+                    logger.warning(f"Import worker failed ({e}), preparing in-thread from now on")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                pool = None
+        if prepared is None:
+            prepared = [self._db._prepare_import_item(item) for item in chunk]
+        result = self._db._insert_prepared_memories([p for p in prepared if p is not None])
+        if result is None:
+            job.add(failed=len(chunk))
+            job.error(f"write failed for a chunk of {len(chunk)} memories")
+        else:
+            imported, skipped, merged = result
+            job.add(imported=imported, skipped=skipped, merged=merged)
+        return pool
+
+    @staticmethod
+    def _remove(path):
+        try: os.remove(path)
+        except OSError: pass
@@ -0,0 +1,95 @@
+import re
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_WORD_RE = re.compile(r'\w+')
+
+# 候选数少于该值时纯 Python 更快（NumPy 的数组构建开销占大头）
+NUMPY_MIN_CANDIDATES = 256
+
+
+def _words(text):
+    return set(_WORD_RE.findall((text or '').lower()))
+
+
+def mmr_select(texts, query, limit, lambda_param=0.7):
+    """最大边际相关性（MMR）选择，返回选中候选的下标列表。
+
+    相关度为查询词覆盖率，相似度为 Jaccard。第一个候选固定入选（沿用融合排序的第一名），
+    之后每轮选 lambda*相关度 - (1-lambda)*与已选集合的最大相似度 最高者，同分取靠前的。
+    每个候选只分词一次；已选集合的最大相似度向量在每次选中后增量更新。
+    """
+    n = len(texts)
+    if n <= limit: return list(range(n))
+    query_words = _words(query)
+    sets = [_words(t) for t in texts]
+    relevance = [len(query_words & s) / max(len(query_words), 1) for s in sets]
+    if np is not None and n >= NUMPY_MIN_CANDIDATES:
+        return _select_numpy(sets, relevance, limit, lambda_param)
+    return _select_python(sets, relevance, limit, lambda_param)
+
+
+def _select_python(sets, relevance, limit, lambda_param):
+    n = len(sets)
+    max_sim = [0.0] * n
+    selected = [0]
+    remaining = list(range(1, n))
+    while True:
+        s = sets[selected[-1]]
+        for i in remaining:
+            inter = len(sets[i] & s)
+            sim = inter / max(len(sets[i]) + len(s) - inter, 1)
+            if sim > max_sim[i]: max_sim[i] = sim
+        if len(selected) >= limit or not remaining: break
+        best_score = -float('inf')
+        best_pos = 0
+        for pos, i in enumerate(remaining):
+            score = lambda_param * relevance[i] - (1 - lambda_param) * max_sim[i]
+            if score > best_score:
+                best_score = score
+                best_pos = pos
+        selected.append(remaining.pop(best_pos))
+    return selected
+
+
+def _select_numpy(sets, relevance, limit, lambda_param):
+    n = len(sets)
+    vocab = {}
+    intern = vocab.setdefault
+    item_tokens = [[intern(t, len(vocab)) for t in s] for s in sets]
+    lengths = np.fromiter((len(ids) for ids in item_tokens), dtype=np.int64, count=n)
+    cols = np.fromiter(chain.from_iterable(item_tokens), dtype=np.int64, count=int(lengths.sum()))
+    # 倒排表：按词号排序后的候选下标 + 每个词的区间边界
+    order = np.argsort(cols, kind='stable')
+    postings = np.repeat(np.arange(n, dtype=np.int64), lengths)[order]
+    bounds = np.searchsorted(cols[order], np.arange(len(vocab) + 1))
+    sizes = lengths.astype(np.float64)
+    rel = np.asarray(relevance, dtype=np.float64)
+    max_sim = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+
+    def _absorb(s):
+        toks = item_tokens[s]
+        if toks:
+            hits = np.concatenate([postings[bounds[t]:bounds[t + 1]] for t in toks])
+            inter = np.bincount(hits, minlength=n).astype(np.float64)
+        else:
+            inter = np.zeros(n)
+        sim = inter / np.maximum(sizes + sizes[s] - inter, 1)
+        np.maximum(max_sim, sim, out=max_sim)
+
+    selected = [0]
+    available[0] = False
+    _absorb(0)
+    while len(selected) < limit and available.any():
+        scores = lambda_param * rel - (1 - lambda_param) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        _absorb(best)
+    return selected
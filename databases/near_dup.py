@@ -0,0 +1,74 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+from array import array
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# 去掉标点后特征数少于该值的短文本不参与近似去重（签名噪声太大）
+MIN_SHINGLES = 5
+
+_MERSENNE = (1 << 61) - 1
+_MASK32 = (1 << 32) - 1
+_SEP_RE = re.compile(r'[\W_]+')
+
+
+def _permutations():
+    perms = []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f'memory-capsule-minhash-{i}'.encode('ascii'), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], 'big') % (_MERSENNE - 1) + 1
+        b = int.from_bytes(digest[8:], 'big') % _MERSENNE
+        perms.append((a, b))
+    return perms
+
+
+_PERMS = _permutations()
+
+
+def shingles(text):
+    """近似去重用的特征集合：中文等按字符二元组，英文按单词及相邻词对。"""
+    text = _SEP_RE.sub(' ', unicodedata.normalize('NFKC', text or '').lower()).strip()
+    result = set()
+    words = []
+    for run in text.split(' '):
+        if not run: continue
+        if run.isascii():
+            result.add(run)
+            words.append(run)
+        elif len(run) < 2:
+            result.add(run)
+        else:
+            result.update(run[i:i + 2] for i in range(len(run) - 1))
+    result.update(f'{words[i]} {words[i + 1]}' for i in range(len(words) - 1))
+    return result
+
+
+def minhash(text):
+    """文本的 MinHash 签名（NUM_PERM 个 32 位值的字节串），特征太少返回 None。
+
+    签名只由文本和固定种子决定，跨进程、跨版本稳定，可以直接落库。
+    """
+    feats = shingles(text)
+    if len(feats) < MIN_SHINGLES: return None
+    hashes = [zlib.crc32(f.encode('utf-8')) for f in feats]
+    sig = array('I', (min(((a * h + b) % _MERSENNE) & _MASK32 for h in hashes) for a, b in _PERMS))
+    return sig.tobytes()
+
+
+def lsh_keys(signature):
+    """把签名切成 BANDS 段，每段哈希成一个有符号 64 位整数作为分桶键（SQLite INTEGER）。"""
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS * 4:(band + 1) * ROWS * 4]
+        keys.append(int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'big', signed=True))
+    return keys
+
+
+def similarity(sig_a, sig_b):
+    """由两份签名估计 Jaccard 相似度（相同位置取值相等的比例）。"""
+    a = array('I', sig_a)
+    b = array('I', sig_b)
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+import time
+import weakref
+
+try:
+    from astrbot.api import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+def configure_connection(conn):
+    """新连接的统一设置（池化连接、写线程连接和导出用的独立连接都经这里）。"""
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA busy_timeout = 15000')
+    conn.execute('PRAGMA cache_size = -2000')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+
+def _close_quietly(conn):
+    try: conn.close()
+    except Exception: pass
+
+
+def _reap(conn, stats):
+    # 持有连接的线程退出、其 _Slot 被回收时调用；可能在任意线程的 GC 中执行，不能取锁
+    _close_quietly(conn)
+    stats['reaped'] += 1
+
+
+class _Slot:
+    """一个线程的池化连接。存放在 threading.local 里，线程退出后随之回收，由 finalizer 关闭连接。"""
+
+    __slots__ = ('conn', 'generation', 'checked_at', 'users', 'finalizer', '__weakref__')
+
+    def __init__(self, conn, generation, stats):
+        self.conn = conn
+        self.generation = generation
+        self.checked_at = time.monotonic()
+        self.users = 0
+        self.finalizer = weakref.finalize(self, _reap, conn, stats)
+
+    def close(self):
+        """主动关闭（此后线程退出时不再重复关闭）。"""
+        if self.finalizer.detach(): _close_quietly(self.conn)
+
+
+class ConnectionPool:
+    """按线程复用的 SQLite 连接池。
+
+    每个线程持有一条长连接，PRAGMA 只在建连时执行一次，语句缓存随连接保留。
+    asyncio.to_thread 的工作线程和 Flask 的请求线程都能直接使用；连接挂在 threading.local 上，
+    线程退出时随之关闭（不按线程 id 索引，id 被新线程复用也不会串用或泄漏连接）。
+    总连接数超过上限时退化为临时连接。
+    """
+
+    def __init__(self, db_path, max_connections=16, health_check_interval=60, cached_statements=128):
+        self.db_path = db_path
+        self.max_connections = max(1, int(max_connections))
+        self.health_check_interval = health_check_interval
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots = weakref.WeakSet()
+        self._generation = 0
+        self._stats = {'created': 0, 'reused': 0, 'transient': 0, 'reconnects': 0, 'reaped': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30,
+                               cached_statements=self.cached_statements)
+        return configure_connection(conn)
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """返回 (conn, pooled)。每次 acquire 都要配一次 release；pooled 为 False 时 release 会关闭连接。"""
+        slot = getattr(self._local, 'slot', None)
+        if slot is not None:
+            with self._lock:
+                stale = slot.generation != self._generation
+                if not stale:
+                    slot.users += 1
+                    self._stats['reused'] += 1
+                elif slot.users:
+                    # close_all 之后、本线程外层调用还没用完旧连接：内层先用临时连接
+                    self._stats['transient'] += 1
+                    return self._connect(), False
+            if stale:
+                self.discard()
+            else:
+                now = time.monotonic()
+                if slot.users == 1 and now - slot.checked_at >= self.health_check_interval:
+                    if not self._is_healthy(slot.conn):
+                        logger.warning("Pooled connection failed health check, reconnecting")
+                        self.discard()
+                        with self._lock:
+                            self._stats['reconnects'] += 1
+                        return self.acquire()
+                    slot.checked_at = now
+                return slot.conn, True
+        with self._lock:
+            if len(self._slots) >= self.max_connections:
+                self._stats['transient'] += 1
+                return self._connect(), False
+            slot = _Slot(self._connect(), self._generation, self._stats)
+            slot.users = 1
+            self._slots.add(slot)
+            self._stats['created'] += 1
+        self._local.slot = slot
+        return slot.conn, True
+
+    def release(self, conn, pooled):
+        if conn is None: return
+        slot = getattr(self._local, 'slot', None)
+        if not pooled or slot is None or slot.conn is not conn:
+            _close_quietly(conn)
+            return
+        with self._lock:
+            slot.users = max(0, slot.users - 1)
+            if slot.users: return
+            stale = slot.generation != self._generation
+        if stale:
+            self.discard()
+            return
+        try:
+            if conn.in_transaction: conn.rollback()
+        except Exception:
+            self.discard()
+
+    def discard(self):
+        """丢弃当前线程的连接（出错后调用，下次 acquire 会重新建连）。"""
+        slot = getattr(self._local, 'slot', None)
+        self._local.slot = None
+        if slot is None: return
+        with self._lock:
+            self._slots.discard(slot)
+        slot.close()
+
+    def close_all(self):
+        """关闭全部空闲连接（重建数据库、恢复备份或插件卸载时调用）。
+
+        其它线程正在用的连接不在这里关，它们已被标记为过期，由持有线程用完 release 时关闭。
+        """
+        with self._lock:
+            self._generation += 1
+            idle = [slot for slot in self._slots if not slot.users]
+            for slot in idle: self._slots.discard(slot)
+        for slot in idle:
+            slot.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, open=len(self._slots), busy=sum(1 for s in self._slots if s.users),
+                        max=self.max_connections)
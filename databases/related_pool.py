@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+
+
+class _Reservoir:
+    """固定容量的蓄水池抽样（Algorithm R）：流式读入任意多条，每条被留下的概率相同。"""
+
+    __slots__ = ('size', 'items', 'seen')
+
+    def __init__(self, size):
+        self.size = size
+        self.items = []
+        self.seen = 0
+
+    def offer(self, item, rng):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = rng.randrange(self.seen)
+        if j < self.size: self.items[j] = item
+
+    def push(self, item, rng):
+        """新写入的条目一定进样本（满了随机顶掉一条），让新记忆不必等到下次重新抽样。"""
+        self.seen += 1
+        if len(self.items) < self.size: self.items.append(item)
+        else: self.items[rng.randrange(self.size)] = item
+
+
+class RelatedMemoryPool:
+    """联想记忆的候选池快照。
+
+    按分类各保留一个高重要度记忆的蓄水池样本，另有一个不分分类的全局样本用于随机补充。
+    池里只存 (id, category, importance)，取用时再按主键回表读最新内容并复核条件，
+    因此记忆被删改后最多是少返回几条，不会返回过期内容。
+    """
+
+    def __init__(self, generation=0, per_category=32, global_size=64,
+                 min_importance=6, global_min_importance=7, seed=None):
+        self.generation = generation
+        self.min_importance = min_importance
+        self.global_min_importance = global_min_importance
+        self.built_at = time.monotonic()
+        self._per_category = per_category
+        self._rng = random.Random(seed)
+        self._by_category = {}
+        self._global = _Reservoir(global_size)
+        self._lock = threading.Lock()
+
+    def offer(self, memory_id, category, importance):
+        """构建阶段逐条喂入 importance >= min_importance 的记忆（单线程调用）。"""
+        item = (memory_id, category, importance)
+        if category:
+            pool = self._by_category.get(category)
+            if pool is None:
+                pool = self._by_category[category] = _Reservoir(self._per_category)
+            pool.offer(item, self._rng)
+        if importance >= self.global_min_importance:
+            self._global.offer(item, self._rng)
+
+    def add(self, memory_id, category, importance):
+        """记忆写入后增量加入（可与查询并发调用）；importance 低于阈值的忽略。"""
+        if importance is None or importance < self.min_importance: return
+        item = (memory_id, category, importance)
+        with self._lock:
+            if category:
+                pool = self._by_category.get(category)
+                if pool is None:
+                    pool = self._by_category[category] = _Reservoir(self._per_category)
+                pool.push(item, self._rng)
+            if importance >= self.global_min_importance:
+                self._global.push(item, self._rng)
+
+    def category_ids(self, categories, exclude=()):
+        """给定分类的样本 id，按重要度降序。"""
+        items = []
+        with self._lock:
+            for c in categories:
+                pool = self._by_category.get(c)
+                if pool: items.extend(it for it in pool.items if it[0] not in exclude)
+        items.sort(key=lambda it: -it[2])
+        return [it[0] for it in items]
+
+    def random_ids(self, count, exclude=()):
+        """从全局样本里随机取 count 条 id。"""
+        with self._lock:
+            items = [it[0] for it in self._global.items if it[0] not in exclude]
+            return self._rng.sample(items, min(count, len(items)))
+
+    def stats(self):
+        return {'categories': len(self._by_category),
+                'sampled': sum(len(p.items) for p in self._by_category.values()),
+                'global': len(self._global.items), 'generation': self.generation,
+                'age_seconds': int(time.monotonic() - self.built_at)}
@@ -0,0 +1,94 @@
+import re
+import threading
+from functools import lru_cache
+
+try:
+    from astrbot.api import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+_jieba_instance = None
+_pseg_instance = None
+_jieba_initialized = False
+
+def get_jieba():
+    global _jieba_instance, _pseg_instance, _jieba_initialized
+    if not _jieba_initialized:
+        try:
+            import jieba
+            import jieba.posseg as pseg
+            _jieba_instance = jieba
+            _pseg_instance = pseg
+            _jieba_initialized = True
+            logger.info("jieba分词器已加载")
+        except ImportError:
+            logger.warning("jieba未安装，将使用正则分词")
+    return _jieba_instance, _pseg_instance
+
+
+_WORD_RE = re.compile(r'\w{2,}')
+
+
+class TokenizerService:
+    """统一的分词入口：jieba 精确模式 / 搜索引擎模式 / 词性标注，以及检索用的词项切分。
+
+    结果按 (text, mode) 放进有界 LRU 缓存（以元组返回，调用方不能原地修改）。超长文本
+    和 cache=False 的调用（写入、回填等一次性文本）直接计算，不占用缓存。
+    """
+
+    def __init__(self, maxsize=4096, max_text_length=2000):
+        self.max_text_length = max_text_length
+        self._cached = lru_cache(maxsize=max(1, int(maxsize)))(self._segment)
+        self._lock = threading.Lock()
+        self._uncached = 0
+
+    @staticmethod
+    def _segment(text, mode):
+        if mode == 'regex':
+            return tuple(_WORD_RE.findall(text))
+        jieba_mod, pseg_mod = get_jieba()
+        if mode == 'pos':
+            return tuple((w, flag) for w, flag in pseg_mod.cut(text)) if pseg_mod else None
+        if not jieba_mod: return None
+        if mode == 'search':
+            return tuple(jieba_mod.cut_for_search(text))
+        if mode == 'terms':
+            return tuple(w for w in jieba_mod.cut(text) if len(w) > 1)
+        return tuple(jieba_mod.cut(text))
+
+    def _get(self, text, mode, cache):
+        text = text or ''
+        if cache and len(text) <= self.max_text_length:
+            return self._cached(text, mode)
+        with self._lock:
+            self._uncached += 1
+        return self._segment(text, mode)
+
+    def cut(self, text, cache=True):
+        """jieba 精确模式分词；jieba 不可用时返回 None。"""
+        return self._get(text, 'cut', cache)
+
+    def cut_for_search(self, text, cache=True):
+        return self._get(text, 'search', cache)
+
+    def pos(self, text, cache=True):
+        """词性标注 ((word, flag), ...)；jieba 不可用时返回 None。"""
+        return self._get(text, 'pos', cache)
+
+    def terms(self, text, use_jieba=True, cache=True):
+        """检索/倒排索引用的词项：jieba 分出的多字词，或退回正则取 2 字以上的连续字符。"""
+        if use_jieba:
+            result = self._get(text, 'terms', cache)
+            if result is not None: return result
+        return self._get(text, 'regex', cache)
+
+    def clear(self):
+        self._cached.cache_clear()
+
+    def stats(self):
+        info = self._cached.cache_info()
+        lookups = info.hits + info.misses
+        return {'size': info.currsize, 'maxsize': info.maxsize, 'hits': info.hits, 'misses': info.misses,
+                'hit_rate': round(info.hits / lookups, 3) if lookups else 0, 'uncached': self._uncached}
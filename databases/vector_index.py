@@ -0,0 +1,223 @@
+import math
+import re
+import threading
+import unicodedata
+import zlib
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_RUN_RE = re.compile(r'\w+')
+
+
+def embed_text(text, dim=256):
+    """确定性的离线文本向量：字符 1/2/3-gram（英文用整词代替单字）做带符号特征哈希，量化为 int8 字节串。
+
+    只依赖标准库（写入路径不要求 NumPy），同一文本在任何进程里得到同一向量；
+    全是标点/空白等无特征文本返回 None。
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    feats = {}
+    for run in _RUN_RE.findall(text):
+        if run.isascii():
+            grams = ['w:' + run]
+        else:
+            grams = list(run)
+        for n in (2, 3):
+            grams.extend(run[i:i + n] for i in range(len(run) - n + 1))
+        for g in grams:
+            feats[g] = feats.get(g, 0) + 1
+    if not feats: return None
+    vec = [0.0] * dim
+    for g, count in feats.items():
+        h = zlib.crc32(g.encode('utf-8'))
+        vec[h % dim] += (1.0 + math.log(count)) * (1 if h & 0x80000000 else -1)
+    peak = max(abs(v) for v in vec)
+    if peak == 0: return None
+    return array('b', (int(round(v / peak * 127)) for v in vec)).tobytes()
+
+
+class VectorIndex:
+    """记忆向量的内存检索索引（需要 NumPy）。
+
+    以 SQLite 里的 int8 向量为准，加载成按行 L2 归一化的 float32 矩阵，查询时矩阵乘一次
+    取 top-k。增删按槽位原地更新，空槽标记为无效。条数达到 ivf_min_size 后训练一个简单
+    IVF（k-means 聚类），每个簇维护自己的槽位倒排表，查询只读最近的 nprobe 个簇的表；
+    新增向量直接归入最近的簇，数据量比训练时翻倍后重新训练。
+    """
+
+    def __init__(self, dim=256, ivf_min_size=20000, nprobe=8):
+        self.dim = dim
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._valid = np.zeros(0, dtype=bool)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._slots = {}
+        self._free = []
+        self._size = 0
+        self._centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        # 簇 -> 槽位数组（前 _list_len[c] 个有效），_list_pos 为槽位在所属表中的下标
+        self._lists = []
+        self._list_len = np.zeros(0, dtype=np.int64)
+        self._list_pos = np.zeros(0, dtype=np.int64)
+        self._trained_size = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    @staticmethod
+    def _decode(blob):
+        vec = np.frombuffer(blob, dtype=np.int8).astype(np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+
+    def _grow(self, need):
+        cap = len(self._valid)
+        if need <= cap: return
+        new_cap = max(need, cap * 2, 256)
+        matrix = np.zeros((new_cap, self.dim), dtype=np.float32)
+        matrix[:cap] = self._matrix
+        self._matrix = matrix
+        self._valid = np.concatenate([self._valid, np.zeros(new_cap - cap, dtype=bool)])
+        self._ids = np.concatenate([self._ids, np.zeros(new_cap - cap, dtype=np.int64)])
+        self._assign = np.concatenate([self._assign, np.full(new_cap - cap, -1, dtype=np.int32)])
+        self._list_pos = np.concatenate([self._list_pos, np.zeros(new_cap - cap, dtype=np.int64)])
+
+    def _list_add(self, cluster, slot):
+        n = int(self._list_len[cluster])
+        members = self._lists[cluster]
+        if n == len(members):
+            members = np.concatenate([members, np.zeros(max(n, 16), dtype=np.int64)])
+            self._lists[cluster] = members
+        members[n] = slot
+        self._list_pos[slot] = n
+        self._list_len[cluster] = n + 1
+        self._assign[slot] = cluster
+
+    def _list_remove(self, slot):
+        """把槽位移出所属簇的倒排表（与表尾交换，O(1)）。"""
+        cluster = int(self._assign[slot])
+        if cluster < 0: return
+        members = self._lists[cluster]
+        last = int(self._list_len[cluster]) - 1
+        i = int(self._list_pos[slot])
+        moved = int(members[last])
+        members[i] = moved
+        self._list_pos[moved] = i
+        self._list_len[cluster] = last
+        self._assign[slot] = -1
+
+    def load(self, rows):
+        """批量载入 [(memory_id, blob)]（blob 维度不符的跳过）。"""
+        with self._lock:
+            for memory_id, blob in rows:
+                self._upsert_locked(memory_id, blob)
+            self._maybe_train()
+
+    def upsert(self, memory_id, blob):
+        with self._lock:
+            self._upsert_locked(memory_id, blob)
+            self._maybe_train()
+
+    def _upsert_locked(self, memory_id, blob):
+        vec = self._decode(blob) if blob is not None and len(blob) == self.dim else None
+        if vec is None:
+            self._remove_locked(memory_id)
+            return
+        slot = self._slots.get(memory_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                self._grow(self._size + 1)
+                slot = self._size
+                self._size += 1
+            self._slots[memory_id] = slot
+        self._matrix[slot] = vec
+        self._valid[slot] = True
+        self._ids[slot] = memory_id
+        if self._centroids is not None:
+            self._list_remove(slot)
+            self._list_add(int(np.argmax(self._centroids @ vec)), slot)
+
+    def remove(self, memory_id):
+        with self._lock:
+            self._remove_locked(memory_id)
+
+    def _remove_locked(self, memory_id):
+        slot = self._slots.pop(memory_id, None)
+        if slot is None: return
+        if self._centroids is not None: self._list_remove(slot)
+        self._valid[slot] = False
+        self._matrix[slot] = 0
+        self._assign[slot] = -1
+        self._free.append(slot)
+
+    def _maybe_train(self):
+        count = len(self._slots)
+        if count < self.ivf_min_size:
+            if self._centroids is not None:
+                self._centroids = None
+                self._lists = []
+                self._assign[:] = -1
+            return
+        if self._centroids is not None and count < self._trained_size * 2: return
+        self._train(count)
+
+    def _train(self, count, iterations=8):
+        slots = np.flatnonzero(self._valid[:self._size])
+        data = self._matrix[slots]
+        nlist = max(1, int(math.sqrt(count)))
+        rng = np.random.default_rng(0)
+        sample = data[rng.choice(len(data), size=min(len(data), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    center = members.mean(axis=0)
+                    norm = np.linalg.norm(center)
+                    if norm: centroids[c] = center / norm
+        self._centroids = centroids
+        self._assign[:] = -1
+        for start in range(0, len(slots), 8192):
+            chunk = slots[start:start + 8192]
+            self._assign[chunk] = np.argmax(self._matrix[chunk] @ centroids.T, axis=1)
+        labels = self._assign[slots]
+        order = slots[np.argsort(labels, kind='stable')]
+        counts = np.bincount(labels, minlength=nlist)
+        starts = np.cumsum(counts) - counts
+        self._lists = [order[starts[c]:starts[c] + counts[c]].astype(np.int64) for c in range(nlist)]
+        self._list_len = counts.astype(np.int64)
+        self._list_pos[order] = np.arange(len(order)) - np.repeat(starts, counts)
+        self._trained_size = count
+
+    def search(self, blob, limit=10, min_score=0.0):
+        """返回 [(memory_id, cosine)]，按相似度降序。"""
+        query = self._decode(blob) if blob is not None and len(blob) == self.dim else None
+        if query is None: return []
+        with self._lock:
+            if not self._slots: return []
+            if self._centroids is not None:
+                probe = np.argsort(self._centroids @ query)[::-1][:self.nprobe]
+                slots = np.concatenate([self._lists[c][:self._list_len[c]] for c in probe])
+            else:
+                slots = np.flatnonzero(self._valid[:self._size])
+            if not len(slots): return []
+            scores = self._matrix[slots] @ query
+            k = min(limit, len(slots))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(self._ids[slots[i]]), float(scores[i])) for i in top if scores[i] > min_score]
+
+    def stats(self):
+        with self._lock:
+            return {'vectors': len(self._slots), 'dim': self.dim,
+                    'ivf_lists': 0 if self._centroids is None else len(self._centroids)}
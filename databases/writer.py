@@ -0,0 +1,213 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from astrbot.api import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """单写线程 + 组提交队列。
+
+    所有写操作（接收 conn 的函数）排队交给同一个线程执行，攒到 max_batch_size 条
+    或等待 max_delay 秒后在一个事务里一起提交。每个操作包在独立 SAVEPOINT 中，
+    单条失败只回滚自己；锁冲突/库损坏等事务级错误会整批重试。
+    调用方拿到 concurrent.futures.Future，可 .result() 阻塞或 asyncio.wrap_future 等待。
+    stats() 里的 lock_hold_ms_* 是每批从 BEGIN IMMEDIATE 到 COMMIT 持有写锁的时间，
+    op_ms_* 是单个操作在锁内的执行时间，超过 slow_op_ms 的操作计入 slow_ops。
+    """
+
+    def __init__(self, connect, max_batch_size=64, max_delay=0.002, on_malformed=None, max_retries=3,
+                 slow_op_ms=50):
+        self._connect = connect
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_delay = max(0.0, float(max_delay))
+        self.max_retries = max_retries
+        self.slow_op_ms = slow_op_ms
+        self._on_malformed = on_malformed
+        self._queue = queue.Queue()
+        self._thread = None
+        self._conn = None
+        self._running = False
+        self._stats_lock = threading.Lock()
+        self._stats = {'batches': 0, 'ops': 0, 'failed_ops': 0, 'retries': 0, 'max_batch': 0,
+                       'lock_hold_ms': 0.0, 'lock_hold_ms_max': 0.0, 'op_ms': 0.0, 'op_ms_max': 0.0,
+                       'slow_ops': 0}
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._running: return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='MemoryCapsuleWriter')
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """停止写线程；已入队的操作会先全部提交。"""
+        if not self._running: return
+        self._running = False
+        self._queue.put(_STOP)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def in_writer_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, func):
+        future = Future()
+        self._queue.put((func, future))
+        return future
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        s['pending'] = self._queue.qsize()
+        s['avg_batch'] = round(s['ops'] / s['batches'], 2) if s['batches'] else 0
+        s['lock_hold_ms_avg'] = round(s['lock_hold_ms'] / s['batches'], 3) if s['batches'] else 0
+        s['op_ms_avg'] = round(s['op_ms'] / s['ops'], 3) if s['ops'] else 0
+        for key in ('lock_hold_ms', 'lock_hold_ms_max', 'op_ms', 'op_ms_max'):
+            s[key] = round(s[key], 3)
+        return s
+
+    # ==================== 写线程 ====================
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                stopping = True
+                batch = self._drain_nowait()
+            else:
+                batch = [item]
+                stopping = self._fill_batch(batch)
+            batch = [b for b in batch if b[1].set_running_or_notify_cancel()]
+            if batch:
+                self._commit_batch(batch)
+        if self._conn:
+            try: self._conn.close()
+            except Exception: pass
+            self._conn = None
+
+    def _fill_batch(self, batch):
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                batch.extend(self._drain_nowait())
+                return True
+            batch.append(item)
+        return False
+
+    def _drain_nowait(self):
+        items = []
+        while True:
+            try: item = self._queue.get_nowait()
+            except queue.Empty: return items
+            if item is not _STOP: items.append(item)
+
+    def _get_conn(self):
+        if self._conn is None:
+            self._conn = self._connect()
+            self._conn.isolation_level = None
+        return self._conn
+
+    def _reset_conn(self):
+        if self._conn is None: return
+        try:
+            if self._conn.in_transaction: self._conn.execute('ROLLBACK')
+        except Exception: pass
+        try: self._conn.close()
+        except Exception: pass
+        self._conn = None
+
+    def _commit_batch(self, batch):
+        rebuilt = False
+        attempt = 0
+        while True:
+            try:
+                outcomes, hold_ms, op_times = self._apply(batch)
+                break
+            except Exception as e:
+                self._reset_conn()
+                err_msg = str(e).lower()
+                if 'malformed' in err_msg and not rebuilt and self._on_malformed:
+                    logger.error("Database malformed, rebuilding...")
+                    rebuilt = True
+                    try: self._on_malformed()
+                    except Exception as e2: logger.error(f"Rebuild failed: {e2}")
+                    continue
+                if ('locked' in err_msg or 'busy' in err_msg) and attempt < self.max_retries:
+                    attempt += 1
+                    with self._stats_lock: self._stats['retries'] += 1
+                    time.sleep(0.1 * attempt)
+                    continue
+                logger.error(f"Write batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                with self._stats_lock: self._stats['failed_ops'] += len(batch)
+                return
+        failed = 0
+        slow = [ms for ms in op_times if ms >= self.slow_op_ms]
+        if slow:
+            logger.debug(f"Slow write op(s) holding the write lock: {', '.join(f'{ms:.1f} ms' for ms in slow)}")
+        for (_, future), (ok, value) in zip(batch, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                failed += 1
+                future.set_exception(value)
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['ops'] += len(batch)
+            self._stats['failed_ops'] += failed
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+            self._stats['lock_hold_ms'] += hold_ms
+            self._stats['lock_hold_ms_max'] = max(self._stats['lock_hold_ms_max'], hold_ms)
+            self._stats['op_ms'] += sum(op_times)
+            self._stats['op_ms_max'] = max(self._stats['op_ms_max'], max(op_times))
+            self._stats['slow_ops'] += len(slow)
+
+    def _apply(self, batch):
+        """在一个事务里执行整批操作，返回 (outcomes, 持锁毫秒数, 各操作毫秒数)。"""
+        conn = self._get_conn()
+        outcomes = []
+        op_times = []
+        conn.execute('BEGIN IMMEDIATE')
+        locked_at = time.perf_counter()
+        for func, _ in batch:
+            started = time.perf_counter()
+            conn.execute('SAVEPOINT write_op')
+            try:
+                value = func(conn)
+                conn.execute('RELEASE write_op')
+                outcomes.append((True, value))
+            except sqlite3.IntegrityError as e:
+                conn.execute('ROLLBACK TO write_op')
+                conn.execute('RELEASE write_op')
+                outcomes.append((False, e))
+            except Exception as e:
+                err_msg = str(e).lower()
+                if 'malformed' in err_msg or 'locked' in err_msg or 'busy' in err_msg:
+                    raise
+                conn.execute('ROLLBACK TO write_op')
+                conn.execute('RELEASE write_op')
+                outcomes.append((False, e))
+            op_times.append((time.perf_counter() - started) * 1000)
+        conn.execute('COMMIT')
+        return outcomes, (time.perf_counter() - locked_at) * 1000, op_times
@@ -6,7 +6,7 @@
 """
 from __future__ import annotations
 
-import json
+import os
 
 try:
     from astrbot.api import logger
@@ -61,9 +61,14 @@ class EmbeddedAPI:
         limit = self._req.query.get("limit", 12, type=int)
         offset = (page - 1) * limit
         category = self._req.query.get("category")
+        cursor = self._req.query.get("cursor")
         try:
+            total = await self._to_thread(self.db_manager.get_memories_count, category)
+            if cursor is not None:
+                # 键集分页：传 cursor=（空）取第一页，之后传上一页返回的 next_cursor
+                data = await self._to_thread(self.db_manager.get_memories_page, limit, cursor, category)
+                return self._ok(memories=data["items"], next_cursor=data["next_cursor"], total=total, limit=limit)
             memories = await self._to_thread(self.db_manager.get_all_memories, limit, offset, category)
-            total = await self._to_thread(self.db_manager.get_memories_count)
             return self._ok(memories=memories, total=total, page=page, limit=limit,
                             total_pages=(total + limit - 1) // limit if limit else 1)
         except Exception as e:
@@ -89,13 +94,50 @@ class EmbeddedAPI:
             items = data.get("memories", [])
             if not items or not isinstance(items, list):
                 return self._err("No memories array provided")
-            if len(items) > 500:
-                return self._err(f"Too many items ({len(items)}), max 500 per batch")
+            if len(items) > 5000:
+                return self._err(f"Too many items ({len(items)}), max 5000 per batch, use import/stream for more")
             result = await self._to_thread(self.db_manager.bulk_import_memories, items)
             return self._ok(result=result)
         except Exception as e:
             return self._err(e)
 
+    async def api_memories_import_stream(self):
+        """流式导入：请求体为 NDJSON（每行一条记忆，大小不限），落盘后在后台导入，立即返回任务 id。"""
+        path = None
+        try:
+            path, f = await self._to_thread(self.db_manager.create_import_spool)
+            with f:
+                async for chunk in self._req.body:
+                    f.write(chunk)
+            job_id = await self._to_thread(self.db_manager.start_memory_import, path)
+            return self._ok(job_id=job_id)
+        except Exception as e:
+            if path:
+                try: os.remove(path)
+                except OSError: pass
+            return self._err(e)
+
+    async def api_memories_import_jobs(self):
+        try:
+            jobs = await self._to_thread(self.db_manager.list_import_jobs)
+            return self._ok(jobs=jobs)
+        except Exception as e:
+            return self._err(e)
+
+    async def api_memories_import_job(self, job_id):
+        try:
+            job = await self._to_thread(self.db_manager.get_import_job, job_id)
+            return self._ok(job=job) if job else self._err("Import job not found")
+        except Exception as e:
+            return self._err(e)
+
+    async def api_memories_import_cancel(self, job_id):
+        try:
+            ok = await self._to_thread(self.db_manager.cancel_import_job, job_id)
+            return self._ok(result="Cancelling") if ok else self._err("Import job not found")
+        except Exception as e:
+            return self._err(e)
+
     async def api_memories_update(self, memory_id):
         data = await self._req.json() or {}
         try:
@@ -122,8 +164,9 @@ class EmbeddedAPI:
         query = self._req.query.get("q", "")
         category = self._req.query.get("category")
         limit = self._req.query.get("limit", None, type=int)
+        tags = self._req.query.get("tags")
         try:
-            results = await self._to_thread(self.db_manager.search_memory, str(query), category, limit)
+            results = await self._to_thread(self.db_manager.search_memory, str(query), category, limit, tags)
             # 联想记忆
             related = []
             try:
@@ -139,6 +182,28 @@ class EmbeddedAPI:
         except Exception as e:
             return self._err(e)
 
+    async def api_memories_search_batch(self):
+        data = await self._req.json() or {}
+        queries = data.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            return self._err("queries must be a list of strings")
+        if len(queries) > 50:
+            return self._err(f"Too many queries ({len(queries)}), max 50 per batch")
+        if any(len(q) > 500 for q in queries):
+            return self._err("Query too long, max 500 characters")
+        queries = [q for q in queries if q.strip()]
+        limit = data.get("limit")
+        try:
+            if limit is not None: limit = max(1, min(int(limit), 100))
+        except (TypeError, ValueError):
+            return self._err("limit must be an integer")
+        try:
+            results = await self._to_thread(
+                self.db_manager.search_memory_many, queries, data.get("category"), limit, data.get("tags"))
+            return self._ok(results=[{"query": q, "results": r} for q, r in zip(queries, results)])
+        except Exception as e:
+            return self._err(e)
+
     async def api_categories(self):
         try:
             cats = await self._to_thread(self.db_manager.get_memory_categories)
@@ -150,15 +215,45 @@ class EmbeddedAPI:
         except Exception as e:
             return self._err(e)
 
+    async def api_memories_near_duplicates(self):
+        threshold = self._req.query.get("threshold", None, type=float)
+        limit = self._req.query.get("limit", 100, type=int)
+        try:
+            result = await self._to_thread(self.db_manager.cluster_near_duplicates, threshold, False, limit)
+            return self._ok(**result)
+        except Exception as e:
+            return self._err(e)
+
+    async def api_memories_merge_near_duplicates(self):
+        data = await self._req.json() or {}
+        try:
+            result = await self._to_thread(
+                self.db_manager.cluster_near_duplicates, data.get("threshold"), True, data.get("limit", 100))
+            return self._ok(**result)
+        except Exception as e:
+            return self._err(e)
+
+    async def api_tags(self):
+        limit = self._req.query.get("limit", None, type=int)
+        try:
+            tags = await self._to_thread(self.db_manager.get_tag_frequencies, limit)
+            return self._ok(tags=tags)
+        except Exception as e:
+            return self._err(e)
+
     # ==================== 关系 ====================
 
     async def api_relationships_list(self):
         page = self._req.query.get("page", 1, type=int)
         limit = self._req.query.get("limit", 12, type=int)
         offset = (page - 1) * limit
+        cursor = self._req.query.get("cursor")
         try:
-            items = await self._to_thread(self.db_manager.get_all_relationships, limit, offset)
             total = await self._to_thread(self.db_manager.get_relationships_count)
+            if cursor is not None:
+                data = await self._to_thread(self.db_manager.get_relationships_page, limit, cursor)
+                return self._ok(relationships=data["items"], next_cursor=data["next_cursor"], total=total, limit=limit)
+            items = await self._to_thread(self.db_manager.get_all_relationships, limit, offset)
             return self._ok(relationships=items, total=total, page=page, limit=limit,
                             total_pages=(total + limit - 1) // limit if limit else 1)
         except Exception as e:
@@ -203,9 +298,13 @@ class EmbeddedAPI:
         offset = (page - 1) * limit
         category = self._req.query.get("category") or None
         query = self._req.query.get("q") or None
+        cursor = self._req.query.get("cursor")
         try:
-            items = await self._to_thread(self.db_manager.get_glossaries, limit, offset, category, query)
             total = await self._to_thread(self.db_manager.get_glossaries_count, category, query)
+            if cursor is not None:
+                data = await self._to_thread(self.db_manager.get_glossaries_page, limit, cursor, category, query)
+                return self._ok(items=data["items"], next_cursor=data["next_cursor"], total=total, limit=limit)
+            items = await self._to_thread(self.db_manager.get_glossaries, limit, offset, category, query)
             return self._ok(items=items, total=total, page=page, limit=limit,
                             total_pages=(total + limit - 1) // limit if limit else 1)
         except Exception as e:
@@ -279,20 +378,24 @@ class EmbeddedAPI:
             return self._err(e)
 
     async def api_glossary_export(self):
+        """同 /api/export/glossary 的流式导出，JSONL 每行可直接交给 /api/glossary/import。
+
+        面板经 bridge 只能收 JSON，导出按钮改为按游标分页拉 /api/glossary，不走这里。
+        """
+        return await self.api_export("glossary")
+
+    # ==================== 导出 ====================
+
+    async def api_export(self, table):
+        """流式导出整表（memories / glossary / relationships）：?format=jsonl|msgpack&gzip=1，分块响应。"""
         try:
-            items = await self._to_thread(self.db_manager.get_glossaries, 99999, 0, None, None)
-            lines = []
-            for i in items:
-                lines.append(json.dumps({
-                    "term": i.get("term", ""),
-                    "category": i.get("category", ""),
-                    "meaning": i.get("meaning", ""),
-                    "source": i.get("source", ""),
-                    "tags": i.get("tags", "")
-                }, ensure_ascii=False))
-            return self._ok(jsonl="\n".join(lines), count=len(lines))
-        except Exception as e:
+            chunks, mimetype, filename = self.db_manager.export_table(
+                table, self._req.query.get("format", "jsonl"), self._req.query.get("gzip", "") in ("1", "true"))
+        except ValueError as e:
             return self._err(e)
+        from quart import Response
+        return Response(self._iter_in_thread(chunks), mimetype=mimetype,
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
 
     async def api_glossary_collect(self):
         """手动触发一次热榜采集（抓取 + LLM 提炼 + 入库）。"""
@@ -337,6 +440,7 @@ class EmbeddedAPI:
             if self.db_manager and self.db_manager.config is not None:
                 for key, value in data.items():
                     self.db_manager.config[key] = value
+                self.db_manager.apply_config_changes(list(data))
             return self._ok(result="Saved")
         except Exception as e:
             return self._err(e)
@@ -347,6 +451,19 @@ class EmbeddedAPI:
         import asyncio
         return await asyncio.to_thread(func, *args, **kwargs)
 
+    async def _iter_in_thread(self, gen):
+        """把同步生成器包成异步生成器，每次取下一块都在线程里执行，不阻塞事件循环。"""
+        import asyncio
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, gen, None)
+                if chunk is None: return
+                yield chunk
+        finally:
+            # 客户端断开时关闭生成器以释放导出连接；线程里仍在执行时交给垃圾回收
+            try: gen.close()
+            except ValueError: pass
+
 
 def register_embedded_apis(context, db_manager, config=None):
     """注册全部嵌入式 Web API 到 AstrBot。"""
@@ -357,10 +474,18 @@ def register_embedded_apis(context, db_manager, config=None):
         (f"/{PLUGIN_NAME}/api/memories", api.api_memories_list, ["GET"], "记忆列表"),
         (f"/{PLUGIN_NAME}/api/memories", api.api_memories_add, ["POST"], "新增记忆"),
         (f"/{PLUGIN_NAME}/api/memories/search", api.api_memories_search, ["GET"], "搜索记忆"),
+        (f"/{PLUGIN_NAME}/api/memories/search/batch", api.api_memories_search_batch, ["POST"], "批量搜索记忆"),
         (f"/{PLUGIN_NAME}/api/memories/import", api.api_memories_import, ["POST"], "记忆批量导入"),
+        (f"/{PLUGIN_NAME}/api/memories/import/stream", api.api_memories_import_stream, ["POST"], "记忆流式导入"),
+        (f"/{PLUGIN_NAME}/api/memories/import/jobs", api.api_memories_import_jobs, ["GET"], "导入任务列表"),
+        (f"/{PLUGIN_NAME}/api/memories/import/jobs/<job_id>", api.api_memories_import_job, ["GET"], "导入任务进度"),
+        (f"/{PLUGIN_NAME}/api/memories/import/jobs/<job_id>/cancel", api.api_memories_import_cancel, ["POST"], "取消导入任务"),
+        (f"/{PLUGIN_NAME}/api/memories/near_duplicates", api.api_memories_near_duplicates, ["GET"], "近似重复记忆"),
+        (f"/{PLUGIN_NAME}/api/memories/near_duplicates", api.api_memories_merge_near_duplicates, ["POST"], "合并近似重复记忆"),
         (f"/{PLUGIN_NAME}/api/memories/<memory_id>/update", api.api_memories_update, ["POST"], "更新记忆"),
         (f"/{PLUGIN_NAME}/api/memories/<memory_id>/delete", api.api_memories_delete, ["POST"], "删除记忆"),
         (f"/{PLUGIN_NAME}/api/categories", api.api_categories, ["GET"], "记忆分类"),
+        (f"/{PLUGIN_NAME}/api/tags", api.api_tags, ["GET"], "标签及使用次数"),
         (f"/{PLUGIN_NAME}/api/relationships", api.api_relationships_list, ["GET"], "关系列表"),
         (f"/{PLUGIN_NAME}/api/relationships", api.api_relationships_add, ["POST"], "新增关系"),
         (f"/{PLUGIN_NAME}/api/relationships/search", api.api_relationships_search, ["GET"], "搜索关系"),
@@ -372,6 +497,7 @@ def register_embedded_apis(context, db_manager, config=None):
         (f"/{PLUGIN_NAME}/api/glossary/import", api.api_glossary_import, ["POST"], "梗批量导入"),
         (f"/{PLUGIN_NAME}/api/glossary/export", api.api_glossary_export, ["GET"], "梗导出"),
         (f"/{PLUGIN_NAME}/api/glossary/collect", api.api_glossary_collect, ["POST"], "热榜采集"),
+        (f"/{PLUGIN_NAME}/api/export/<table>", api.api_export, ["GET"], "流式导出"),
         (f"/{PLUGIN_NAME}/api/glossary/<glossary_id>/update", api.api_glossary_update, ["POST"], "更新梗"),
         (f"/{PLUGIN_NAME}/api/glossary/<glossary_id>/delete", api.api_glossary_delete, ["POST"], "删除梗"),
         (f"/{PLUGIN_NAME}/api/providers", api.api_providers, ["GET"], "LLM提供商列表"),
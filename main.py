@@ -24,14 +24,7 @@ class MemoryCapsulePlugin(Star):
         self.webui_port = self.config.get('webui_port', 5000)
         self.last_relation_user_id = None
         self.relation_injection_refresh_time = self.config.get('relation_injection_refresh_time', 3600)
-        self._relation_cache = None
-        self._relation_cache_user_id = None
-        self._relation_cache_time = 0
-        self._relation_cache_ttl = self.config.get('relation_cache_ttl', 300)
         self._relation_injection_last_time = 0
-        self._glossary_cache = None
-        self._glossary_cache_time = 0
-        self._glossary_cache_ttl = self.config.get('glossary_cache_ttl', 120)
         self._collect_task = None
 
     async def initialize(self):
@@ -120,6 +113,8 @@ class MemoryCapsulePlugin(Star):
             except Exception: pass
             self.webui_server = None
         if self.db_manager:
+            try: self.db_manager.flush_pending_writes()
+            except Exception as e: logger.error(f"刷写互动/访问统计失败: {e}")
             try: self.db_manager.close()
             except Exception: pass
             self.db_manager = None
@@ -251,17 +246,9 @@ class MemoryCapsulePlugin(Star):
             results = await asyncio.to_thread(
                 self.db_manager.search_memory, str(query),
                 str(category_filter) if category_filter else None,
-                int(limit) if limit else None
+                int(limit) if limit else None,
+                str(tags) if tags else None
             )
-            if tags:
-                tag_list = [t.strip() for t in str(tags).split(',') if t.strip()]
-                if tag_list:
-                    filtered = []
-                    for r in results:
-                        r_tags = set(t.strip() for t in r.get('tags', '').split(',') if t.strip())
-                        if any(t in r_tags for t in tag_list):
-                            filtered.append(r)
-                    results = filtered
             # 联想记忆：不完全相关但可能有用的
             related = []
             try:
@@ -379,7 +366,8 @@ class MemoryCapsulePlugin(Star):
             user_id = event.get_sender_id()
             current_time = time.time()
 
-            await asyncio.to_thread(self.db_manager.auto_update_last_interaction, user_id)
+            # 只在内存缓冲里累加，最多唤醒刷写线程，不等待写线程
+            self.db_manager.auto_update_last_interaction(user_id)
 
             injection_parts = []
 
@@ -387,7 +375,10 @@ class MemoryCapsulePlugin(Star):
             try:
                 user_message = event.message_str or ""
                 if user_message.strip():
-                    glossary_hits = await asyncio.to_thread(self._match_glossary, user_message)
+                    group_id = ""
+                    try: group_id = event.get_group_id() or ""
+                    except Exception: pass
+                    glossary_hits = await asyncio.to_thread(self._match_glossary, user_message, group_id)
                     if glossary_hits:
                         hit_lines = []
                         for g in glossary_hits:
@@ -413,15 +404,8 @@ class MemoryCapsulePlugin(Star):
                 should_inject = True
 
             if should_inject:
-                if (self._relation_cache is not None and
-                    self._relation_cache_user_id == user_id and
-                    current_time - self._relation_cache_time < self._relation_cache_ttl):
-                    user_relation = self._relation_cache
-                else:
-                    user_relation = await asyncio.to_thread(self.db_manager.get_relationship_with_identity, user_id)
-                    self._relation_cache = user_relation
-                    self._relation_cache_user_id = user_id
-                    self._relation_cache_time = current_time
+                # 按 user_id 的关系缓存在 DatabaseManager 里，命中时不查库
+                user_relation = await asyncio.to_thread(self.db_manager.get_relationship_with_identity, user_id)
 
                 current_group = ""
                 try: current_group = event.get_group_id() or ""
@@ -469,29 +453,15 @@ class MemoryCapsulePlugin(Star):
             logger.error(f"注入失败: {e}")
         return req
 
-    def _match_glossary(self, text):
-        """匹配用户消息中出现的梗词，返回命中的梗列表。"""
-        current_time = time.time()
-        if (self._glossary_cache is None or
-            current_time - self._glossary_cache_time >= self._glossary_cache_ttl):
-            self._glossary_cache = self.db_manager.get_all_glossary_terms()
-            self._glossary_cache_time = current_time
-        if not self._glossary_cache:
-            return []
-        hits = []
-        seen = set()
-        for g in self._glossary_cache:
-            term = str(g.get('term', '')).strip()
-            if not term or term in seen:
-                continue
-            if term in text:
-                seen.add(term)
-                hits.append(g)
-                try:
-                    self.db_manager.increment_glossary_hit(g['id'])
-                except Exception:
-                    pass
-        return hits[:10]
+    def _match_glossary(self, text, group_id=""):
+        """匹配用户消息中出现的梗词，返回命中的梗列表（最长匹配优先，按词长/热度排序）。"""
+        hits = self.db_manager.match_glossary(text, self.config.get('glossary_match_limit', 10))
+        for g in hits:
+            try:
+                self.db_manager.increment_glossary_hit(g['id'], group_id)
+            except Exception:
+                pass
+        return hits
 
     def _format_relative_time(self, dt):
         now = datetime.now()
@@ -521,6 +491,7 @@ class MemoryCapsulePlugin(Star):
         summary = relation.get('summary') or ''
         notes = relation.get('notes') or ''
         first_met = relation.get('first_met_location') or ''
+        # 尚未写回的互动增量已由 get_relationship_by_user_id 叠加
         last_interaction = relation.get('last_interaction') or ''
 
         time_offset = self.config.get('time_offset', 8)
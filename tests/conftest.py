@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databases.db_manager import DatabaseManager
+
+
+def make_db(data_dir, **config):
+    """在 data_dir 下建一个空库（先放空文件，跳过 initialize 从插件 data/ 复制旧库）。"""
+    open(os.path.join(data_dir, 'memory.db'), 'wb').close()
+    db = DatabaseManager({'backup_interval': 0, 'search_deadline_ms': 10000, **config})
+    db.initialize(str(data_dir))
+    # 启动时的后台补索引完成时会递增搜索写代数，等它结束，缓存相关断言才稳定
+    if db._index_backfill: db._index_backfill.join(timeout=30)
+    return db
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = make_db(tmp_path)
+    yield db
+    db.close()
@@ -0,0 +1,16 @@
+from databases.classifier import CategoryClassifier
+
+
+def test_classifier_counts_longest_and_nested_keywords():
+    classifier = CategoryClassifier({'tech': ['python', 'py', 'sqlite'], 'life': ['吃饭', '饭']})
+    # 'Python' 大小写无关，嵌套的 'py' 也计分：tech 2 分胜过 life 1 分（饭）
+    assert classifier.classify('用 Python 写了个小工具，顺便吃了顿饭') == 'tech'
+    assert classifier.classify('晚上吃饭') == 'life'
+    assert classifier.classify('什么都没有') == 'general'
+
+
+def test_classifier_restricted_to_configured_categories():
+    classifier = CategoryClassifier({'tech': ['python'], 'life': ['吃饭']}, configured=['life', '工作'])
+    assert classifier.classify('写 python') == 'life'
+    assert classifier.classify('今天的工作很忙') == '工作'
+
@@ -0,0 +1,93 @@
+import gzip
+import json
+import struct
+
+import pytest
+
+from databases import export
+from databases.export import encode_rows
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, b'\xc0'), (True, b'\xc3'), (False, b'\xc2'),
+    (0, b'\x00'), (127, b'\x7f'), (128, b'\xcc\x80'), (256, b'\xcd\x01\x00'), (1 << 32, b'\xcf' + struct.pack('>Q', 1 << 32)),
+    (-1, b'\xff'), (-32, b'\xe0'), (-33, b'\xd0\xdf'), (-129, b'\xd1\xff\x7f'),
+    (1.5, b'\xcb' + struct.pack('>d', 1.5)),
+    ('', b'\xa0'), ('a', b'\xa1a'), ('梗', b'\xa3' + '梗'.encode('utf-8')),
+    ('x' * 32, b'\xd9\x20' + b'x' * 32), ('x' * 256, b'\xda\x01\x00' + b'x' * 256),
+    (b'\x01\x02', b'\xc4\x02\x01\x02'),
+    ([1, 2], b'\x92\x01\x02'), (list(range(16)), b'\xdc\x00\x10' + bytes(range(16))),
+    ({'a': 1}, b'\x81\xa1a\x01'),
+])
+def test_builtin_msgpack_encoding(monkeypatch, value, expected):
+    monkeypatch.setattr(export, 'msgpack', None)
+    assert export.packb(value) == expected
+
+
+def test_builtin_msgpack_matches_library(monkeypatch):
+    msgpack = pytest.importorskip('msgpack')
+    row = {'id': 70000, 'content': '记忆' * 40, 'importance': -5, 'score': 0.25, 'tags': None, 'ok': True}
+    monkeypatch.setattr(export, 'msgpack', None)
+    assert msgpack.unpackb(export.packb(row), raw=False) == row
+
+
+def test_jsonl_chunks_and_gzip():
+    rows = [{'id': i, 'term': f'梗{i}'} for i in range(2000)]
+    chunks = list(encode_rows(iter(rows), 'jsonl', buffer_size=4096))
+    assert len(chunks) > 1
+    assert [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()] == rows
+    compressed = b''.join(encode_rows(iter(rows), 'jsonl', compress=True))
+    assert gzip.decompress(compressed) == b''.join(chunks)
+
+
+def test_encode_rows_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        encode_rows([], 'csv')
+
+
+def test_closing_stream_closes_row_iterator():
+    closed = []
+    def rows():
+        try:
+            for i in range(10000): yield {'id': i, 'pad': 'x' * 100}
+        finally:
+            closed.append(True)
+    stream = encode_rows(rows(), 'jsonl', buffer_size=1024)
+    next(stream)
+    stream.close()
+    assert closed == [True]
+
+
+def test_export_table(db):
+    db.bulk_import_memories([{'content': f'导出测试记忆 {i}', 'tags': ['导出']} for i in range(30)])
+    chunks, mimetype, filename = db.export_table('memories')
+    assert (mimetype, filename) == ('application/x-ndjson', 'memories.jsonl')
+    rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+    assert [r['id'] for r in rows] == list(range(1, 31))
+    assert rows[0]['content'] == '导出测试记忆 0' and rows[0]['tags'] == '导出'
+
+    chunks, mimetype, filename = db.export_table('glossary', 'msgpack', compress=True)
+    assert (mimetype, filename) == ('application/gzip', 'glossary.msgpack.gz')
+    assert b''.join(chunks) and list(db.iter_export('glossary')) == []
+
+    with pytest.raises(ValueError):
+        db.export_table('activities')
+    with pytest.raises(ValueError):
+        db.export_table('memories', 'xml')
+
+
+class _AllowAll:
+    def validate_session(self, token):
+        return True
+
+
+def test_webui_glossary_export_streams(db):
+    pytest.importorskip('flask')
+    from webui.server import WebUIServer
+    db.bulk_import_glossary([{'term': f'导出梗{i}', 'meaning': '测试'} for i in range(20)])
+    client = WebUIServer(db, existing_auth=_AllowAll()).app.test_client()
+    resp = client.get('/api/glossary/export', headers={'X-Session-Token': 't'})
+    assert resp.status_code == 200 and resp.is_streamed
+    assert resp.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in resp.get_data().splitlines()]
+    assert sorted(r['term'] for r in rows) == sorted(f'导出梗{i}' for i in range(20))
@@ -0,0 +1,72 @@
+import re
+
+import pytest
+
+from conftest import make_db
+from databases.db_manager import DatabaseManager
+
+
+def _id(result):
+    return int(re.search(r'ID:(\d+)', result).group(1))
+
+
+def _seg_ids(db, query):
+    return [r['id'] for r in db._execute_read(lambda conn: db._fts_seg_search(conn, query, 10)) or []]
+
+
+def _seg_rows(db):
+    return db._execute_read(lambda conn: conn.execute('SELECT COUNT(*) FROM memories_fts_seg').fetchone()[0])
+
+
+@pytest.fixture(params=['jieba', 'trigram'])
+def seg_db(request, tmp_path):
+    db = make_db(tmp_path, fts_cjk_mode=request.param)
+    assert db._fts_seg_mode == request.param and db._fts_seg_ready
+    yield db
+    db.close()
+
+
+def test_cjk_substring_recalled_through_segment_index(seg_db):
+    memory_id = _id(seg_db.write_memory('今天学习了分布式系统的一致性协议'))
+    seg_db.write_memory('晚上去公园散步，天气很好')
+    assert _seg_ids(seg_db, '一致性') == [memory_id]
+    assert _seg_ids(seg_db, '分布式系统') == [memory_id]
+    # 搜索入口同样经分词索引召回
+    assert memory_id in [r['id'] for r in seg_db.search_memory('一致性')]
+
+
+def test_update_and_delete_keep_segment_index_in_sync(seg_db):
+    memory_id = _id(seg_db.write_memory('周末和朋友去博物馆参观'))
+    seg_db.bulk_import_memories([{'content': '周末在家里看电影，剧情很精彩'}])
+    assert _seg_rows(seg_db) == 2
+
+    seg_db.update_memory(memory_id, content='周末和同事去图书馆看书')
+    assert _seg_ids(seg_db, '博物馆') == []
+    assert _seg_ids(seg_db, '图书馆') == [memory_id]
+    assert _seg_rows(seg_db) == 2
+
+    seg_db.delete_memory(memory_id)
+    assert _seg_ids(seg_db, '图书馆') == []
+    assert _seg_rows(seg_db) == 1
+
+
+def test_existing_rows_backfilled_after_upgrade(tmp_path):
+    db = make_db(tmp_path, fts_cjk_mode='off')
+    assert db._fts_seg_mode is None
+    db.bulk_import_memories([{'content': f'第{i}次复习数据库的一致性模型'} for i in range(450)])
+    target = _id(db.write_memory('读完了一本讲量子计算原理的书'))
+    db.close()
+
+    # 打开同一个库并启用分词索引：建表后后台按批补建已有记忆
+    db = DatabaseManager({'backup_interval': 0, 'fts_cjk_mode': 'trigram'})
+    db.initialize(str(tmp_path))
+    try:
+        db._index_backfill.join(timeout=60)
+        assert db._fts_seg_mode == 'trigram' and db._fts_seg_ready
+        assert _seg_rows(db) == 451
+        assert _seg_ids(db, '量子计算') == [target]
+        meta = db._execute_read(lambda conn: dict(conn.execute(
+            "SELECT key, value FROM index_meta WHERE key LIKE 'fts_seg_%'").fetchall()))
+        assert meta['fts_seg_ready'] == '1' and meta['fts_seg_mode'] == 'trigram'
+    finally:
+        db.close()
@@ -0,0 +1,33 @@
+import re
+
+import databases.db_manager as db_manager
+
+
+def _id(result):
+    return int(re.search(r'ID:(\d+)', result).group(1))
+
+
+def test_add_dedups_on_normalized_term(db):
+    gid = _id(db.add_glossary('YYDS', meaning='永远的神'))
+    assert db.add_glossary('ｙｙｄｓ', meaning='重复') == 'already_exists'
+    assert db.add_glossary('yy ds') == 'already_exists'
+    assert [g['id'] for g in db.match_glossary('这波 yyds')] == [gid]
+
+
+def test_update_rejects_normalized_collision(db):
+    first = _id(db.add_glossary('破防'))
+    second = _id(db.add_glossary('摆烂'))
+    assert db.update_glossary(second, term='破 防') == 'Glossary term already exists'
+    assert db.update_glossary(first, term='破防了').startswith('Glossary updated')
+    assert [g['id'] for g in db.match_glossary('我破防了')] == [first]
+
+
+def test_terms_without_normalized_form_do_not_collide(db, monkeypatch):
+    normalize = db_manager.normalize_term
+    monkeypatch.setattr(db_manager, 'normalize_term', lambda t: '' if str(t).startswith('空') else normalize(t))
+    assert db.add_glossary('空一').startswith('Glossary saved')
+    assert db.add_glossary('空二').startswith('Glossary saved')
+    assert db.bulk_import_glossary([{'term': '空三'}, {'term': '空四'}]).startswith('Imported: 2')
+    rows = db._execute_read(lambda conn: conn.execute(
+        "SELECT term_norm FROM glossary WHERE term LIKE '空%'").fetchall())
+    assert [r[0] for r in rows] == [None] * 4
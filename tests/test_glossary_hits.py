@@ -0,0 +1,16 @@
+import re
+
+
+def _id(result):
+    return int(re.search(r'ID:(\d+)', result).group(1))
+
+
+def test_hit_counts_visible_in_stats_and_trending(db):
+    gid = _id(db.add_glossary('绝绝子'))
+    for _ in range(3):
+        db.increment_glossary_hit(gid, 'group-1')
+    db.increment_glossary_hit(gid, 'group-2')
+    stats = db.get_glossary_stats()
+    assert stats['used'] == 1 and stats['hits_today'] == 4
+    assert [(g['id'], g['hits']) for g in db.get_glossary_trending()] == [(gid, 4)]
+    assert [(g['id'], g['hits']) for g in db.get_glossary_trending(group_id='group-2')] == [(gid, 1)]
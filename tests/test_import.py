@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import make_db
+
+
+def _spool(db, lines):
+    path, f = db.create_import_spool()
+    with f:
+        for line in lines:
+            f.write((line if isinstance(line, str) else json.dumps(line, ensure_ascii=False)).encode('utf-8') + b'\n')
+    return path
+
+
+def _wait(db, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = db.get_import_job(job_id)
+        if job['status'] not in ('queued', 'running'): return job
+        time.sleep(0.05)
+    raise AssertionError(f'import job {job_id} did not finish')
+
+
+def _memories(n, start=0):
+    return [{'content': f'第{i}天：早上跑步五公里，晚上读书一小时', 'importance': 6} for i in range(start, start + n)]
+
+
+@pytest.fixture
+def importer_db(tmp_path):
+    db = make_db(tmp_path, import_chunk_size=10)
+    db._get_importer().workers = 0
+    yield db
+    db.close()
+
+
+def test_import_counts_invalid_and_duplicate_lines(importer_db):
+    db = importer_db
+    db.write_memory(_memories(1)[0]['content'])
+    lines = _memories(25) + ['not json', {'content': '  '}, '"一行纯字符串也可以"', _memories(1, 3)[0]]
+    job = _wait(db, db.start_memory_import(_spool(db, lines)))
+    assert job['status'] == 'done'
+    assert (job['imported'], job['skipped'], job['invalid']) == (25, 2, 2)
+    assert job['progress'] == 1
+    assert db.get_memories_count() == 26
+    assert len(job['errors']) == 2
+
+
+def test_cancel_then_resume_imports_each_line_once(importer_db, monkeypatch):
+    db = importer_db
+    lines = _memories(50)
+    job_id = None
+    insert = db._insert_prepared_memories
+    def insert_then_cancel(prepared):
+        result = insert(prepared)
+        db.cancel_import_job(job_id)
+        return result
+    monkeypatch.setattr(db, '_insert_prepared_memories', insert_then_cancel)
+    job_id = db.start_memory_import(_spool(db, lines))
+    job = _wait(db, job_id)
+    assert job['status'] == 'cancelled'
+    assert 0 < job['imported'] < 50
+    first = job['imported']
+
+    # 同一文件重新导入即续传：已入库的按内容哈希跳过
+    monkeypatch.setattr(db, '_insert_prepared_memories', insert)
+    job = _wait(db, db.start_memory_import(_spool(db, lines)))
+    assert job['status'] == 'done'
+    assert (job['imported'], job['skipped']) == (50 - first, first)
+    assert db.get_memories_count() == 50
+
+
+def test_cancel_queued_job(importer_db):
+    db = importer_db
+    importer = db._get_importer()
+    # 占住唯一的任务线程，让下一个任务停在排队状态
+    gate = threading.Event()
+    importer._runner.submit(gate.wait, 10)
+    job_id = db.start_memory_import(_spool(db, _memories(5)))
+    assert db.get_import_job(job_id)['status'] == 'queued'
+    assert db.cancel_import_job(job_id) is True
+    assert db.cancel_import_job('missing') is False
+    gate.set()
+    assert _wait(db, job_id)['status'] == 'cancelled'
+    assert db.get_memories_count() == 0
+
+
+def test_import_with_process_pool(tmp_path):
+    db = make_db(tmp_path, import_chunk_size=10)
+    try:
+        db._get_importer().workers = 1
+        job = _wait(db, db.start_memory_import(_spool(db, _memories(30))), timeout=120)
+        assert job['status'] == 'done' and job['imported'] == 30
+        assert {r['id'] for r in db.search_memory('跑步')}
+    finally:
+        db.close()
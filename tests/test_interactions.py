@@ -0,0 +1,11 @@
+def test_pending_interactions_are_merged_then_flushed(db):
+    db.update_relationship_enhanced('u2', nickname='小红')
+    base = db.get_relationship_by_user_id('u2')['interaction_count'] or 0
+    for _ in range(3):
+        db.auto_update_last_interaction('u2')
+    merged = db.get_relationship_by_user_id('u2')
+    assert merged['interaction_count'] == base + 3
+    assert db.flush_interactions() == 1
+    assert db.get_pending_interaction('u2') is None
+    assert db.get_relationship_by_user_id('u2')['interaction_count'] == base + 3
+
@@ -0,0 +1,74 @@
+import re
+
+from databases.automaton import AhoCorasick
+from databases.glossary_index import GlossaryMatcher
+
+
+def test_automaton_reports_overlapping_and_nested_matches():
+    ac = AhoCorasick(['he', 'she', 'his', 'hers'])
+    assert sorted(ac.iter_matches('ushers')) == [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
+
+
+def test_automaton_add_remove_without_rebuild():
+    ac = AhoCorasick(['ab'])
+    assert [m[2] for m in ac.iter_matches('xabc')] == ['ab']
+    ac.add('abc')
+    ac.remove('ab')
+    assert 'ab' not in ac and 'abc' in ac
+    assert [m[2] for m in ac.iter_matches('xabc')] == ['abc']
+
+
+def _matcher(*terms):
+    return GlossaryMatcher({'id': i, 'term': t, 'hit_count': 0} for i, t in enumerate(terms, 1))
+
+
+def test_glossary_longest_match_wins_over_nested_terms():
+    matcher = _matcher('绝绝子', '绝绝', 'yyds')
+    assert [g['term'] for g in matcher.match('这家店真的绝绝子')] == ['绝绝子']
+    # 不重叠的位置上，短词仍会单独命中
+    assert [g['term'] for g in matcher.match('绝绝子，绝绝')] == ['绝绝子', '绝绝']
+
+
+def test_glossary_match_normalizes_case_and_width():
+    matcher = _matcher('YYDS')
+    assert [g['term'] for g in matcher.match('这个真是 ｙｙｄｓ')] == ['YYDS']
+    matcher.remove(1)
+    assert matcher.match('yyds') == []
+
+
+def test_glossary_match_orders_by_length_then_hits():
+    matcher = GlossaryMatcher([{'id': 1, 'term': '破防', 'hit_count': 1},
+                               {'id': 2, 'term': '摆烂', 'hit_count': 9},
+                               {'id': 3, 'term': '绝绝子', 'hit_count': 0}])
+    assert [g['id'] for g in matcher.match('破防了，摆烂吧，绝绝子')] == [3, 2, 1]
+    assert len(matcher.match('破防了，摆烂吧，绝绝子', limit=2)) == 2
+
+
+def test_glossary_delete_removes_from_matcher(db):
+    gid = int(re.search(r'ID:(\d+)', db.add_glossary('芭比Q')).group(1))
+    assert db.match_glossary('完了芭比q了')
+    db.delete_glossary(gid)
+    assert db.match_glossary('完了芭比q了') == []
+
+
+def test_glossary_mutations_match_before_and_after_background_rebuild():
+    matcher = _matcher('绝绝', '破防')
+    automaton = matcher._automaton
+    matcher.add({'id': 3, 'term': '绝绝子', 'hit_count': 0})
+    matcher.remove(2)
+    # 后台替换前也要得到与重建后相同的结果
+    assert [g['term'] for g in matcher.match('绝绝子，破防了，绝绝')] == ['绝绝子', '绝绝']
+    assert matcher.wait_rebuilt(5)
+    assert matcher._automaton is not automaton and '破防' in automaton
+    assert '绝绝子' in matcher._automaton and '破防' not in matcher._automaton
+    assert [g['term'] for g in matcher.match('绝绝子，破防了，绝绝')] == ['绝绝子', '绝绝']
+
+
+def test_glossary_readd_during_pending_remove_is_not_duplicated():
+    matcher = _matcher('yyds')
+    matcher.remove(1)
+    matcher.add({'id': 2, 'term': 'YYDS', 'hit_count': 0})
+    hits = matcher.match('yyds yyds')
+    assert [g['id'] for g in hits] == [2]
+    assert matcher.wait_rebuilt(5)
+    assert [g['id'] for g in matcher.match('yyds')] == [2]
@@ -0,0 +1,29 @@
+import re
+
+
+def _id(result):
+    return int(re.search(r'ID:(\d+)', result).group(1))
+
+
+def test_write_search_update_delete(db):
+    memory_id = _id(db.write_memory('周末和朋友去爬山，山顶的风景非常漂亮', importance=7))
+    assert db.write_memory('周末和朋友去爬山，山顶的风景非常漂亮') == 'Memory already exists'
+
+    assert memory_id in [r['id'] for r in db.search_memory('爬山')]
+
+    assert db.update_memory(memory_id, content='周末和同事去钓鱼，收获了三条鲫鱼') == f'Memory updated (ID:{memory_id})'
+    assert memory_id in [r['id'] for r in db.search_memory('钓鱼')]
+    assert memory_id not in [r['id'] for r in db.search_memory('爬山')]
+    assert db.get_memory_by_id(memory_id)['content'].startswith('周末和同事去钓鱼')
+
+    assert db.delete_memory(memory_id).startswith('Memory deleted')
+    assert db.get_memory_by_id(memory_id) is None
+    assert db.search_memory('钓鱼') == []
+
+
+def test_bulk_import_skips_duplicates(db):
+    items = [{'content': f'学习笔记：第{i}章讲数据库事务的隔离级别'} for i in range(5)]
+    assert db.bulk_import_memories(items) == 'Imported: 5, Skipped (duplicate): 0'
+    assert db.bulk_import_memories(items + [{'content': '学习笔记：索引的最左前缀原则'}]) == \
+        'Imported: 1, Skipped (duplicate): 5'
+    assert db.get_memories_count() == 6
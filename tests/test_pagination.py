@@ -0,0 +1,77 @@
+import pytest
+
+
+def _walk(fetch, limit):
+    ids, cursor = [], None
+    while True:
+        page = fetch(limit=limit, cursor=cursor)
+        assert len(page['items']) <= limit
+        ids.extend(page['items'])
+        cursor = page['next_cursor']
+        if not cursor: return ids
+
+
+def _set_created_at(db, table, values):
+    def _do_op(conn):
+        conn.executemany(f'UPDATE {table} SET created_at = ? WHERE id = ?', values)
+    db._execute_write(_do_op)
+
+
+def test_memory_pages_cover_every_row_in_order(db):
+    db.bulk_import_memories([{'content': f'第{i}条记忆：今天整理了书架'} for i in range(23)])
+    # 时间戳有重复（同一秒导入）也有 NULL（旧库），NULL 行排在最后
+    _set_created_at(db, 'memories', [(None if i % 4 == 0 else f'2024-01-{i % 5 + 1:02d} 00:00:00', i)
+                                     for i in range(1, 24)])
+    rows = _walk(db.get_memories_page, 5)
+    expected = sorted(rows, key=lambda r: (r['created_at'] is not None, r['created_at'] or '', r['id']),
+                      reverse=True)
+    assert [r['id'] for r in rows] == [r['id'] for r in expected]
+    assert sorted(r['id'] for r in rows) == list(range(1, 24))
+
+
+def test_memory_pages_respect_category(db):
+    db.bulk_import_memories([{'content': f'记忆 {i}', 'category': 'a' if i % 2 else 'b'} for i in range(11)])
+    rows = _walk(lambda **kw: db.get_memories_page(category='a', **kw), 2)
+    assert len(rows) == 5 and {r['category'] for r in rows} == {'a'}
+    assert db.get_memories_count('a') == 5
+
+
+def test_glossary_pages_round_trip(db):
+    db.bulk_import_glossary([{'term': f'梗{i}', 'meaning': '含义'} for i in range(9)])
+    _set_created_at(db, 'glossary', [(None, 3), (None, 7)])
+    rows = _walk(db.get_glossaries_page, 4)
+    assert sorted(r['id'] for r in rows) == list(range(1, 10))
+    assert [r['id'] for r in rows[-2:]] == [7, 3]
+
+
+def test_invalid_cursor_is_rejected(db):
+    with pytest.raises(ValueError):
+        db.get_memories_page(limit=5, cursor='not-a-cursor')
+    with pytest.raises(ValueError):
+        db.get_memories_page(limit=5, cursor=db._encode_page_cursor('2024-01-01'))
+
+
+def _page_plans(db, **kwargs):
+    """执行一次翻页，返回它实际发出的每条 SELECT 的查询计划。"""
+    conn, pooled = db._pool.acquire()
+    statements = []
+    conn.set_trace_callback(lambda sql: statements.append(sql) if sql.lstrip().startswith('SELECT') else None)
+    try:
+        db.get_memories_page(**kwargs)
+    finally:
+        conn.set_trace_callback(None)
+    plans = [' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)) for sql in statements]
+    db._pool.release(conn, pooled)
+    return plans
+
+
+def test_deep_pages_seek_the_index(db):
+    db.bulk_import_memories([{'content': f'记忆 {i}', 'category': 'a'} for i in range(40)])
+    _set_created_at(db, 'memories', [(None if i % 10 == 0 else f'2024-01-{i % 20 + 1:02d} 00:00:00', i)
+                                     for i in range(1, 41)])
+    rows = db.get_memories_page(limit=20)['items']
+    for kwargs in ({'cursor': db._encode_page_cursor(rows[-1]['created_at'], rows[-1]['id'])},
+                   {'cursor': db._encode_page_cursor(None, 30)},
+                   {'cursor': db._encode_page_cursor(rows[-1]['created_at'], rows[-1]['id']), 'category': 'a'}):
+        plans = _page_plans(db, limit=5, **kwargs)
+        assert plans and all(p.startswith('SEARCH') and 'INDEX' in p for p in plans), plans
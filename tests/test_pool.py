@@ -0,0 +1,58 @@
+import gc
+import threading
+
+from databases.pool import ConnectionPool
+
+
+def _use(pool):
+    conn, pooled = pool.acquire()
+    conn.execute('SELECT 1').fetchone()
+    pool.release(conn, pooled)
+
+
+def test_connections_closed_when_threads_exit(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'p.db'), max_connections=4)
+    for _ in range(10):
+        t = threading.Thread(target=_use, args=(pool,))
+        t.start()
+        t.join()
+    gc.collect()
+    stats = pool.stats()
+    assert stats['created'] == 10 and stats['reaped'] == 10 and stats['open'] == 0
+    assert stats['transient'] == 0
+
+
+def test_nested_acquire_reuses_connection_without_rollback(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'p.db'))
+    outer, pooled = pool.acquire()
+    outer.execute('CREATE TABLE t (v)')
+    outer.execute('INSERT INTO t VALUES (1)')
+    inner, inner_pooled = pool.acquire()
+    assert inner is outer
+    pool.release(inner, inner_pooled)
+    assert outer.in_transaction
+    outer.commit()
+    pool.release(outer, pooled)
+
+
+def test_close_all_leaves_busy_connections_to_their_thread(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'p.db'))
+    acquired, done, errors = threading.Event(), threading.Event(), []
+    def busy():
+        conn, pooled = pool.acquire()
+        acquired.set()
+        done.wait(5)
+        try: conn.execute('SELECT 1').fetchone()
+        except Exception as e: errors.append(e)
+        pool.release(conn, pooled)
+    t = threading.Thread(target=busy)
+    t.start()
+    acquired.wait(5)
+    _use(pool)
+    pool.close_all()
+    assert pool.stats()['open'] == 1
+    done.set()
+    t.join()
+    assert errors == [] and pool.stats()['open'] == 0
+    _use(pool)
+    assert pool.stats()['open'] == 1
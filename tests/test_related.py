@@ -0,0 +1,7 @@
+def test_related_memories_include_fresh_writes(db):
+    for i in range(3):
+        db.write_memory(f'学习了分布式系统的一致性协议，第{i}讲', category='learning', importance=8)
+    related = db.search_memory_related('分布式 一致性', limit=3)
+    assert len(related) == 3
+    assert all(r['associative'] for r in related)
+
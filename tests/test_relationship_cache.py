@@ -0,0 +1,13 @@
+def test_relationship_reads_through_cache_and_invalidates(db):
+    assert db.get_relationship_by_user_id('u1') is None
+    assert db.update_relationship_enhanced('u1', nickname='小明', summary='喜欢爬山') == 'Relationship created: 小明'
+    assert db.get_relationship_by_user_id('u1')['summary'] == '喜欢爬山'
+    assert db.get_relationship_by_user_id('u1')['summary'] == '喜欢爬山'
+
+    db.update_relationship_enhanced('u1', summary='喜欢钓鱼')
+    assert db.get_relationship_by_user_id('u1')['summary'] == '喜欢钓鱼'
+    stats = db.get_memory_stats()['relationship_cache']
+    assert stats['hits'] >= 1 and stats['invalidations'] >= 2
+
+    db.delete_relationship('u1')
+    assert db.get_relationship_by_user_id('u1') is None
@@ -0,0 +1,39 @@
+import pytest
+
+
+class _AllowAll:
+    def validate_session(self, token):
+        return True
+
+
+@pytest.fixture
+def client(db):
+    pytest.importorskip('flask')
+    from webui.server import WebUIServer
+    db.bulk_import_memories([{'content': f'批量检索记忆 {i}', 'tags': ['批量']} for i in range(30)])
+    return WebUIServer(db, existing_auth=_AllowAll()).app.test_client()
+
+
+def _post(client, body):
+    return client.post('/api/memories/search/batch', json=body, headers={'X-Session-Token': 't'})
+
+
+def test_batch_search_clamps_limit(client):
+    resp = _post(client, {'queries': ['批量检索', '记忆'], 'limit': '1000'})
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert [r['query'] for r in results] == ['批量检索', '记忆']
+    assert all(len(r['results']) <= 100 for r in results)
+    resp = _post(client, {'queries': ['批量检索'], 'limit': -5})
+    assert len(resp.get_json()['results'][0]['results']) == 1
+
+
+@pytest.mark.parametrize('body', [
+    {'queries': '批量检索'},
+    {'queries': ['批量检索', 3]},
+    {'queries': ['x'] * 51},
+    {'queries': ['x' * 501]},
+    {'queries': ['批量检索'], 'limit': 'many'},
+])
+def test_batch_search_rejects_bad_input(client, body):
+    assert _post(client, body).status_code == 400
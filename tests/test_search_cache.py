@@ -0,0 +1,29 @@
+from databases.cache import SearchResultCache
+
+
+def test_search_cache_invalidated_by_write(db):
+    db.write_memory('今天在图书馆读了一本关于天文学的书')
+    first = db.search_memory('天文学')
+    assert len(first) == 1
+    assert db.search_memory('天文学') == first
+    hits = db.get_memory_stats()['search_cache']['hits']
+    assert hits >= 1
+
+    db.write_memory('晚上用望远镜观察天文学课上讲的木星')
+    assert len(db.search_memory('天文学')) == 2
+
+
+def test_search_cache_drops_results_computed_before_a_write():
+    cache = SearchResultCache(maxsize=8, ttl=60)
+    generation = cache.generation
+    cache.bump()
+    cache.put('q', generation, [{'id': 1}])
+    assert cache.get('q') is None
+
+    cache.put('q', cache.generation, [{'id': 1}])
+    cached = cache.get('q')
+    assert cached == [{'id': 1}]
+    cached[0]['id'] = 2
+    assert cache.get('q') == [{'id': 1}]
+    cache.bump()
+    assert cache.get('q') is None
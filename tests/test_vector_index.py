@@ -0,0 +1,58 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from conftest import make_db
+from databases.vector_index import VectorIndex
+
+
+def _blob(rng, dim=32):
+    return rng.integers(-127, 128, dim, dtype=np.int8).tobytes()
+
+
+def _check_lists(index):
+    members = np.concatenate([index._lists[c][:index._list_len[c]] for c in range(len(index._lists))])
+    live = np.flatnonzero(index._valid[:index._size])
+    assert sorted(members.tolist()) == live.tolist()
+    for c in range(len(index._lists)):
+        for i, slot in enumerate(index._lists[c][:index._list_len[c]]):
+            assert index._assign[slot] == c and index._list_pos[slot] == i
+
+
+def test_ivf_lists_track_upserts_and_removals():
+    rng = np.random.default_rng(1)
+    index = VectorIndex(dim=32, ivf_min_size=200, nprobe=4)
+    index.load([(i, _blob(rng)) for i in range(1, 301)])
+    assert index.stats()['ivf_lists'] > 1
+    _check_lists(index)
+    for i in range(1, 301, 3): index.remove(i)
+    for i in range(2, 301, 7): index.upsert(i, _blob(rng))
+    for i in range(301, 341): index.upsert(i, _blob(rng))
+    _check_lists(index)
+    blob = _blob(rng)
+    index.upsert(999, blob)
+    assert index.search(blob, limit=1)[0][0] == 999
+    # 所有簇都探查时结果与暴力扫描一致
+    index.nprobe = len(index._lists)
+    live = np.flatnonzero(index._valid[:index._size])
+    scores = index._matrix[live] @ index._decode(blob)
+    expected = [int(index._ids[live[i]]) for i in np.argsort(-scores, kind='stable')[:5]]
+    assert [m for m, _ in index.search(blob, limit=5)] == expected
+
+
+@pytest.fixture
+def vec_db(tmp_path):
+    db = make_db(tmp_path, vector_search_enabled=True)
+    yield db
+    db.close()
+
+
+def test_cleanup_removes_rows_from_loaded_index(vec_db):
+    vec_db.bulk_import_memories([{'content': f'向量清理测试记忆 第{i}条 内容{i * 7}', 'importance': 1} for i in range(30)])
+    index = vec_db._execute_read(vec_db._ensure_vector_index)
+    assert len(index) == 30
+    vec_db.cleanup_memories(max_memories=10)
+    # 加载好的索引原地删掉被清理的行，而不是整个丢弃
+    assert vec_db._vector_index is index and len(index) == 10
+    remaining = set(vec_db._execute_read(lambda conn: [r[0] for r in conn.execute('SELECT id FROM memories')]))
+    assert set(index._slots) == remaining
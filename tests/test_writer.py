@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+
+import pytest
+
+from databases.writer import GroupCommitWriter
+
+
+@pytest.fixture
+def writer(tmp_path):
+    path = str(tmp_path / 'w.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT UNIQUE)')
+    conn.commit()
+    conn.close()
+    writer = GroupCommitWriter(lambda: sqlite3.connect(path, check_same_thread=False),
+                               max_batch_size=16, max_delay=0.2)
+    writer.path = path
+    yield writer
+    writer.stop()
+
+
+def _values(path):
+    conn = sqlite3.connect(path)
+    try: return sorted(row[0] for row in conn.execute('SELECT v FROM t'))
+    finally: conn.close()
+
+
+def _insert(value):
+    def _do_op(conn):
+        conn.execute('INSERT INTO t (v) VALUES (?)', (value,))
+        return value
+    return _do_op
+
+
+def _insert_then_fail(value):
+    def _do_op(conn):
+        conn.execute('INSERT INTO t (v) VALUES (?)', (value,))
+        raise RuntimeError('boom')
+    return _do_op
+
+
+def test_failed_op_rolls_back_only_itself(writer):
+    # 先提交一个阻塞操作占住写线程，保证后面几个操作进入同一批
+    gate = threading.Event()
+    blocker = writer.submit(lambda conn: gate.wait(5))
+    writer.start()
+    futures = [writer.submit(_insert('a')), writer.submit(_insert_then_fail('b')),
+               writer.submit(_insert('a')), writer.submit(_insert('c'))]
+    gate.set()
+    assert blocker.result(5) is True
+    assert futures[0].result(5) == 'a'
+    with pytest.raises(RuntimeError):
+        futures[1].result(5)
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[2].result(5)
+    assert futures[3].result(5) == 'c'
+    assert _values(writer.path) == ['a', 'c']
+    stats = writer.stats()
+    assert stats['failed_ops'] == 2
+    assert stats['max_batch'] >= 4
+
+
+def test_stop_commits_queued_ops(writer):
+    writer.start()
+    futures = [writer.submit(_insert(str(i))) for i in range(20)]
+    writer.stop()
+    assert [f.result(5) for f in futures] == [str(i) for i in range(20)]
+    assert len(_values(writer.path)) == 20
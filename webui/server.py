@@ -1,9 +1,10 @@
-from flask import Flask, render_template, jsonify, request, make_response, session, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, make_response, session, redirect, url_for
 from functools import wraps
 import threading
 import time
 import os
 import json
+import shutil
 import socket
 
 try:
@@ -158,8 +159,14 @@ class WebUIServer:
             limit = int(request.args.get('limit', 10))
             offset = (page - 1) * limit
             category = request.args.get('category')
+            cursor = request.args.get('cursor')
+            total_memories = self.db_manager.get_memories_count(category)
+            if cursor is not None:
+                # 键集分页：传 cursor=（空）取第一页，之后传上一页返回的 next_cursor
+                data = self.db_manager.get_memories_page(limit, cursor, category)
+                return jsonify({'memories': data['items'], 'next_cursor': data['next_cursor'],
+                                'total': total_memories, 'limit': limit})
             memories = self.db_manager.get_all_memories(limit, offset, category)
-            total_memories = self.db_manager.get_memories_count()
             return jsonify({
                 'memories': memories, 'total': total_memories, 'page': page,
                 'limit': limit, 'total_pages': (total_memories + limit - 1) // limit
@@ -171,8 +178,13 @@ class WebUIServer:
             page = int(request.args.get('page', 1))
             limit = int(request.args.get('limit', 10))
             offset = (page - 1) * limit
-            relationships = self.db_manager.get_all_relationships(limit, offset)
+            cursor = request.args.get('cursor')
             total_relationships = self.db_manager.get_relationships_count()
+            if cursor is not None:
+                data = self.db_manager.get_relationships_page(limit, cursor)
+                return jsonify({'relationships': data['items'], 'next_cursor': data['next_cursor'],
+                                'total': total_relationships, 'limit': limit})
+            relationships = self.db_manager.get_all_relationships(limit, offset)
             return jsonify({
                 'relationships': relationships, 'total': total_relationships, 'page': page,
                 'limit': limit, 'total_pages': (total_relationships + limit - 1) // limit
@@ -237,9 +249,31 @@ class WebUIServer:
             query = request.args.get('q', '')
             category = request.args.get('category')
             limit = request.args.get('limit', default=None, type=int)
-            memories = self.db_manager.search_memory(query, category_filter=category, limit=limit)
+            tags = request.args.get('tags')
+            memories = self.db_manager.search_memory(query, category_filter=category, limit=limit, tags=tags)
             return jsonify(memories)
 
+        @self.app.route('/api/memories/search/batch', methods=['POST'])
+        @self._require_auth
+        def api_search_memories_batch():
+            data = request.json or {}
+            queries = data.get('queries')
+            if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                return jsonify({'error': 'queries must be a list of strings'}), 400
+            if len(queries) > 50:
+                return jsonify({'error': f'Too many queries ({len(queries)}), max 50 per batch'}), 400
+            if any(len(q) > 500 for q in queries):
+                return jsonify({'error': 'Query too long, max 500 characters'}), 400
+            queries = [q for q in queries if q.strip()]
+            limit = data.get('limit')
+            try:
+                if limit is not None: limit = max(1, min(int(limit), 100))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'limit must be an integer'}), 400
+            results = self.db_manager.search_memory_many(
+                queries, category_filter=data.get('category'), limit=limit, tags=data.get('tags'))
+            return jsonify({'results': [{'query': q, 'results': r} for q, r in zip(queries, results)]})
+
         # ==================== Glossary API ====================
 
         @self.app.route('/api/glossary')
@@ -250,8 +284,13 @@ class WebUIServer:
             offset = (page - 1) * limit
             category = request.args.get('category') or None
             query = request.args.get('q') or None
-            items = self.db_manager.get_glossaries(limit, offset, category, query)
+            cursor = request.args.get('cursor')
             total = self.db_manager.get_glossaries_count(category, query)
+            if cursor is not None:
+                data = self.db_manager.get_glossaries_page(limit, cursor, category, query)
+                return jsonify({'items': data['items'], 'next_cursor': data['next_cursor'],
+                                'total': total, 'limit': limit})
+            items = self.db_manager.get_glossaries(limit, offset, category, query)
             return jsonify({
                 'items': items, 'total': total, 'page': page,
                 'limit': limit, 'total_pages': (total + limit - 1) // limit if limit else 1
@@ -323,12 +362,26 @@ class WebUIServer:
         @self.app.route('/api/glossary/export')
         @self._require_auth
         def api_glossary_export():
-            items = self.db_manager.get_glossaries(limit=99999)
-            return jsonify({'items': items})
+            # 兼容旧调用方，与下面的 /api/export/glossary 相同走流式导出
+            return api_export('glossary')
+
+        @self.app.route('/api/export/<string:table>')
+        @self._require_auth
+        def api_export(table):
+            # 流式导出整表（memories / glossary / relationships）：?format=jsonl|msgpack&gzip=1
+            try:
+                chunks, mimetype, filename = self.db_manager.export_table(
+                    table, request.args.get('format', 'jsonl'), request.args.get('gzip', '') in ('1', 'true'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return Response(chunks, mimetype=mimetype,
+                            headers={'Content-Disposition': f'attachment; filename={filename}'})
 
         @self.app.route('/api/tags')
         @self._require_auth
         def api_tags():
+            if request.args.get('counts'):
+                return jsonify(self.db_manager.get_tag_frequencies(request.args.get('limit', default=None, type=int)))
             tags = self.db_manager.get_all_tags()
             return jsonify(tags)
 
@@ -419,6 +472,7 @@ class WebUIServer:
                         elif field_type == 'bool' and isinstance(value, str):
                             value = value.lower() in ('true', '1', 'yes')
                         self.db_manager.config[key] = value
+                    self.db_manager.apply_config_changes(list(data))
                 config_path = os.path.join(os.path.dirname(self.db_manager.db_path), "runtime_config.json")
                 with open(config_path, 'w', encoding='utf-8') as f:
                     json.dump(self.db_manager.config if self.db_manager else data, f, ensure_ascii=False)
@@ -456,6 +510,23 @@ class WebUIServer:
             except Exception as e:
                 return jsonify({'result': f'Restore failed: {e}'})
 
+        @self.app.route('/api/memories/near_duplicates')
+        @self._require_auth
+        def api_near_duplicates():
+            return jsonify(self.db_manager.cluster_near_duplicates(
+                request.args.get('threshold', default=None, type=float), False,
+                request.args.get('limit', default=100, type=int)))
+
+        @self.app.route('/api/memories/near_duplicates', methods=['POST'])
+        @self._require_auth
+        def api_merge_near_duplicates():
+            data = request.json or {}
+            try:
+                return jsonify(self.db_manager.cluster_near_duplicates(
+                    data.get('threshold'), True, data.get('limit', 100)))
+            except Exception as e:
+                return jsonify({'result': f'Merge failed: {e}'}), 500
+
         @self.app.route('/api/cleanup')
         @self._require_auth
         def api_cleanup_memories():
@@ -494,14 +565,48 @@ class WebUIServer:
                 items = data.get('memories', [])
                 if not items or not isinstance(items, list):
                     return jsonify({'result': 'No memories array provided'}), 400
-                if len(items) > 500:
-                    return jsonify({'result': f'Too many items ({len(items)}), max 500 per batch'}), 400
+                if len(items) > 5000:
+                    return jsonify({'result': f'Too many items ({len(items)}), max 5000 per batch, use /api/import/stream for more'}), 400
                 result = self.db_manager.bulk_import_memories(items)
                 return jsonify({'result': result})
             except Exception as e:
                 logger.error(f"Bulk import error: {e}")
                 return jsonify({'result': f'Import failed: {e}'}), 500
 
+        @self.app.route('/api/import/stream', methods=['POST'])
+        @self._require_auth
+        def api_import_stream():
+            # 请求体为 NDJSON（每行一条记忆），边收边落盘，导入在后台进行
+            path = None
+            try:
+                path, f = self.db_manager.create_import_spool()
+                with f:
+                    shutil.copyfileobj(request.stream, f, 1 << 20)
+                return jsonify({'job_id': self.db_manager.start_memory_import(path)}), 202
+            except Exception as e:
+                logger.error(f"Stream import error: {e}")
+                if path and os.path.exists(path): os.remove(path)
+                return jsonify({'result': f'Import failed: {e}'}), 500
+
+        @self.app.route('/api/import/jobs')
+        @self._require_auth
+        def api_import_jobs():
+            return jsonify(self.db_manager.list_import_jobs())
+
+        @self.app.route('/api/import/jobs/<string:job_id>')
+        @self._require_auth
+        def api_import_job(job_id):
+            job = self.db_manager.get_import_job(job_id)
+            if job is None: return jsonify({'error': 'not found'}), 404
+            return jsonify(job)
+
+        @self.app.route('/api/import/jobs/<string:job_id>/cancel', methods=['POST'])
+        @self._require_auth
+        def api_import_cancel(job_id):
+            if not self.db_manager.cancel_import_job(job_id):
+                return jsonify({'error': 'not found'}), 404
+            return jsonify({'result': 'Cancelling'})
+
         @self.app.route('/api/stats')
         @self._require_auth
         def api_stats():